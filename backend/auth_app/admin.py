@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Device, PaymentCountry, PaymentRequisite
+from .models import UserProfile, Device, PaymentCountry, PaymentRequisite, TelegramNotification
 
 
 @admin.register(UserProfile)
@@ -108,3 +108,19 @@ class PaymentRequisiteAdmin(admin.ModelAdmin):
         return obj.mask_card()
     masked_card.short_description = 'Маскированная карта'
 
+
+
+@admin.register(TelegramNotification)
+class TelegramNotificationAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'event_type', 'created_at')
+    search_fields = ('payload__username', 'chat_id')
+    readonly_fields = ('event_type', 'payload', 'chat_id', 'attempts', 'last_error', 'sent_at', 'created_at')
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Вернуть уведомления в очередь для немедленной отправки"""
+        from django.utils import timezone
+        updated = queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f"Поставлено в очередь: {updated}")
+    retry_now.short_description = 'Отправить повторно'
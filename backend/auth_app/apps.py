@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuthAppConfig(AppConfig):
     name = 'auth_app'
     verbose_name = '👥 Пользователи'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,133 @@
+"""
+Аутентификация DRF по токену с кешем в памяти процесса.
+Токен, пользователь и профиль загружаются одним запросом (JOIN) и
+кешируются в LRU с TTL, поэтому повторные запросы с тем же токеном
+обходятся без обращений к БД.
+
+Кеш сбрасывается сигналами (signals.py) при удалении токена (выход,
+смена пароля) и при сохранении пользователя или профиля - в том
+процессе, где произошло изменение. Остальные воркеры увидят изменение
+не позже чем через AUTH_TOKEN_CACHE_TTL секунд.
+
+request.user.profile - снимок на момент загрузки токена: баланс для
+изменения читайте из БД (UserProfile.objects.select_for_update()).
+"""
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import get_or_create_profile
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи кеша токенов, секунд
+AUTH_TOKEN_CACHE_TTL = float(os.environ.get('AUTH_TOKEN_CACHE_TTL', 30))
+
+# Максимум токенов в кеше процесса
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+
+
+class TokenCache:
+    """
+    LRU кеш токенов с TTL. Хранит Token с загруженными user и
+    user.profile; get() отдаёт копию, чтобы изменения объектов в одном
+    запросе не попадали в другие.
+    """
+    
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE, ttl: float = AUTH_TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (истекает, Token)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        # user_id -> ключи токенов пользователя
+        self._by_user: Dict[int, Set[str]] = {}
+    
+    def get(self, key: str) -> Optional[Token]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, token = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(token)
+    
+    def set(self, key: str, token: Token):
+        if not self.max_size or self.ttl <= 0:
+            return
+        token = copy.deepcopy(token)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, token)
+            self._by_user.setdefault(token.user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+    
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+    
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1].user_id
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication (заголовок "Authorization: Token <key>") с
+    кешем: request.user.profile доступен без дополнительных запросов.
+    """
+    
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            try:
+                token = Token.objects.select_related('user', 'user__profile').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            
+            # Профиль создаётся вместе с пользователем (signals.py)
+            if not hasattr(token.user, 'profile'):
+                logger.warning(f"User {token.user_id} had no profile - created")
+                get_or_create_profile(token.user)
+            token_cache.set(key, token)
+        
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        
+        return (token.user, token)
@@ -0,0 +1,51 @@
+"""
+Django management команда: создать профили пользователям, у которых их нет.
+Новые пользователи получают профиль сигналом post_save (auth_app/signals.py),
+созданным раньше профили добавляет миграция 0014_backfill_profiles; команда -
+для пользователей, загруженных в обход сигнала (loaddata, SQL).
+
+Использование:
+    python manage.py backfill_profiles
+    python manage.py backfill_profiles --dry-run
+    python manage.py backfill_profiles --batch-size=5000
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from auth_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Создать профили пользователям без профиля'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Профилей в одном INSERT (по умолчанию: 1000)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать количество')
+    
+    def handle(self, *args, **options):
+        users = User.objects.filter(profile__isnull=True).order_by('pk')
+        total = users.count()
+        self.stdout.write(f'👥 Пользователей без профиля: {total}')
+        if options['dry_run'] or not total:
+            return
+        
+        created = 0
+        last_pk = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            # ignore_conflicts - профиль мог появиться параллельно (регистрация)
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_id) for user_id in batch],
+                ignore_conflicts=True,
+            )
+            created += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f'   ✅ {created}/{total}')
+        
+        self.stdout.write(self.style.SUCCESS(f'✅ Профили созданы: {created}'))
@@ -0,0 +1,94 @@
+"""
+Django management команда для отправки уведомлений в Telegram.
+Забирает записи из очереди TelegramNotification и отправляет их через
+один Bot (одно HTTP соединение) с ограничением частоты на чат; при 429
+чат ждёт retry_after, при сетевых ошибках - повтор с backoff. Входы
+отправляются дайджестом раз в окно (--window).
+
+Использование:
+    python manage.py send_telegram_notifications
+    python manage.py send_telegram_notifications --interval=2 --chat-interval=1
+    python manage.py send_telegram_notifications --window=300  # дайджест входов раз в 5 минут
+    python manage.py send_telegram_notifications --once  # отправить готовые и завершить
+"""
+import asyncio
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from auth_app.telegram_notifier import (
+    get_sender,
+    TELEGRAM_CHAT_INTERVAL,
+    TELEGRAM_BATCH_SIZE,
+    TELEGRAM_DIGEST_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Отправка уведомлений администраторам в Telegram'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза между выборками очереди в секундах (по умолчанию: 1)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Отправить готовые уведомления и завершить'
+        )
+        parser.add_argument(
+            '--chat-interval',
+            type=float,
+            default=TELEGRAM_CHAT_INTERVAL,
+            help=f'Минимум секунд между сообщениями в один чат (по умолчанию: {TELEGRAM_CHAT_INTERVAL})'
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=TELEGRAM_BATCH_SIZE,
+            help=f'Уведомлений за одну выборку (по умолчанию: {TELEGRAM_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--window',
+            type=float,
+            default=TELEGRAM_DIGEST_WINDOW,
+            help=f'Окно накопления дайджеста входов в секундах (по умолчанию: {TELEGRAM_DIGEST_WINDOW})'
+        )
+    
+    def handle(self, *args, **options):
+        sender = get_sender(
+            chat_interval=options['chat_interval'],
+            batch_size=options['batch'],
+            digest_window=options['window'],
+        )
+        if sender is None:
+            raise CommandError('TELEGRAM_BOT_TOKEN не настроен')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'🚀 Запуск отправки уведомлений Telegram...')
+        )
+        self.stdout.write(f'   Интервал на чат: {sender.limiter.interval} с, пачка: {sender.batch_size}')
+        self.stdout.write(f'   Дайджест: {", ".join(sender.digest_events) or "нет"} раз в {sender.digest_window} с')
+        
+        try:
+            asyncio.run(sender.run(interval=options['interval'], once=options['once'], on_stats=self._report))
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹ Остановка...')
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'❌ Ошибка отправки уведомлений: {e}'))
+            logger.exception('Error sending telegram notifications')
+            raise
+        finally:
+            self._report(sender.stats)
+    
+    def _report(self, stats):
+        """Вывести счётчики отправки"""
+        self.stdout.write(
+            f'[{timezone.now().strftime("%H:%M:%S")}] 📨 Отправлено: {stats["sent"]} '
+            f'(дайджестов: {stats["digests"]}), '
+            f'повторов: {stats["retried"]}, не отправлено: {stats["failed"]}'
+        )
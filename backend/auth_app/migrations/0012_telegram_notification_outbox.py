@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0011_alter_paymentrequisite_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('registration', 'Регистрация'), ('login', 'Вход'), ('verified', 'Верификация')], max_length=20)),
+                ('payload', models.JSONField(default=dict, help_text='Данные события (username, telegram)')),
+                ('chat_id', models.CharField(help_text='Чат для отправки', max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не отправлено')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Уведомление Telegram',
+                'verbose_name_plural': 'Уведомления Telegram',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='auth_app_te_status_ef62c1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0012_telegram_notification_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['created_at', 'id'], name='auth_app_us_created_744392_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['is_verified', 'id'], name='auth_app_us_is_veri_efe568_idx'),
+        ),
+    ]
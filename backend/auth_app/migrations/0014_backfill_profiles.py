@@ -0,0 +1,33 @@
+# Профили пользователям, созданным до сигнала post_save (auth_app/signals.py)
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('auth_app', 'UserProfile')
+    
+    users = User.objects.filter(profile__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:1000])
+        if not batch:
+            break
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id) for user_id in batch],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth_app', '0013_userprofile_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+    ]
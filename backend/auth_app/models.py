@@ -65,6 +65,25 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = "Профиль пользователя"
         verbose_name_plural = "Профили пользователей"
+        indexes = [
+            # Keyset-пагинация списка пользователей (ListUsersView)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['is_verified', 'id']),
+        ]
+
+
+def get_or_create_profile(user) -> UserProfile:
+    """
+    Профиль пользователя. Профиль создаётся вместе с пользователем
+    (signals.py); пользователю, созданному в обход сигнала (raw-загрузка,
+    SQL), недостающий профиль создаётся здесь.
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
 
 
 class BalanceHistory(models.Model):
@@ -181,3 +200,45 @@ class PaymentRequisite(models.Model):
         verbose_name_plural = "Платежные реквизиты"
         ordering = ['-created_at']
         unique_together = [['user', 'payment_id']]
+
+
+class TelegramNotification(models.Model):
+    """
+    Очередь (outbox) уведомлений в Telegram.
+    Запрос только добавляет запись, отправку выполняет команда
+    send_telegram_notifications.
+    """
+    
+    EVENT_TYPE_CHOICES = [
+        ('registration', 'Регистрация'),
+        ('login', 'Вход'),
+        ('verified', 'Верификация'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Не отправлено'),
+    ]
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    payload = models.JSONField(default=dict, help_text="Данные события (username, telegram)")
+    chat_id = models.CharField(max_length=64, help_text="Чат для отправки")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_event_type_display()} - {self.payload.get('username', '')} ({self.status})"
+    
+    class Meta:
+        verbose_name = "Уведомление Telegram"
+        verbose_name_plural = "Уведомления Telegram"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
@@ -60,11 +60,9 @@ class RegisterSerializer(serializers.Serializer):
             username=validated_data["username"],
             password=validated_data["password"]
         )
-        # Создаем профиль пользователя с telegram
-        UserProfile.objects.create(
-            user=user,
-            telegram=validated_data.get("telegram", "")
-        )
+        # Профиль создан сигналом post_save, дополняем telegram
+        user.profile.telegram = validated_data.get("telegram", "")
+        user.profile.save(update_fields=['telegram'])
         return user
 
 
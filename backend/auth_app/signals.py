@@ -0,0 +1,43 @@
+"""
+Сигналы auth_app: профиль создаётся вместе с пользователем, кеш токенов
+(authentication.py) сбрасывается при выходе, смене пароля и изменении
+пользователя или профиля.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .models import UserProfile
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Профиль есть у каждого пользователя с момента создания, поэтому
+    чтение профиля - всегда простой SELECT. Пользователей, созданных до
+    этого сигнала, дополняет миграция 0014_backfill_profiles.
+    """
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Выход и смена пароля удаляют токен"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Логин, пароль, права и активность пользователя"""
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_tokens(sender, instance, **kwargs):
+    """Профиль (telegram, верификация, баланс) кешируется вместе с токеном"""
+    token_cache.invalidate_user(instance.user_id)
@@ -1,108 +1,375 @@
+"""
+Уведомления администраторам в Telegram.
+Запросы только ставят уведомление в очередь TelegramNotification
+(send_notification_sync), отправляет их долгоживущий процесс
+send_telegram_notifications (TelegramSender): один Bot с одним HTTP
+соединением и ограничением частоты сообщений на чат. Массовые события
+(входы) объединяются в дайджест - одно сообщение на чат за окно.
+"""
+import os
+import math
+import time
+import random
 import asyncio
 import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F, Min
+from django.utils import timezone
 from telegram import Bot
-from telegram.error import TelegramError
+from telegram.error import TelegramError, RetryAfter, NetworkError
 
 logger = logging.getLogger(__name__)
 
+# Минимальный интервал между сообщениями в один чат, секунд
+# (Telegram допускает ~20 сообщений в минуту в группу)
+TELEGRAM_CHAT_INTERVAL = float(os.environ.get('TELEGRAM_CHAT_INTERVAL', 3.0))
+
+# Уведомлений, забираемых из очереди за один проход (и максимум в дайджесте)
+TELEGRAM_BATCH_SIZE = int(os.environ.get('TELEGRAM_BATCH_SIZE', 1000))
+
+# Типы событий, которые отправляются только дайджестом, и окно накопления (секунды):
+# не больше одного сообщения о входах на чат за окно
+TELEGRAM_DIGEST_EVENTS = [
+    event_type.strip()
+    for event_type in os.environ.get('TELEGRAM_DIGEST_EVENTS', 'login').split(',')
+    if event_type.strip()
+]
+TELEGRAM_DIGEST_WINDOW = float(os.environ.get('TELEGRAM_DIGEST_WINDOW', 60))
+
+# Регистрации и верификации идут по одной, но если за выборку их больше
+# порога - объединяются в дайджест
+TELEGRAM_DIGEST_THRESHOLD = int(os.environ.get('TELEGRAM_DIGEST_THRESHOLD', 5))
+
+# Сколько имён пользователей перечислять в дайджесте
+TELEGRAM_DIGEST_MAX_NAMES = int(os.environ.get('TELEGRAM_DIGEST_MAX_NAMES', 20))
+
+# Количество попыток до статуса failed и параметры backoff (секунды)
+TELEGRAM_MAX_ATTEMPTS = int(os.environ.get('TELEGRAM_MAX_ATTEMPTS', 8))
+TELEGRAM_BACKOFF_BASE = int(os.environ.get('TELEGRAM_BACKOFF_BASE', 5))
+TELEGRAM_BACKOFF_MAX = int(os.environ.get('TELEGRAM_BACKOFF_MAX', 600))
+
+
+def render_notification(event_type: str, payload: Dict) -> str:
+    """Текст уведомления (HTML)"""
+    username = payload.get('username', '')
+    telegram = payload.get('telegram')
+    
+    if event_type == "registration":
+        return (
+            f"🎉 <b>Новая регистрация!</b>\n\n"
+            f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
+            + (f"💬 <b>Telegram:</b> <a href='https://t.me/{telegram.lstrip('@')}'><code>{telegram}</code></a>\n" if telegram else "")
+            + f"⏰ <b>Время:</b> только что\n"
+            + f"❌ <b>Статус:</b> Не верифицирован"
+        )
+    if event_type == "login":
+        return (
+            f"🔓 <b>Вход в систему!</b>\n\n"
+            f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
+            f"⏰ <b>Время:</b> только что"
+        )
+    if event_type == "verified":
+        return (
+            f"✅ <b>Пользователь верифицирован!</b>\n\n"
+            f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
+            f"⏰ <b>Время:</b> только что\n"
+            f"✔️ <b>Статус:</b> Верифицирован"
+        )
+    raise ValueError(f"Unknown notification type: {event_type}")
+
+
+DIGEST_TITLES = {
+    "registration": "🎉 <b>Новые регистрации</b>",
+    "login": "🔓 <b>Входы в систему</b>",
+    "verified": "✅ <b>Верифицированы</b>",
+}
+
+
+def render_digest(event_type: str, notifications: List['TelegramNotification']) -> str:
+    """Текст дайджеста (HTML): количество, период и первые имена"""
+    if event_type not in DIGEST_TITLES:
+        raise ValueError(f"Unknown notification type: {event_type}")
+    
+    oldest = min(notification.created_at for notification in notifications)
+    minutes = max(1, math.ceil((timezone.now() - oldest).total_seconds() / 60))
+    
+    usernames = []
+    for notification in notifications:
+        username = notification.payload.get('username', '')
+        if username not in usernames:
+            usernames.append(username)
+    names = ', '.join(f"<code>{username}</code>" for username in usernames[:TELEGRAM_DIGEST_MAX_NAMES])
+    if len(usernames) > TELEGRAM_DIGEST_MAX_NAMES:
+        names += f" и ещё {len(usernames) - TELEGRAM_DIGEST_MAX_NAMES}"
+    
+    return (
+        f"{DIGEST_TITLES[event_type]}: {len(notifications)} за {minutes} мин.\n\n"
+        f"👤 {names}"
+    )
+
+
+def send_notification_sync(username: str, event_type: str = "registration", telegram: str = None):
+    """
+    Поставить уведомление в очередь (один INSERT, без обращения к Telegram).
+    Отправляет команда send_telegram_notifications.
+    """
+    from .models import TelegramNotification
+    
+    chat_id = getattr(settings, 'TELEGRAM_CHAT_ID', '')
+    if not getattr(settings, 'TELEGRAM_BOT_TOKEN', '') or not chat_id:
+        return
+    
+    payload = {'username': username}
+    if telegram:
+        payload['telegram'] = telegram
+    TelegramNotification.objects.create(event_type=event_type, payload=payload, chat_id=chat_id)
+
+
+def notification_backoff(attempts: int) -> float:
+    """Задержка перед следующей попыткой: экспонента с jitter"""
+    delay = min(TELEGRAM_BACKOFF_MAX, TELEGRAM_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class ChatRateLimiter:
+    """Не чаще одного сообщения в interval секунд на чат"""
+    
+    def __init__(self, interval: float = TELEGRAM_CHAT_INTERVAL):
+        self.interval = interval
+        self._next_at: Dict[str, float] = {}
+    
+    async def wait(self, chat_id: str):
+        now = time.monotonic()
+        next_at = self._next_at.get(chat_id, now)
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+        self._next_at[chat_id] = max(now, next_at) + self.interval
+    
+    def block(self, chat_id: str, seconds: float):
+        """Telegram ответил 429 - чат недоступен seconds секунд"""
+        self._next_at[chat_id] = max(self._next_at.get(chat_id, 0), time.monotonic() + seconds)
+
 
-class TelegramNotifier:
-    """Класс для отправки уведомлений в Telegram"""
+class TelegramMessage:
+    """
+    Одно сообщение в Telegram: отдельное уведомление или дайджест
+    нескольких уведомлений одного типа.
+    """
     
-    def __init__(self, bot_token: str, chat_id: str):
+    def __init__(self, chat_id: str, event_type: str, notifications: List['TelegramNotification']):
+        self.chat_id = chat_id
+        self.event_type = event_type
+        self.notifications = notifications
+    
+    @property
+    def is_digest(self) -> bool:
+        return len(self.notifications) > 1
+    
+    @property
+    def pks(self) -> List[int]:
+        return [notification.pk for notification in self.notifications]
+    
+    def render(self) -> str:
+        if self.is_digest:
+            return render_digest(self.event_type, self.notifications)
+        notification = self.notifications[0]
+        return render_notification(notification.event_type, notification.payload)
+
+
+class TelegramSender:
+    """
+    Отправка уведомлений из очереди. Чаты обрабатываются параллельно,
+    сообщения одного чата - по очереди с интервалом ChatRateLimiter.
+    
+    События TELEGRAM_DIGEST_EVENTS (входы) копятся TELEGRAM_DIGEST_WINDOW
+    секунд и уходят одним дайджестом на чат. Регистрации и верификации
+    отправляются первыми и по одной, а при всплеске (больше
+    TELEGRAM_DIGEST_THRESHOLD за выборку) - тоже дайджестом, так что
+    число сообщений не зависит от нагрузки.
+    """
+    
+    def __init__(self, bot_token: str, chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 batch_size: int = TELEGRAM_BATCH_SIZE, digest_window: float = TELEGRAM_DIGEST_WINDOW,
+                 digest_events=TELEGRAM_DIGEST_EVENTS, digest_threshold: int = TELEGRAM_DIGEST_THRESHOLD):
+        self.bot = Bot(token=bot_token)
+        self.limiter = ChatRateLimiter(chat_interval)
+        self.batch_size = batch_size
+        self.digest_window = digest_window
+        self.digest_events = list(digest_events)
+        self.digest_threshold = digest_threshold
+        self.stats = {'sent': 0, 'digests': 0, 'retried': 0, 'failed': 0}
+    
+    async def run(self, interval: float = 1.0, once: bool = False, on_stats=None):
         """
-        Args:
-            bot_token: Токен бота Telegram (получить от @BotFather)
-            chat_id: ID чата или канала для отправки сообщений
+        Основной цикл. Bot инициализируется один раз - HTTP соединение
+        переиспользуется всеми отправками.
         """
-        self.bot = Bot(token=bot_token)
-        self.chat_id = chat_id
+        async with self.bot:
+            while True:
+                try:
+                    messages = await asyncio.to_thread(self._claim)
+                except Exception:
+                    logger.exception('Error claiming telegram notifications')
+                    messages = []
+                if messages:
+                    by_chat: Dict[str, List[TelegramMessage]] = {}
+                    for message in messages:
+                        by_chat.setdefault(message.chat_id, []).append(message)
+                    await asyncio.gather(*(self._send_chat(chat) for chat in by_chat.values()))
+                    if on_stats:
+                        on_stats(self.stats)
+                elif once:
+                    break
+                else:
+                    await asyncio.sleep(interval)
     
-    async def send_registration_notification(self, username: str, telegram: str = None):
-        """Отправить уведомление о новой регистрации"""
-        try:
-            message = (
-                f"🎉 <b>Новая регистрация!</b>\n\n"
-                f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
-                + (f"💬 <b>Telegram:</b> <a href='https://t.me/{telegram.lstrip('@')}'><code>{telegram}</code></a>\n" if telegram else "")
-                + f"⏰ <b>Время:</b> только что\n"
-                + f"❌ <b>Статус:</b> Не верифицирован"
+    def _claim(self) -> List[TelegramMessage]:
+        """
+        Забрать готовые уведомления с арендой на время отправки и
+        собрать из них сообщения: сначала срочные, затем дайджесты.
+        """
+        from .models import TelegramNotification
+        
+        close_old_connections()
+        now = timezone.now()
+        due = TelegramNotification.objects.filter(status='pending', next_attempt_at__lte=now)
+        with transaction.atomic():
+            priority = list(
+                due.select_for_update(skip_locked=True)
+                .exclude(event_type__in=self.digest_events)
+                .order_by('created_at')[:self.batch_size]
             )
             
-            await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode="HTML"
-            )
-            logger.info(f"Notification sent for user: {username}")
-        except TelegramError as e:
-            logger.error(f"Failed to send Telegram notification: {e}")
-    
-    async def send_login_notification(self, username: str):
-        """Отправить уведомление о входе пользователя"""
-        try:
-            message = (
-                f"🔓 <b>Вход в систему!</b>\n\n"
-                f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
-                f"⏰ <b>Время:</b> только что"
+            # Дайджест чата собирается, когда самое старое событие ждёт дольше окна
+            groups = (
+                due.filter(event_type__in=self.digest_events)
+                .values('chat_id', 'event_type')
+                .annotate(oldest=Min('created_at'))
+                .filter(oldest__lte=now - timedelta(seconds=self.digest_window))
             )
+            digested = []
+            for group in groups:
+                notifications = list(
+                    due.select_for_update(skip_locked=True)
+                    .filter(chat_id=group['chat_id'], event_type=group['event_type'])
+                    .order_by('created_at')[:self.batch_size]
+                )
+                if notifications:
+                    digested.append(TelegramMessage(group['chat_id'], group['event_type'], notifications))
             
-            await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode="HTML"
-            )
-            logger.info(f"Login notification sent for user: {username}")
-        except TelegramError as e:
-            logger.error(f"Failed to send Telegram notification: {e}")
-    
-    async def send_verification_notification(self, username: str):
-        """Отправить уведомление о верификации пользователя"""
-        try:
-            message = (
-                f"✅ <b>Пользователь верифицирован!</b>\n\n"
-                f"👤 <b>Пользователь:</b> <code>{username}</code>\n"
-                f"⏰ <b>Время:</b> только что\n"
-                f"✔️ <b>Статус:</b> Верифицирован"
-            )
+            messages = self._group_priority(priority) + digested
+            if not messages:
+                return []
             
-            await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode="HTML"
-            )
-            logger.info(f"Verification notification sent for user: {username}")
-        except TelegramError as e:
-            logger.error(f"Failed to send Telegram notification: {e}")
-
-
-def get_notifier() -> TelegramNotifier:
-    """Получить экземпляр TelegramNotifier с параметрами из конфигурации"""
-    from django.conf import settings
+            # Аренда: пока сообщения отправляются, другие процессы их не заберут
+            per_chat: Dict[str, int] = {}
+            for message in messages:
+                per_chat[message.chat_id] = per_chat.get(message.chat_id, 0) + 1
+            lease = max(per_chat.values()) * self.limiter.interval + 60
+            TelegramNotification.objects.filter(
+                pk__in=[pk for message in messages for pk in message.pks]
+            ).update(next_attempt_at=now + timedelta(seconds=lease))
+        return messages
     
-    bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', '')
-    chat_id = getattr(settings, 'TELEGRAM_CHAT_ID', '')
+    def _group_priority(self, notifications: List['TelegramNotification']) -> List[TelegramMessage]:
+        """По одному сообщению на уведомление, при всплеске - дайджест на чат и тип"""
+        groups: Dict[tuple, List] = {}
+        for notification in notifications:
+            groups.setdefault((notification.chat_id, notification.event_type), []).append(notification)
+        
+        messages = []
+        for (chat_id, event_type), group in groups.items():
+            if len(group) > self.digest_threshold:
+                messages.append(TelegramMessage(chat_id, event_type, group))
+            else:
+                messages.extend(TelegramMessage(chat_id, event_type, [notification]) for notification in group)
+        messages.sort(key=lambda message: message.notifications[0].created_at)
+        return messages
     
-    if not bot_token or not chat_id:
-        logger.warning("Telegram bot token or chat ID not configured")
-        return None
+    async def _send_chat(self, messages: List[TelegramMessage]):
+        for position, message in enumerate(messages):
+            await self.limiter.wait(message.chat_id)
+            try:
+                await self.bot.send_message(
+                    chat_id=message.chat_id,
+                    text=message.render(),
+                    parse_mode="HTML",
+                )
+            except RetryAfter as e:
+                # Лимит чата: остаток сообщений ждёт вместе с этим
+                retry_after = _retry_after_seconds(e)
+                self.limiter.block(message.chat_id, retry_after)
+                logger.warning(f"Telegram rate limit for chat {message.chat_id}: retry in {retry_after}s")
+                await asyncio.to_thread(self._postpone, messages[position:], retry_after)
+                return
+            except NetworkError as e:
+                await asyncio.to_thread(self._record_failure, message, str(e), retryable=True)
+            except (TelegramError, ValueError) as e:
+                await asyncio.to_thread(self._record_failure, message, str(e), retryable=False)
+            else:
+                await asyncio.to_thread(self._record_sent, message)
     
-    return TelegramNotifier(bot_token=bot_token, chat_id=chat_id)
-
-
-def send_notification_sync(username: str, event_type: str = "registration", telegram: str = None):
-    """Синхронная функция для отправки уведомлений"""
-    notifier = get_notifier()
-    if not notifier:
-        return
+    def _record_sent(self, message: TelegramMessage):
+        from .models import TelegramNotification
+        
+        TelegramNotification.objects.filter(pk__in=message.pks).update(
+            status='sent',
+            attempts=F('attempts') + 1,
+            last_error='',
+            sent_at=timezone.now(),
+        )
+        self.stats['sent'] += len(message.notifications)
+        if message.is_digest:
+            self.stats['digests'] += 1
+    
+    def _record_failure(self, message: TelegramMessage, error: str, retryable: bool):
+        """Ошибка сети - повтор с backoff; ошибка запроса (чат, текст) - сразу failed"""
+        from .models import TelegramNotification
+        
+        attempts = max(notification.attempts for notification in message.notifications) + 1
+        notifications = TelegramNotification.objects.filter(pk__in=message.pks)
+        if not retryable or attempts >= TELEGRAM_MAX_ATTEMPTS:
+            notifications.update(
+                status='failed',
+                attempts=attempts,
+                last_error=error,
+            )
+            self.stats['failed'] += len(message.notifications)
+            logger.error(f"Telegram notifications {message.pks[:10]} failed: {error}")
+        else:
+            notifications.update(
+                attempts=attempts,
+                last_error=error,
+                next_attempt_at=timezone.now() + timedelta(seconds=notification_backoff(attempts)),
+            )
+            self.stats['retried'] += len(message.notifications)
     
-    try:
-        if event_type == "registration":
-            asyncio.run(notifier.send_registration_notification(username, telegram))
-        elif event_type == "login":
-            asyncio.run(notifier.send_login_notification(username))
-        elif event_type == "verified":
-            asyncio.run(notifier.send_verification_notification(username))
-    except Exception as e:
-        logger.error(f"Error sending notification: {e}")
+    def _postpone(self, messages: List[TelegramMessage], seconds: float):
+        """Вернуть уведомления в очередь после 429 (попытка не считается)"""
+        from .models import TelegramNotification
+        
+        pks = [pk for message in messages for pk in message.pks]
+        TelegramNotification.objects.filter(pk__in=pks).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=seconds)
+        )
+        self.stats['retried'] += len(pks)
+
 
+def get_sender(**kwargs) -> Optional[TelegramSender]:
+    """TelegramSender с токеном бота из настроек"""
+    bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', '')
+    if not bot_token:
+        logger.warning("Telegram bot token not configured")
+        return None
+    return TelegramSender(bot_token=bot_token, **kwargs)
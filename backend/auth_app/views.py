@@ -7,16 +7,27 @@ from .serializers import (RegisterSerializer, LoginSerializer, UserDetailSeriali
                          AddDeviceSerializer, BalanceHistorySerializer, PaymentCountrySerializer, 
                          PaymentRequisiteSerializer, CreatePaymentRequisiteSerializer,
                          UpdateProfileSerializer, ChangePasswordSerializer)
-from .models import UserProfile, Device, BalanceHistory, PaymentCountry, PaymentRequisite
+from .models import UserProfile, Device, BalanceHistory, PaymentCountry, PaymentRequisite, get_or_create_profile
 from .telegram_notifier import send_notification_sync
 from django.views.decorators.csrf import csrf_exempt
+import os
+import json
+import base64
 import logging
 from django.utils import timezone
-from django.db.models import Sum
-from datetime import timedelta
+from django.db import connection
+from django.db.models import Sum, Q
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Размер страницы списка пользователей по умолчанию и максимум (?limit=)
+USERS_PAGE_SIZE = int(os.environ.get('USERS_PAGE_SIZE', 50))
+USERS_PAGE_SIZE_MAX = int(os.environ.get('USERS_PAGE_SIZE_MAX', 500))
+
+# До скольких записей (по оценке PostgreSQL) count считается точно через COUNT(*)
+USERS_EXACT_COUNT_LIMIT = int(os.environ.get('USERS_EXACT_COUNT_LIMIT', 10000))
+
 
 class RegisterUser(APIView):
     permission_classes = [AllowAny]
@@ -55,8 +66,9 @@ class LoginUser(APIView):
             user = serializer.validated_data["user"]
             token, created = Token.objects.get_or_create(user=user)
             
-            # Получаем или создаем профиль пользователя
-            profile, _ = UserProfile.objects.get_or_create(user=user)
+            # Профиль создаётся вместе с пользователем (auth_app/signals.py),
+            # недостающий - создаётся при входе
+            profile = get_or_create_profile(user)
             is_verified = profile.is_verified == 'verified'
             balance = float(profile.balance)
             
@@ -81,62 +93,41 @@ class LoginUser(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class LogoutUser(APIView):
+    """Выйти: удалить токен пользователя"""
+    
+    def post(self, request):
+        # Удаление токена сбрасывает его в кеше (auth_app/signals.py)
+        if request.auth is not None:
+            request.auth.delete()
+        
+        return Response({"message": "Выход выполнен"})
+
+
 class UserDetailView(APIView):
     """Получить информацию о текущем пользователе"""
     
     def get(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
+        profile = user.profile
+        role = 'admin' if user.is_superuser else 'user'
         
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-            profile, _ = UserProfile.objects.get_or_create(user=user)
-            role = 'admin' if user.is_superuser else 'user'
-            
-            return Response({
-                "id": user.id,
-                "username": user.username,
-                "role": role,
-                "telegram": profile.telegram or "",
-                "is_verified": profile.is_verified == 'verified',
-                "balance": float(profile.balance),
-                "created_at": profile.created_at.isoformat() if profile.created_at else None
-            })
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        return Response({
+            "id": user.id,
+            "username": user.username,
+            "role": role,
+            "telegram": profile.telegram or "",
+            "is_verified": profile.is_verified == 'verified',
+            "balance": float(profile.balance),
+            "created_at": profile.created_at.isoformat() if profile.created_at else None
+        })
 
 
 class UpdateProfileView(APIView):
     """Обновить профиль пользователя (логин, телеграм)"""
     
     def patch(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         serializer = UpdateProfileSerializer(data=request.data, context={'user_id': user.id})
         if not serializer.is_valid():
@@ -148,17 +139,14 @@ class UpdateProfileView(APIView):
         new_username = data.get('username', '').strip()
         if new_username:
             user.username = new_username
-            user.save()
+            user.save(update_fields=['username'])
         
         # Обновляем telegram, если указан
         new_telegram = data.get('telegram', '').strip()
+        profile = user.profile
         if new_telegram:
-            profile, _ = UserProfile.objects.get_or_create(user=user)
             profile.telegram = new_telegram
-            profile.save()
-        
-        # Получаем обновленные данные
-        profile, _ = UserProfile.objects.get_or_create(user=user)
+            profile.save(update_fields=['telegram'])
         
         return Response({
             "message": "Профиль обновлен",
@@ -171,23 +159,7 @@ class ChangePasswordView(APIView):
     """Изменить пароль пользователя"""
     
     def post(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         serializer = ChangePasswordSerializer(data=request.data)
         if not serializer.is_valid():
@@ -204,7 +176,7 @@ class ChangePasswordView(APIView):
         
         # Устанавливаем новый пароль
         user.set_password(data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
         
         # Создаем новый токен (старый токен становится недействительным после смены пароля)
         Token.objects.filter(user=user).delete()
@@ -220,23 +192,7 @@ class VerifyUserView(APIView):
     """Верифицировать пользователя (только для администратора)"""
     
     def post(self, request, user_id):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         # Проверяем, что это администратор
         if not user.is_staff:
@@ -246,8 +202,7 @@ class VerifyUserView(APIView):
             )
         
         try:
-            # Получаем или создаем профиль
-            profile, _ = UserProfile.objects.get_or_create(user_id=user_id)
+            profile = UserProfile.objects.select_related('user').get(user_id=user_id)
             profile.is_verified = 'verified'
             profile.verified_at = timezone.now()
             profile.save()
@@ -272,27 +227,59 @@ class VerifyUserView(APIView):
             )
 
 
+def _encode_users_cursor(value, pk: int) -> str:
+    """Курсор страницы: значение поля сортировки и id последней записи"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_users_cursor(cursor: str, field: str):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    value, pk = json.loads(raw)
+    if field == 'created_at':
+        value = datetime.fromisoformat(value)
+    return value, int(pk)
+
+
+def _approximate_count(queryset):
+    """
+    Количество записей. На PostgreSQL большие выборки не считаются
+    COUNT(*), а берутся из оценки планировщика (EXPLAIN).
+    Returns: (count, is_approximate)
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+    
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < USERS_EXACT_COUNT_LIMIT:
+        return queryset.count(), False
+    return estimate, True
+
+
 class ListUsersView(APIView):
-    """Получить список всех пользователей (только для администратора)"""
+    """
+    Список пользователей (только для администратора), постранично.
+    
+    GET /api/v1/auth/users?limit=50&ordering=-id&status=verified&username=ab&cursor=...
+    
+    ordering: id, -id, created_at, -created_at; status: verified, not_verified;
+    username - префикс имени. Следующая страница - cursor=next_cursor из ответа
+    (keyset: выборка по индексу без OFFSET). count - точное значение
+    или оценка (count_is_approximate).
+    """
+    
+    ORDERINGS = ('id', '-id', 'created_at', '-created_at')
     
     def get(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         # Проверяем, что это администратор
         if not user.is_staff:
@@ -301,9 +288,64 @@ class ListUsersView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        users = UserProfile.objects.all()
+        ordering = request.query_params.get('ordering', '-id')
+        if ordering not in self.ORDERINGS:
+            return Response(
+                {"error": f"ordering должен быть одним из: {', '.join(self.ORDERINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', USERS_PAGE_SIZE)), 1), USERS_PAGE_SIZE_MAX)
+        except ValueError:
+            return Response({"error": "Некорректный limit"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        profiles = UserProfile.objects.all()
+        verification_status = request.query_params.get('status')
+        if verification_status:
+            if verification_status not in dict(UserProfile.VERIFICATION_STATUS_CHOICES):
+                return Response({"error": "Некорректный status"}, status=status.HTTP_400_BAD_REQUEST)
+            profiles = profiles.filter(is_verified=verification_status)
+        username_prefix = request.query_params.get('username')
+        if username_prefix:
+            profiles = profiles.filter(user__username__startswith=username_prefix)
+        
+        count, count_is_approximate = _approximate_count(profiles)
+        
+        # Keyset: записи после последней записи предыдущей страницы
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                value, pk = _decode_users_cursor(cursor, field)
+            except (ValueError, TypeError):
+                return Response({"error": "Некорректный cursor"}, status=status.HTTP_400_BAD_REQUEST)
+            lookup = 'lt' if descending else 'gt'
+            if field == 'id':
+                profiles = profiles.filter(**{f'id__{lookup}': pk})
+            else:
+                profiles = profiles.filter(
+                    Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+                )
+        
+        order_by = [ordering] if field == 'id' else [ordering, '-id' if descending else 'id']
+        page = list(
+            profiles.select_related('user')
+            .only(
+                'id', 'public_id', 'is_verified', 'balance', 'created_at', 'verified_at',
+                'user__id', 'user__username', 'user__is_superuser',
+            )
+            .order_by(*order_by)[:limit + 1]
+        )
+        
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = _encode_users_cursor(getattr(last, field), last.id)
+        
         data = []
-        for profile in users:
+        for profile in page:
             role = 'admin' if profile.user.is_superuser else 'user'
             data.append({
                 "id": profile.user.id,
@@ -316,30 +358,19 @@ class ListUsersView(APIView):
                 "verified_at": profile.verified_at
             })
         
-        return Response(data)
+        return Response({
+            "results": data,
+            "next_cursor": next_cursor,
+            "count": count,
+            "count_is_approximate": count_is_approximate,
+        })
 
 
 class GetDevicesView(APIView):
     """Получить список устройств текущего пользователя"""
     
     def get(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         # Получаем устройства пользователя
         devices = Device.objects.filter(user=user)
@@ -351,23 +382,7 @@ class AddDeviceView(APIView):
     """Добавить новое устройство для текущего пользователя"""
     
     def post(self, request):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         serializer = AddDeviceSerializer(data=request.data)
         if serializer.is_valid():
@@ -392,23 +407,7 @@ class DeleteDeviceView(APIView):
     """Удалить устройство пользователя"""
     
     def delete(self, request, device_id):
-        # Проверяем наличие токена
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token_key = auth_header.split(' ')[1]
-        try:
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except Token.DoesNotExist:
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        user = request.user
         
         try:
             device = Device.objects.get(id=device_id, user=user)
@@ -427,20 +426,10 @@ class GetBalanceStatsView(APIView):
     """Получить статистику баланса за разные периоды"""
     
     def get(self, request):
-        # Проверяем авторизацию через header
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response({"error": "Не авторизован"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response({"error": "Неверный токен"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Получаем профиль пользователя
-        profile = UserProfile.objects.get(user=user)
+        # Профиль загружен вместе с токеном (CachedTokenAuthentication)
+        profile = user.profile
         
         # Вычисляем статистику
         now = timezone.now()
@@ -720,17 +709,7 @@ class ConvertCurrencyView(APIView):
             "amount": 1000
         }
         """
-        # Проверяем авторизацию
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response({"error": "Не авторизован"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response({"error": "Неверный токен"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         try:
             from_currency = request.data.get('from_currency', 'RUB').upper()
@@ -906,17 +885,7 @@ class GetPaymentRequisitesView(APIView):
     
     def get(self, request):
         """Получает все реквизиты текущего пользователя"""
-        # Проверяем авторизацию
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response({"error": "Не авторизован"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response({"error": "Неверный токен"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         try:
             requisites = PaymentRequisite.objects.filter(user=user).select_related('device', 'country')
@@ -942,17 +911,7 @@ class AddPaymentRequisiteView(APIView):
     
     def post(self, request):
         """Создает новый платежный реквизит для пользователя"""
-        # Проверяем авторизацию
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response({"error": "Не авторизован"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response({"error": "Неверный токен"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         try:
             serializer = CreatePaymentRequisiteSerializer(data=request.data)
@@ -991,17 +950,7 @@ class DeletePaymentRequisiteView(APIView):
     
     def delete(self, request, requisite_id):
         """Удаляет платежный реквизит пользователя"""
-        # Проверяем авторизацию
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response({"error": "Не авторизован"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response({"error": "Неверный токен"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         try:
             requisite = PaymentRequisite.objects.get(id=requisite_id, user=user)
@@ -1026,23 +975,7 @@ class AdjustUserBalanceView(APIView):
     """Изменение баланса пользователя (только для администратора)"""
     
     def post(self, request, user_id):
-        # Проверяем авторизацию
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if not auth_header.startswith('Token '):
-            return Response(
-                {"error": "Не авторизован"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        try:
-            token_key = auth_header.split(' ')[1]
-            token = Token.objects.get(key=token_key)
-            admin_user = token.user
-        except (Token.DoesNotExist, IndexError):
-            return Response(
-                {"error": "Неверный токен"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        admin_user = request.user
         
         # Проверяем, что это администратор
         if not admin_user.is_staff:
@@ -44,6 +44,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1",
 ]
 CORS_ALLOW_ALL_ORIGINS = DEBUG
+CORS_EXPOSE_HEADERS = ['X-Last-Checked']
 
 
 # Application definition
@@ -79,7 +80,7 @@ MIDDLEWARE = [
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'auth_app.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
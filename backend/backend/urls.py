@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.views.decorators.csrf import csrf_exempt
 from merchants.views import RegisterMerchant, ListMerchants
 from payments.views import CreatePayment, ListPayments, CreateWithdrawalView, ListWithdrawalsView, CancelWithdrawalView
-from auth_app.views import (RegisterUser, LoginUser, VerifyUserView, ListUsersView, UserDetailView, 
+from auth_app.views import (RegisterUser, LoginUser, LogoutUser, VerifyUserView, ListUsersView, UserDetailView, 
                            GetDevicesView, AddDeviceView, DeleteDeviceView, GetBalanceStatsView, 
                            GetCurrencyPairsView, ConvertCurrencyView,
                            GetPaymentCountriesView, GetPaymentRequisitesView, AddPaymentRequisiteView, 
@@ -21,6 +21,7 @@ urlpatterns = [
     
     path("api/v1/auth/register", RegisterUser.as_view()),
     path("api/v1/auth/login", LoginUser.as_view()),
+    path("api/v1/auth/logout", LogoutUser.as_view()),
     path("api/v1/auth/me", UserDetailView.as_view()),
     path("api/v1/auth/profile/update", csrf_exempt(UpdateProfileView.as_view())),
     path("api/v1/auth/password/change", csrf_exempt(ChangePasswordView.as_view())),
@@ -0,0 +1,185 @@
+"""
+Пул заранее созданных платёжных адресов.
+Генерация адреса (secp256k1 + хеширование + шифрование Fernet) слишком
+дорогая для запроса создания платежа, поэтому адреса создаются фоново
+командой refill_address_pool, а create_payment только забирает
+первый свободный адрес пула (PAYMENT_ADDRESS_MODE=pool).
+При настроенном HD-кошельке (hd_wallet.py) адреса пула выводятся по
+derivation_index и приватные ключи в БД не хранятся.
+"""
+import os
+import logging
+from datetime import timedelta
+from typing import Dict, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .hd_wallet import HD_DERIVED_KEY
+
+logger = logging.getLogger(__name__)
+
+# Пул пополняется, когда свободных адресов меньше нижней границы...
+ADDRESS_POOL_LOW_WATERMARK = int(os.environ.get('ADDRESS_POOL_LOW_WATERMARK', 200))
+
+# ...до целевого размера
+ADDRESS_POOL_TARGET = int(os.environ.get('ADDRESS_POOL_TARGET', 1000))
+
+# Адресов в одном bulk insert при пополнении
+ADDRESS_POOL_BATCH_SIZE = int(os.environ.get('ADDRESS_POOL_BATCH_SIZE', 100))
+
+# Попыток забрать или создать адрес, когда параллельный запрос (или
+# пополнение) занял тот же HD-индекс
+ADDRESS_POOL_CLAIM_ATTEMPTS = int(os.environ.get('ADDRESS_POOL_CLAIM_ATTEMPTS', 5))
+
+
+class AddressPool:
+    """
+    Выдача и пополнение пула PaymentAddress.
+    Свободный адрес: in_pool=True, assigned_at=NULL (частичный индекс
+    address_pool_free_idx).
+    """
+    
+    def __init__(self, wallet_generator: 'TronWalletGenerator', encryption: 'CryptoEncryption' = None,
+                 hd_wallet: 'HDWallet' = None, workers: int = 1):
+        self.wallet_generator = wallet_generator
+        self.encryption = encryption
+        self.hd_wallet = hd_wallet
+        # Процессов для пакетной HD-деривации
+        self.workers = workers
+    
+    def claim(self, create_if_empty: bool = True) -> 'PaymentAddress':
+        """
+        Забрать свободный адрес пула. Первая свободная строка блокируется
+        с SKIP LOCKED, поэтому параллельные запросы получают разные адреса
+        и не ждут друг друга. Если пул пуст - адрес создаётся на месте;
+        параллельные запросы (или пополнение) могут вывести тот же
+        HD-индекс - тогда попытка повторяется: снова из пула, затем от
+        нового максимального индекса.
+        """
+        from .models import PaymentAddress
+        
+        for attempt in range(ADDRESS_POOL_CLAIM_ATTEMPTS):
+            now = timezone.now()
+            with transaction.atomic():
+                address = (
+                    PaymentAddress.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(in_pool=True, assigned_at__isnull=True)
+                    .order_by('id')
+                    .first()
+                )
+                if address is not None:
+                    PaymentAddress.objects.filter(pk=address.pk).update(assigned_at=now)
+                    address.assigned_at = now
+                    return address
+            
+            if not create_if_empty:
+                raise ValueError("Пул платёжных адресов пуст")
+            
+            logger.warning("Payment address pool is empty - generating address inline")
+            address = self._build_addresses(1)[0]
+            address.assigned_at = now
+            try:
+                # Savepoint: конфликт не прерывает внешнюю транзакцию (create_payment)
+                with transaction.atomic():
+                    address.save()
+                return address
+            except IntegrityError:
+                logger.warning(f"Payment address {address.address} taken concurrently, retrying")
+        
+        raise ValueError("Не удалось выделить платёжный адрес, попробуйте позже")
+    
+    def available(self) -> int:
+        """Количество свободных адресов в пуле"""
+        from .models import PaymentAddress
+        
+        return PaymentAddress.objects.filter(in_pool=True, assigned_at__isnull=True).count()
+    
+    def refill(self, low_watermark: int = None, target: int = None,
+               batch_size: int = None) -> int:
+        """
+        Пополнить пул до target, если свободных адресов меньше low_watermark.
+        Returns: количество созданных адресов
+        """
+        from .models import PaymentAddress
+        
+        low_watermark = ADDRESS_POOL_LOW_WATERMARK if low_watermark is None else low_watermark
+        target = target or ADDRESS_POOL_TARGET
+        batch_size = batch_size or ADDRESS_POOL_BATCH_SIZE
+        
+        depth = self.available()
+        if depth >= low_watermark:
+            return 0
+        
+        created = 0
+        while depth + created < target:
+            count = min(batch_size, target - depth - created)
+            PaymentAddress.objects.bulk_create(self._build_addresses(count))
+            created += count
+        return created
+    
+    def stats(self) -> Dict:
+        """Метрики пула: глубина и скорость пополнения/расхода за час"""
+        from .models import PaymentAddress
+        
+        hour_ago = timezone.now() - timedelta(hours=1)
+        pool = PaymentAddress.objects.filter(in_pool=True)
+        return {
+            'available': pool.filter(assigned_at__isnull=True).count(),
+            'assigned': pool.filter(assigned_at__isnull=False).count(),
+            'created_last_hour': pool.filter(created_at__gte=hour_ago).count(),
+            'assigned_last_hour': pool.filter(assigned_at__gte=hour_ago).count(),
+            'low_watermark': ADDRESS_POOL_LOW_WATERMARK,
+            'target': ADDRESS_POOL_TARGET,
+        }
+    
+    def _build_addresses(self, count: int) -> List['PaymentAddress']:
+        """Сгенерировать адреса с зашифрованными ключами (без сохранения)"""
+        from .models import PaymentAddress
+        
+        # Не пополняем пул адресами, не соответствующими ключам
+        self.wallet_generator.check_derivation()
+        
+        if self.hd_wallet is not None:
+            return self._derive_addresses(count)
+        
+        if self.encryption is None:
+            raise ValueError("CRYPTO_ENCRYPTION_KEY не настроен - ключи адресов пула нельзя сохранить")
+        
+        addresses = []
+        for _ in range(count):
+            private_key, address = self.wallet_generator.generate_keypair()
+            addresses.append(PaymentAddress(
+                address=address,
+                private_key_encrypted=self.encryption.encrypt(private_key),
+                derivation_index=0,
+                in_pool=True,
+            ))
+        return addresses
+    
+    def _derive_addresses(self, count: int) -> List['PaymentAddress']:
+        """
+        HD-адреса следующих свободных индексов (без сохранения).
+        Индекс - после максимального среди HD-адресов; параллельные
+        пополнения и создание адреса в claim получат одинаковые адреса, и
+        второй упадёт на unique ограничении address, не создав дублей
+        (claim при этом повторяет попытку).
+        """
+        from .models import PaymentAddress
+        
+        last_index = PaymentAddress.objects.filter(
+            private_key_encrypted=HD_DERIVED_KEY,
+        ).aggregate(last=Max('derivation_index'))['last']
+        start = 0 if last_index is None else last_index + 1
+        
+        return [
+            PaymentAddress(
+                address=address,
+                private_key_encrypted=HD_DERIVED_KEY,
+                derivation_index=index,
+                in_pool=True,
+            )
+            for index, address in self.hd_wallet.derive_addresses(start, count, workers=self.workers)
+        ]
@@ -1,10 +1,15 @@
 from django.contrib import admin
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from django.utils.html import format_html
-from decimal import Decimal
-from .models import CryptoWallet, PaymentAddress, CryptoPayment, TransactionLog
-from auth_app.models import BalanceHistory
+from urllib.parse import urlsplit
+from .models import (
+    CryptoWallet, PaymentAddress, AddressCursor, ApiRateBucket, CryptoPayment, TransactionLog,
+    CallbackDelivery, CallbackAttempt,
+)
+from .balance import credit_payments
 
 
 @admin.register(CryptoWallet)
@@ -17,10 +22,23 @@ class CryptoWalletAdmin(admin.ModelAdmin):
 
 @admin.register(PaymentAddress)
 class PaymentAddressAdmin(admin.ModelAdmin):
-    list_display = ['address', 'derivation_index', 'is_used', 'created_at']
-    list_filter = ['is_used']
+    list_display = ['address', 'derivation_index', 'is_used', 'in_pool', 'assigned_at', 'created_at']
+    list_filter = ['is_used', 'in_pool']
     search_fields = ['address']
-    readonly_fields = ['created_at', 'derivation_index']
+    readonly_fields = ['created_at', 'derivation_index', 'assigned_at']
+
+
+@admin.register(AddressCursor)
+class AddressCursorAdmin(admin.ModelAdmin):
+    list_display = ['address', 'last_block_number', 'last_block_timestamp', 'leased_by', 'lease_expires_at', 'updated_at']
+    search_fields = ['address', 'leased_by']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(ApiRateBucket)
+class ApiRateBucketAdmin(admin.ModelAdmin):
+    list_display = ['key', 'tokens', 'refilled_at']
+    readonly_fields = ['key', 'tokens', 'refilled_at']
 
 
 @admin.register(CryptoPayment)
@@ -42,6 +60,8 @@ class CryptoPaymentAdmin(admin.ModelAdmin):
         'created_at', 
         'updated_at', 
         'completed_at',
+        'credited_at',
+        'last_checked_at',
         'get_user_info',
         'get_wallet_address_display'
     ]
@@ -56,17 +76,17 @@ class CryptoPaymentAdmin(admin.ModelAdmin):
             'fields': ('payment_id', 'get_user_info', 'currency', 'status')
         }),
         ('Суммы', {
-            'fields': ('amount_expected', 'amount_received')
+            'fields': ('amount_requested', 'amount_expected', 'amount_received')
         }),
         ('Адрес для оплаты', {
             'fields': ('payment_address', 'get_wallet_address_display')
         }),
         ('Транзакция', {
-            'fields': ('tx_hash', 'confirmations'),
+            'fields': ('tx_hash', 'confirmations', 'last_checked_at'),
             'classes': ('collapse',)
         }),
         ('Даты', {
-            'fields': ('expires_at', 'completed_at', 'created_at', 'updated_at'),
+            'fields': ('expires_at', 'completed_at', 'credited_at', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
         ('Дополнительно', {
@@ -143,7 +163,8 @@ class CryptoPaymentAdmin(admin.ModelAdmin):
         errors = []
         
         for payment in queryset:
-            if payment.status == 'completed':
+            # Завершённый монитором, но не зачисленный платёж можно зачислить
+            if payment.credited_at:
                 errors.append(f"#{payment.payment_id} уже подтверждён")
                 continue
             
@@ -152,32 +173,23 @@ class CryptoPaymentAdmin(admin.ModelAdmin):
                 continue
             
             try:
-                # Начисляем баланс пользователю
-                profile = payment.user.profile
-                amount_to_add = payment.amount_expected
-                
-                balance_before = Decimal(str(profile.balance))
-                profile.balance = balance_before + Decimal(str(amount_to_add))
-                profile.save()
-                
-                # Создаём запись в истории баланса
-                BalanceHistory.objects.create(
-                    user=payment.user,
-                    transaction_type='deposit',
-                    amount=Decimal(str(amount_to_add)),
-                    balance_before=balance_before,
-                    balance_after=profile.balance,
-                    description=f'Крипто депозит #{payment.payment_id}'
-                )
+                with transaction.atomic():
+                    if payment.status != 'completed':
+                        # Подтверждение вручную: считаем полученной запрошенную сумму
+                        payment.status = 'completed'
+                        payment.amount_received = payment.amount_requested or payment.amount_expected
+                        payment.completed_at = timezone.now()
+                        payment.save()
+                    
+                    # Начисляем баланс пользователю (повторно не начисляется)
+                    credited = credit_payments([payment.pk])
                 
-                # Обновляем статус платежа
-                payment.status = 'completed'
-                payment.amount_received = amount_to_add
-                payment.completed_at = timezone.now()
-                payment.save()
+                if not credited:
+                    errors.append(f"#{payment.payment_id} уже подтверждён")
+                    continue
                 
                 approved_count += 1
-                
+
             except Exception as e:
                 errors.append(f"#{payment.payment_id} - ошибка: {str(e)}")
         
@@ -244,11 +256,41 @@ class CryptoPaymentAdmin(admin.ModelAdmin):
         )
 
 
+class ReconciliationFilter(admin.SimpleListFilter):
+    """
+    Очередь сверки: переводы, не сопоставленные ни одному открытому
+    платежу. Курсор адреса уже прошёл их, монитор к ним не вернётся -
+    например, оплата, пришедшая после истечения платежа.
+    """
+    title = 'Сверка'
+    parameter_name = 'reconcile'
+    
+    def lookups(self, request, model_admin):
+        return [
+            ('unmatched', 'Не сопоставлены'),
+            ('expired', 'Сумма истёкшего платежа'),
+        ]
+    
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        
+        queryset = queryset.filter(payment__isnull=True, processed=False)
+        if self.value() == 'expired':
+            queryset = queryset.filter(Exists(CryptoPayment.objects.filter(
+                status='expired',
+                payment_address__address=OuterRef('to_address'),
+                currency=OuterRef('currency'),
+                amount_expected=OuterRef('amount'),
+            )))
+        return queryset
+
+
 @admin.register(TransactionLog)
 class TransactionLogAdmin(admin.ModelAdmin):
     list_display = ['tx_hash_short', 'from_address_short', 'to_address_short', 'amount', 
-                    'currency', 'confirmations', 'processed', 'created_at']
-    list_filter = ['currency', 'processed', 'created_at']
+                    'currency', 'confirmations', 'processed', 'payment', 'created_at']
+    list_filter = [ReconciliationFilter, 'currency', 'processed', 'created_at']
     search_fields = ['tx_hash', 'from_address', 'to_address']
     readonly_fields = ['created_at']
     raw_id_fields = ['payment']
@@ -264,3 +306,37 @@ class TransactionLogAdmin(admin.ModelAdmin):
     @admin.display(description='Кому')
     def to_address_short(self, obj):
         return f"{obj.to_address[:6]}...{obj.to_address[-4:]}" if obj.to_address else "—"
+
+
+class CallbackAttemptInline(admin.TabularInline):
+    model = CallbackAttempt
+    extra = 0
+    can_delete = False
+    readonly_fields = ['status_code', 'error', 'duration_ms', 'created_at']
+
+
+@admin.register(CallbackDelivery)
+class CallbackDeliveryAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'url', 'status', 'attempts', 'next_attempt_at', 'delivered_at', 'created_at']
+    list_filter = ['status', 'host', 'created_at']
+    search_fields = ['payment__payment_id', 'url']
+    readonly_fields = ['host', 'payload', 'attempts', 'last_error', 'delivered_at', 'created_at']
+    raw_id_fields = ['payment']
+    inlines = [CallbackAttemptInline]
+    actions = ['retry_now']
+    
+    def save_model(self, request, obj, form, change):
+        obj.host = urlsplit(obj.url).netloc
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='🔁 Повторить отправку')
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status='delivered').update(
+            status='pending',
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(
+            request,
+            f"🔁 Поставлено в очередь: {count} callback",
+            messages.SUCCESS
+        )
@@ -0,0 +1,101 @@
+"""
+Зачисление завершённых крипто-платежей на баланс пользователя.
+Баланс профиля и запись BalanceHistory меняются в одной транзакции со
+сменой статуса платежа; отметка credited_at не даёт зачислить платёж
+повторно (монитор, параллельный воркер, подтверждение в админке).
+
+По умолчанию платежи зачисляет администратор (admin_approve_deposit,
+действие в админке). Монитор зачисляет сам только при
+PAYMENT_AUTO_CREDIT: его подтверждения - оценка номера блока по
+block_timestamp, а не номер блока транзакции.
+"""
+import os
+from decimal import Decimal, ROUND_DOWN
+from typing import List
+
+from django.db import transaction
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+# Зачислять завершённые монитором платежи без подтверждения администратора
+PAYMENT_AUTO_CREDIT = os.getenv('PAYMENT_AUTO_CREDIT', 'False').lower() in ('true', '1', 'yes')
+
+
+def credit_amount(payment) -> Decimal:
+    """
+    Сумма зачисления: запрошенная (без micro-добавки к ожидаемой), но не
+    больше полученной, если платёж оплачен не полностью. Платёж на
+    адресе пула засчитывает любой перевод - зачисляется полученная сумма.
+    """
+    if payment.payment_address.in_pool and payment.amount_received > 0:
+        return Decimal(str(payment.amount_received)).quantize(CENT, rounding=ROUND_DOWN)
+    amount = payment.amount_requested or payment.amount_expected
+    if payment.amount_received < payment.amount_expected:
+        amount = min(amount, payment.amount_received)
+    return Decimal(str(amount)).quantize(CENT, rounding=ROUND_DOWN)
+
+
+def _invalidate_tokens(user_ids):
+    """Сбросить кеш токенов (с профилем) пользователей в этом процессе"""
+    from auth_app.authentication import token_cache
+    
+    for user_id in user_ids:
+        token_cache.invalidate_user(user_id)
+
+
+def credit_payments(payment_ids) -> List[int]:
+    """
+    Зачислить завершённые и ещё не зачисленные платежи на баланс.
+    Вызывается внутри транзакции, завершившей платежи; строки платежей
+    и профилей блокируются до её конца.
+    bulk_update не шлёт post_save, поэтому кеш токенов (профиль с
+    балансом) сбрасывается здесь, после фиксации транзакции.
+    Returns: id зачисленных платежей
+    """
+    from auth_app.models import UserProfile, BalanceHistory
+    from .models import CryptoPayment
+    
+    credited = []
+    with transaction.atomic():
+        payments = list(
+            CryptoPayment.objects.select_for_update(of=('self',)).select_related('payment_address').filter(
+                pk__in=list(payment_ids),
+                status='completed',
+                credited_at__isnull=True,
+                user__isnull=False,
+            ).order_by('pk')
+        )
+        if not payments:
+            return credited
+        
+        # Профили блокируются в порядке user_id - без взаимных блокировок
+        user_ids = sorted({payment.user_id for payment in payments})
+        for user_id in user_ids:
+            UserProfile.objects.get_or_create(user_id=user_id)
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+        }
+        
+        history = []
+        for payment in payments:
+            amount = credit_amount(payment)
+            profile = profiles[payment.user_id]
+            balance_before = Decimal(str(profile.balance))
+            profile.balance = balance_before + amount
+            history.append(BalanceHistory(
+                user_id=payment.user_id,
+                transaction_type='deposit',
+                amount=amount,
+                balance_before=balance_before,
+                balance_after=profile.balance,
+                description=f'Крипто депозит #{payment.payment_id}'
+            ))
+            credited.append(payment.pk)
+        
+        UserProfile.objects.bulk_update(profiles.values(), ['balance'])
+        BalanceHistory.objects.bulk_create(history)
+        CryptoPayment.objects.filter(pk__in=credited).update(credited_at=timezone.now())
+        transaction.on_commit(lambda: _invalidate_tokens(user_ids))
+    return credited
@@ -0,0 +1,213 @@
+"""
+Доставка callback-уведомлений мерчантам из очереди CallbackDelivery.
+Запросы выполняются пулом потоков с ограничением одновременных
+запросов на один хост и экспоненциальными повторами при ошибках.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Размер пула потоков доставки
+CALLBACK_WORKERS = int(os.environ.get('CALLBACK_WORKERS', 16))
+
+# Максимум одновременных запросов на один хост мерчанта
+CALLBACK_PER_HOST_CONCURRENCY = int(os.environ.get('CALLBACK_PER_HOST_CONCURRENCY', 2))
+
+# Таймаут запроса (секунды)
+CALLBACK_TIMEOUT = int(os.environ.get('CALLBACK_TIMEOUT', 10))
+
+# Количество попыток до статуса failed и параметры backoff (секунды)
+CALLBACK_MAX_ATTEMPTS = int(os.environ.get('CALLBACK_MAX_ATTEMPTS', 10))
+CALLBACK_BACKOFF_BASE = int(os.environ.get('CALLBACK_BACKOFF_BASE', 30))
+CALLBACK_BACKOFF_MAX = int(os.environ.get('CALLBACK_BACKOFF_MAX', 6 * 3600))
+
+
+def build_callback_payload(payment) -> Dict:
+    """Данные callback о платеже"""
+    return {
+        'payment_id': payment.payment_id,
+        'status': payment.status,
+        'amount_expected': str(payment.amount_expected),
+        'amount_received': str(payment.amount_received),
+        'currency': payment.currency,
+        'tx_hash': payment.tx_hash,
+        'metadata': payment.metadata,
+    }
+
+
+def enqueue_callbacks(payments) -> int:
+    """
+    Поставить callback о платежах в очередь (одним INSERT).
+    Вызывается внутри транзакции, изменившей статус платежей.
+    Returns: количество добавленных записей
+    """
+    from .models import CallbackDelivery
+    
+    deliveries = [
+        CallbackDelivery(
+            payment=payment,
+            url=payment.callback_url,
+            host=urlsplit(payment.callback_url).netloc,
+            payload=build_callback_payload(payment),
+        )
+        for payment in payments if payment.callback_url
+    ]
+    CallbackDelivery.objects.bulk_create(deliveries)
+    return len(deliveries)
+
+
+def callback_backoff(attempts: int) -> float:
+    """Задержка перед следующей попыткой: экспонента с jitter"""
+    delay = min(CALLBACK_BACKOFF_MAX, CALLBACK_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class CallbackDispatcher:
+    """
+    Выбирает готовые к отправке callback и отправляет их пулом потоков.
+    На каждый хост одновременно уходит не больше per_host запросов;
+    хосты без свободных слотов исключаются в самом запросе, поэтому
+    очередь одного хоста не вытесняет callback остальных.
+    """
+    
+    def __init__(self, workers: int = CALLBACK_WORKERS,
+                 per_host: int = CALLBACK_PER_HOST_CONCURRENCY):
+        self.workers = workers
+        self.per_host = per_host
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='callback')
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self.stats = {'delivered': 0, 'retried': 0, 'failed': 0}
+    
+    def dispatch(self) -> int:
+        """
+        Забрать готовые callback и отправить их в пул.
+        Returns: количество отправленных в работу callback
+        """
+        from .models import CallbackDelivery
+        
+        with self._lock:
+            free_slots = self.workers - sum(self._in_flight.values())
+        if free_slots <= 0:
+            return 0
+        
+        now = timezone.now()
+        claimed = []
+        with transaction.atomic():
+            ready = (
+                CallbackDelivery.objects
+                .select_for_update(skip_locked=True)
+                .filter(status='pending', next_attempt_at__lte=now)
+                .order_by('next_attempt_at')
+            )
+            # Пока проход что-то забирает, повторяем без заполнившихся хостов
+            while len(claimed) < free_slots:
+                with self._lock:
+                    saturated = [host for host, count in self._in_flight.items() if count >= self.per_host]
+                candidates = (
+                    ready
+                    .exclude(host__in=saturated)
+                    .exclude(pk__in=[delivery.pk for _, delivery in claimed])[:free_slots - len(claimed)]
+                )
+                before = len(claimed)
+                with self._lock:
+                    for delivery in candidates:
+                        host = delivery.host or urlsplit(delivery.url).netloc
+                        if self._in_flight.get(host, 0) >= self.per_host:
+                            continue
+                        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+                        claimed.append((host, delivery))
+                if len(claimed) == before:
+                    break
+            
+            # Аренда: пока запрос выполняется, другие процессы его не заберут
+            lease_until = now + timedelta(seconds=CALLBACK_TIMEOUT * 3)
+            CallbackDelivery.objects.filter(
+                pk__in=[delivery.pk for _, delivery in claimed]
+            ).update(next_attempt_at=lease_until)
+        
+        for host, delivery in claimed:
+            self.executor.submit(self._deliver, host, delivery)
+        
+        return len(claimed)
+    
+    def _deliver(self, host: str, delivery: 'CallbackDelivery'):
+        """Отправить один callback и записать результат попытки"""
+        from .models import CallbackDelivery, CallbackAttempt
+        
+        started = time.monotonic()
+        status_code, error = None, ''
+        try:
+            response = self.session.post(delivery.url, json=delivery.payload, timeout=CALLBACK_TIMEOUT)
+            status_code = response.status_code
+            if not 200 <= status_code < 300:
+                error = f"HTTP {status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        duration_ms = int((time.monotonic() - started) * 1000)
+        
+        try:
+            close_old_connections()
+            attempts = delivery.attempts + 1
+            CallbackAttempt.objects.create(
+                delivery=delivery,
+                status_code=status_code,
+                error=error,
+                duration_ms=duration_ms,
+            )
+            
+            if not error:
+                CallbackDelivery.objects.filter(pk=delivery.pk).update(
+                    status='delivered',
+                    attempts=attempts,
+                    last_error='',
+                    delivered_at=timezone.now(),
+                )
+                self._count('delivered')
+            elif attempts >= CALLBACK_MAX_ATTEMPTS:
+                CallbackDelivery.objects.filter(pk=delivery.pk).update(
+                    status='failed',
+                    attempts=attempts,
+                    last_error=error,
+                )
+                self._count('failed')
+                logger.error(f"Callback {delivery.pk} for payment {delivery.payment_id} failed: {error}")
+            else:
+                CallbackDelivery.objects.filter(pk=delivery.pk).update(
+                    attempts=attempts,
+                    last_error=error,
+                    next_attempt_at=timezone.now() + timedelta(seconds=callback_backoff(attempts)),
+                )
+                self._count('retried')
+        except Exception:
+            logger.exception(f"Error recording callback {delivery.pk} attempt")
+        finally:
+            with self._lock:
+                self._in_flight[host] -= 1
+                if not self._in_flight[host]:
+                    del self._in_flight[host]
+    
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(self._in_flight.values())
+    
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
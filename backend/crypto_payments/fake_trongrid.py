@@ -0,0 +1,333 @@
+"""
+Локальная замена TronGrid для нагрузочных тестов мониторинга.
+Реализует эндпоинты, которые использует TronGridAPI:
+
+    GET  /v1/accounts/{address}/transactions/trc20  (пагинация по fingerprint)
+    GET  /v1/accounts/{address}
+    GET  /v1/transactions/{hash}
+    POST /wallet/getnowblock
+
+Задержка, доля ошибок (429/503) и объём синтетических переводов
+настраиваются. Номер блока растёт в реальном времени (1 блок в
+block_interval секунд), транзакция считается подтверждённой через
+SOLIDIFY_DEPTH блоков. Время перевода соответствует его блоку, а в
+истории TRC20, как и у TronGrid, номера блока нет - только
+block_timestamp.
+
+Использование:
+    fake = FakeTronGrid(latency_ms=50, error_rate=0.01)
+    fake.start()                        # HTTP сервер в фоновом потоке
+    fake.add_transfer(address, 10_000000)
+    api = TronGridAPI(base_url=fake.url)
+"""
+import json
+import time
+import socket
+import random
+import base64
+import hashlib
+import threading
+from bisect import insort
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from .services import USDT_CONTRACT_ADDRESS, TRC20_PAGE_SIZE
+
+# Блоков до подтверждения (solidified) транзакции
+SOLIDIFY_DEPTH = 19
+
+# Начальный номер блока
+START_BLOCK = 60_000_000
+
+USDT_TOKEN_INFO = {
+    'symbol': 'USDT',
+    'address': USDT_CONTRACT_ADDRESS,
+    'decimals': 6,
+    'name': 'Tether USD',
+}
+
+
+class FakeTronGrid:
+    """
+    Состояние фейкового TronGrid: переводы по адресам и номер блока.
+    Методы потокобезопасны - сервер обрабатывает запросы в нескольких потоках.
+    """
+    
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0,
+                 error_rate: float = 0.0, block_interval: float = 3.0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.block_interval = block_interval
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._transfers: Dict[str, List[Tuple[int, str]]] = {}
+        self._by_hash: Dict[str, Dict] = {}
+        self._balances: Dict[str, int] = {}
+        self._seq = 0
+        self.requests: Dict[str, int] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._thread = None
+    
+    # ---------- данные ----------
+    
+    def current_block(self) -> int:
+        return START_BLOCK + int((time.time() - self._started_at) / self.block_interval)
+    
+    def add_transfer(self, to_address: str, amount_micro: int, from_address: str = None,
+                     block: int = None, timestamp_ms: int = None) -> Dict:
+        """
+        Добавить USDT перевод. По умолчанию - уже подтверждённый
+        (SOLIDIFY_DEPTH + 1 блоков назад); если задано только время,
+        блок вычисляется по нему.
+        """
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+        if block is None:
+            if timestamp_ms is None:
+                block = self.current_block() - SOLIDIFY_DEPTH - 1
+            else:
+                block = START_BLOCK + int((timestamp_ms / 1000 - self._started_at) / self.block_interval)
+        if timestamp_ms is None:
+            timestamp_ms = int((self._started_at + (block - START_BLOCK) * self.block_interval) * 1000)
+        tx = {
+            'transaction_id': hashlib.sha256(f"{to_address}:{seq}:{amount_micro}".encode()).hexdigest(),
+            'token_info': USDT_TOKEN_INFO,
+            'block_timestamp': timestamp_ms,
+            'block': block,
+            'from': from_address or 'TFakeSender' + str(seq % 1000).zfill(23),
+            'to': to_address,
+            'type': 'Transfer',
+            'value': str(amount_micro),
+        }
+        with self._lock:
+            insort(self._transfers.setdefault(to_address, []), (tx['block_timestamp'], tx['transaction_id']))
+            self._by_hash[tx['transaction_id']] = tx
+            self._balances[to_address] = self._balances.get(to_address, 0) + amount_micro
+        return tx
+    
+    def generate_transfers(self, to_address: str, count: int,
+                           min_micro: int = 1_000000, max_micro: int = 1000_000000):
+        """Синтетические переводы случайных сумм (шум, не относящийся к платежам)"""
+        for _ in range(count):
+            self.add_transfer(to_address, self.random.randint(min_micro, max_micro))
+    
+    def reset(self):
+        with self._lock:
+            self._transfers.clear()
+            self._by_hash.clear()
+            self._balances.clear()
+            self.requests.clear()
+    
+    # ---------- эндпоинты ----------
+    
+    @staticmethod
+    def route(method: str, path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Определить эндпоинт запроса (имена как в метриках TronGridAPI).
+        Returns: (эндпоинт, адрес или хеш из пути) или (None, None)
+        """
+        parts = [part for part in path.split('/') if part]
+        if method == 'POST' and parts == ['wallet', 'getnowblock']:
+            return 'now_block', None
+        if method == 'GET' and len(parts) == 5 and parts[:2] == ['v1', 'accounts'] \
+                and parts[3:] == ['transactions', 'trc20']:
+            return 'trc20_history', parts[2]
+        if method == 'GET' and len(parts) == 3 and parts[:2] == ['v1', 'accounts']:
+            return 'account', parts[2]
+        if method == 'GET' and len(parts) == 3 and parts[:2] == ['v1', 'transactions']:
+            return 'transaction', parts[2]
+        return None, None
+    
+    def handle(self, method: str, path: str, query: Dict[str, str]) -> Tuple[int, Dict]:
+        """Обработать запрос. Returns: (HTTP статус, тело ответа)"""
+        endpoint, arg = self.route(method, path)
+        if endpoint == 'now_block':
+            return 200, self._now_block()
+        if endpoint == 'trc20_history':
+            return self._trc20_history(arg, query)
+        if endpoint == 'account':
+            return 200, self._account(arg)
+        if endpoint == 'transaction':
+            return 200, self._transaction(arg)
+        return 404, {'success': False, 'error': 'not found'}
+    
+    def _now_block(self) -> Dict:
+        number = self.current_block()
+        return {
+            'blockID': format(number, '016x') + '0' * 48,
+            'block_header': {
+                'raw_data': {
+                    'number': number,
+                    'timestamp': int(time.time() * 1000),
+                },
+            },
+        }
+    
+    def _trc20_history(self, address: str, query: Dict[str, str]) -> Tuple[int, Dict]:
+        limit = min(int(query.get('limit', 20)), TRC20_PAGE_SIZE)
+        min_timestamp = int(query.get('min_timestamp', 0))
+        only_confirmed = query.get('only_confirmed') == 'true'
+        ascending = query.get('order_by', '').endswith(',asc')
+        offset = _decode_fingerprint(query.get('fingerprint'))
+        if offset is None:
+            return 400, {'success': False, 'error': 'invalid fingerprint'}
+        
+        solid_block = self.current_block() - SOLIDIFY_DEPTH
+        with self._lock:
+            keys = self._transfers.get(address, [])
+            ordered = keys if ascending else reversed(keys)
+            matching = []
+            for timestamp, tx_hash in ordered:
+                if timestamp < min_timestamp:
+                    if ascending:
+                        continue
+                    break
+                tx = self._by_hash[tx_hash]
+                if only_confirmed and tx['block'] > solid_block:
+                    continue
+                matching.append(tx)
+                if len(matching) > offset + limit:
+                    break
+        
+        # Номер блока - внутренний, TronGrid отдаёт только block_timestamp
+        page = [
+            {key: value for key, value in tx.items() if key != 'block'}
+            for tx in matching[offset:offset + limit]
+        ]
+        meta = {'at': int(time.time() * 1000), 'page_size': len(page)}
+        if len(matching) > offset + limit:
+            meta['fingerprint'] = _encode_fingerprint(offset + limit)
+        return 200, {'data': page, 'success': True, 'meta': meta}
+    
+    def _account(self, address: str) -> Dict:
+        with self._lock:
+            balance = self._balances.get(address)
+        if balance is None:
+            return {'data': [], 'success': True, 'meta': {'at': int(time.time() * 1000), 'page_size': 0}}
+        return {
+            'data': [{
+                'address': address,
+                'balance': 0,
+                'trc20': [{USDT_CONTRACT_ADDRESS: str(balance)}],
+            }],
+            'success': True,
+            'meta': {'at': int(time.time() * 1000), 'page_size': 1},
+        }
+    
+    def _transaction(self, tx_hash: str) -> Dict:
+        with self._lock:
+            tx = self._by_hash.get(tx_hash)
+        if tx is None:
+            return {'data': [], 'success': True}
+        return {
+            'data': [{
+                'txID': tx_hash,
+                'blockNumber': tx['block'],
+                'block_timestamp': tx['block_timestamp'],
+                'ret': [{'contractRet': 'SUCCESS'}],
+            }],
+            'success': True,
+        }
+    
+    # ---------- HTTP сервер ----------
+    
+    def _inject_fault(self) -> Optional[Tuple[int, Dict, Dict]]:
+        """Случайная ошибка с вероятностью error_rate: 429 или 503"""
+        if not self.error_rate or self.random.random() >= self.error_rate:
+            return None
+        if self.random.random() < 0.5:
+            return 429, {'Retry-After': '0'}, {'success': False, 'error': 'rate limited'}
+        return 503, {}, {'success': False, 'error': 'service unavailable'}
+    
+    def _count(self, method: str, path: str):
+        endpoint = self.route(method, path)[0] or 'unknown'
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+    
+    def make_server(self, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def setup(self):
+                super().setup()
+                # Заголовки и тело уходят отдельными write - без TCP_NODELAY
+                # keep-alive клиент ловит задержку delayed ACK (~40 мс)
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            
+            def _serve(self, method: str):
+                url = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if self.headers.get('Content-Length'):
+                    self.rfile.read(int(self.headers['Content-Length']))
+                
+                fake._count(method, url.path)
+                delay = fake.latency_ms + fake.random.uniform(0, fake.jitter_ms)
+                if delay:
+                    time.sleep(delay / 1000)
+                
+                fault = fake._inject_fault()
+                if fault:
+                    status, headers, body = fault
+                else:
+                    headers = {}
+                    status, body = fake.handle(method, url.path, query)
+                
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def do_GET(self):
+                self._serve('GET')
+            
+            def do_POST(self):
+                self._serve('POST')
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+    
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запустить сервер в фоновом потоке. Returns: базовый URL"""
+        self.server = self.make_server(host, port)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def _encode_fingerprint(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode()
+
+
+def _decode_fingerprint(fingerprint: Optional[str]) -> Optional[int]:
+    if not fingerprint:
+        return 0
+    try:
+        prefix, offset = base64.urlsafe_b64decode(fingerprint.encode()).decode().split(':')
+        return int(offset) if prefix == 'o' else None
+    except ValueError:
+        return None
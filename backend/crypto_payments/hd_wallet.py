@@ -0,0 +1,224 @@
+"""
+HD-деривация платёжных адресов (BIP32/BIP44, TRON: m/44'/195'/0'/0/i).
+Адрес платежа определяется индексом PaymentAddress.derivation_index:
+для выдачи адресов достаточно публичного ключа счёта (HD_WALLET_XPUB),
+приватный ключ адреса при необходимости (вывод средств) выводится
+заново из seed (HD_WALLET_SEED) и нигде не хранится.
+
+Ключ внешней цепочки m/44'/195'/0'/0 вычисляется один раз и кешируется,
+дальше каждый адрес - одна публичная деривация (HMAC-SHA512 + умножение
+на генератор), без hardened шагов от корня. Умножение точки в ecdsa
+выполняется на чистом Python, поэтому пакетная деривация делит диапазон
+индексов между процессами (workers) - в них передаётся только публичный
+ключ цепочки.
+
+Использование:
+    wallet = get_hd_wallet()
+    wallet.address(42)
+    wallet.derive_addresses(1000, 500)   # [(1000, 'T...'), ..., (1499, 'T...')]
+    wallet.derive_addresses(0, 100000, workers=4)
+    wallet.private_key(42)               # только при HD_WALLET_SEED
+"""
+import os
+import hmac
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import ecdsa
+from base58 import b58decode_check
+
+# Seed кошелька (hex, BIP39 seed 16-64 байт). Нужен только там, где
+# подписываются транзакции с адресов - веб и монитор обходятся HD_WALLET_XPUB
+HD_WALLET_SEED = os.environ.get('HD_WALLET_SEED', '')
+
+# Расширенный публичный ключ счёта m/44'/195'/0' (xpub из кошелька)
+HD_WALLET_XPUB = os.environ.get('HD_WALLET_XPUB', '')
+
+# Счёт BIP44 для платёжных адресов
+HD_WALLET_ACCOUNT = int(os.environ.get('HD_WALLET_ACCOUNT', 0))
+
+# Маркер в PaymentAddress.private_key_encrypted: ключ не хранится,
+# выводится по derivation_index
+HD_DERIVED_KEY = 'HD_DERIVED'
+
+HARDENED = 0x80000000
+TRON_COIN_TYPE = 195
+XPUB_VERSION = bytes.fromhex('0488b21e')
+
+CURVE = ecdsa.SECP256k1
+CURVE_ORDER = CURVE.order
+GENERATOR = CURVE.generator
+
+
+def _ser32(i: int) -> bytes:
+    return i.to_bytes(4, 'big')
+
+
+def _ser_point(point) -> bytes:
+    """Сжатая форма точки (33 байта)"""
+    x, y = point.x(), point.y()
+    return (b'\x03' if y & 1 else b'\x02') + x.to_bytes(32, 'big')
+
+
+def _hmac512(key: bytes, data: bytes) -> Tuple[int, bytes]:
+    digest = hmac.new(key, data, hashlib.sha512).digest()
+    return int.from_bytes(digest[:32], 'big'), digest[32:]
+
+
+def _derive_range(chain_code: bytes, chain_point_bytes: bytes, start: int, count: int) -> List[str]:
+    """
+    Адреса индексов start..start+count-1 от публичного ключа цепочки.
+    Функция модуля - вызывается и в процессах ProcessPoolExecutor.
+    """
+    from .services import TronWalletGenerator
+
+    chain_point = ecdsa.VerifyingKey.from_string(chain_point_bytes, curve=CURVE).pubkey.point
+    addresses = []
+    for index in range(start, start + count):
+        tweak, _ = _hmac512(chain_code, chain_point_bytes + _ser32(index))
+        if tweak >= CURVE_ORDER:
+            raise ValueError(f"Индекс {index} не даёт валидного ключа (BIP32), используйте следующий")
+        point = tweak * GENERATOR + chain_point
+        public_key = point.x().to_bytes(32, 'big').hex() + point.y().to_bytes(32, 'big').hex()
+        addresses.append(TronWalletGenerator._public_key_to_address(public_key))
+    return addresses
+
+
+class HDWallet:
+    """
+    Деривация адресов внешней цепочки m/44'/195'/account'/0.
+    Создаётся из seed (доступны и адреса, и приватные ключи) или из
+    xpub счёта (только адреса). Экземпляр потокобезопасен.
+    """
+
+    def __init__(self, seed: bytes = None, xpub: str = None, account: int = HD_WALLET_ACCOUNT):
+        if not seed and not xpub:
+            raise ValueError("Нужен seed или xpub HD-кошелька")
+        self.account = account
+        self._chain_private = None
+
+        if seed:
+            # m -> 44' -> 195' -> account' -> 0
+            key, chain_code = _hmac512(b'Bitcoin seed', seed)
+            for index in (44 | HARDENED, TRON_COIN_TYPE | HARDENED, account | HARDENED, 0):
+                key, chain_code = self._ckd_private(key, chain_code, index)
+            self._chain_private = (key, chain_code)
+            point = key * GENERATOR
+        else:
+            account_point, account_chain = self._parse_xpub(xpub)
+            point, chain_code = self._ckd_public(account_point, account_chain, 0)
+
+        # Кеш родительского ключа цепочки: сжатая форма точки и chain code
+        self._chain_point_bytes = _ser_point(point)
+        self._chain_code = chain_code
+
+    @property
+    def can_sign(self) -> bool:
+        """Доступны ли приватные ключи (кошелёк создан из seed)"""
+        return self._chain_private is not None
+
+    # ---------- адреса ----------
+
+    def address(self, index: int) -> str:
+        """TRON адрес m/44'/195'/account'/0/index"""
+        self._check_index(index)
+        return _derive_range(self._chain_code, self._chain_point_bytes, index, 1)[0]
+
+    def derive_addresses(self, start: int, count: int, workers: int = 1) -> List[Tuple[int, str]]:
+        """
+        Адреса подряд идущих индексов, при workers > 1 - в нескольких процессах.
+        Returns: [(index, address), ...]
+        """
+        self._check_index(start)
+        self._check_index(start + count - 1)
+        if workers <= 1 or count < workers * 100:
+            addresses = _derive_range(self._chain_code, self._chain_point_bytes, start, count)
+        else:
+            chunk = -(-count // workers)
+            starts = range(start, start + count, chunk)
+            counts = [min(chunk, start + count - chunk_start) for chunk_start in starts]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunks = executor.map(
+                    _derive_range,
+                    [self._chain_code] * len(counts),
+                    [self._chain_point_bytes] * len(counts),
+                    starts,
+                    counts,
+                )
+                addresses = [address for chunk_addresses in chunks for address in chunk_addresses]
+        return list(zip(range(start, start + count), addresses))
+
+    def private_key(self, index: int) -> str:
+        """Приватный ключ адреса (hex). Требует HD_WALLET_SEED."""
+        if not self.can_sign:
+            raise ValueError("HD-кошелёк создан из xpub - приватные ключи недоступны")
+        key, chain_code = self._chain_private
+        child_key, _ = self._ckd_private(key, chain_code, self._check_index(index))
+        return child_key.to_bytes(32, 'big').hex()
+
+    # ---------- BIP32 ----------
+
+    @staticmethod
+    def _check_index(index: int) -> int:
+        if not 0 <= index < HARDENED:
+            raise ValueError(f"Индекс деривации вне диапазона: {index}")
+        return index
+
+    @staticmethod
+    def _ckd_private(key: int, chain_code: bytes, index: int) -> Tuple[int, bytes]:
+        if index & HARDENED:
+            data = b'\x00' + key.to_bytes(32, 'big') + _ser32(index)
+        else:
+            data = _ser_point(key * GENERATOR) + _ser32(index)
+        tweak, child_chain = _hmac512(chain_code, data)
+        child_key = (tweak + key) % CURVE_ORDER
+        if tweak >= CURVE_ORDER or child_key == 0:
+            raise ValueError(f"Индекс {index} не даёт валидного ключа (BIP32)")
+        return child_key, child_chain
+
+    @staticmethod
+    def _ckd_public(point, chain_code: bytes, index: int):
+        tweak, child_chain = _hmac512(chain_code, _ser_point(point) + _ser32(index))
+        if tweak >= CURVE_ORDER:
+            raise ValueError(f"Индекс {index} не даёт валидного ключа (BIP32)")
+        return tweak * GENERATOR + point, child_chain
+
+    @staticmethod
+    def _parse_xpub(xpub: str):
+        """Разобрать xpub. Returns: (точка публичного ключа, chain code)"""
+        try:
+            raw = b58decode_check(xpub)
+        except ValueError:
+            raise ValueError("Некорректный HD_WALLET_XPUB (base58check)")
+        if len(raw) != 78 or raw[:4] != XPUB_VERSION:
+            raise ValueError("HD_WALLET_XPUB должен быть xpub счёта m/44'/195'/0'")
+        chain_code, key = raw[13:45], raw[45:]
+        point = ecdsa.VerifyingKey.from_string(key, curve=CURVE).pubkey.point
+        return point, chain_code
+
+
+_hd_wallet = None
+_hd_wallet_lock = threading.Lock()
+
+
+def get_hd_wallet() -> Optional[HDWallet]:
+    """
+    HD-кошелёк процесса из HD_WALLET_SEED / HD_WALLET_XPUB.
+    Returns: None, если HD-деривация не настроена
+    """
+    global _hd_wallet
+    if _hd_wallet is None and (HD_WALLET_SEED or HD_WALLET_XPUB):
+        with _hd_wallet_lock:
+            if _hd_wallet is None:
+                seed = bytes.fromhex(HD_WALLET_SEED) if HD_WALLET_SEED else None
+                _hd_wallet = HDWallet(seed=seed, xpub=HD_WALLET_XPUB or None)
+    return _hd_wallet
+
+
+def reset_hd_wallet():
+    """Сбросить HD-кошелёк процесса (тесты, смена ключей)"""
+    global _hd_wallet
+    with _hd_wallet_lock:
+        _hd_wallet = None
@@ -0,0 +1,99 @@
+"""
+Django management команда: бенчмарк генерации платёжных адресов.
+Сравнивает скорость случайных ключей с шифрованием (прежний способ
+пополнения пула) и HD-деривации по индексу в одном и нескольких
+процессах. Без HD_WALLET_SEED/HD_WALLET_XPUB используется случайный seed.
+Перед замером деривация проверяется на известном векторе.
+
+Использование:
+    python manage.py benchmark_hd_derivation
+    python manage.py benchmark_hd_derivation --count=100000 --workers=1,2,4,8
+"""
+import os
+import time
+import hashlib
+from cryptography.fernet import Fernet
+from django.core.management.base import BaseCommand, CommandError
+from crypto_payments.hd_wallet import HDWallet, get_hd_wallet
+from crypto_payments.services import TronWalletGenerator
+
+# Известный вектор: BIP39 seed "abandon abandon ... about" без пароля,
+# адрес m/44'/195'/0'/0/0
+VECTOR_SEED = hashlib.pbkdf2_hmac('sha512', ('abandon ' * 11 + 'about').encode(), b'mnemonic', 2048)
+VECTOR_ADDRESS = 'TUEZSdKsoDHQMeZwihtdoBiN46zxhGWYdH'
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк HD-деривации платёжных адресов'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Адресов на замер (по умолчанию: 10000)')
+        parser.add_argument(
+            '--workers',
+            default='1,2,4',
+            help='Количество процессов, через запятую (по умолчанию: 1,2,4)'
+        )
+        parser.add_argument('--start', type=int, default=0, help='Начальный индекс деривации')
+        parser.add_argument(
+            '--random-count',
+            type=int,
+            default=1000,
+            help='Случайных ключей для сравнения (по умолчанию: 1000, 0 - пропустить)'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            workers_list = [int(workers) for workers in options['workers'].split(',') if workers.strip()]
+        except ValueError:
+            raise CommandError('--workers: ожидаются целые числа через запятую')
+        
+        # Быстрая, но неверная деривация бесполезна - сначала сверяемся с вектором
+        vector_wallet = HDWallet(seed=VECTOR_SEED)
+        for address in (vector_wallet.address(0), vector_wallet.derive_addresses(0, 1)[0][1]):
+            if address != VECTOR_ADDRESS:
+                raise CommandError(f'Деривация неверна: {address} вместо {VECTOR_ADDRESS} (m/44\'/195\'/0\'/0/0)')
+        self.stdout.write(f'   ✅ Известный вектор m/44\'/195\'/0\'/0/0: {VECTOR_ADDRESS}')
+        
+        wallet = get_hd_wallet()
+        if wallet is None:
+            wallet = HDWallet(seed=os.urandom(64))
+            self.stdout.write('   HD-кошелёк не настроен - используется случайный seed')
+        
+        count, start = options['count'], options['start']
+        self.stdout.write(self.style.SUCCESS(f'🚀 Бенчмарк деривации: {count} адресов с индекса {start}'))
+        self.stdout.write(f'{"способ":>24} {"время, с":>10} {"адресов/с":>11}')
+        
+        if options['random_count']:
+            fernet = Fernet(Fernet.generate_key())
+            started = time.monotonic()
+            for _ in range(options['random_count']):
+                private_key, _ = TronWalletGenerator.generate_keypair()
+                fernet.encrypt(private_key.encode())
+            self._report('случайный ключ + Fernet', options['random_count'], time.monotonic() - started)
+        
+        # Ключ цепочки m/44'/195'/0'/0 считается один раз при создании кошелька
+        started = time.monotonic()
+        HDWallet(seed=os.urandom(64))
+        self._report('HD: ключ цепочки (1 раз)', 1, time.monotonic() - started)
+        
+        reference = None
+        for workers in workers_list:
+            started = time.monotonic()
+            addresses = wallet.derive_addresses(start, count, workers=workers)
+            self._report(f'HD: {workers} процесс(ов)', count, time.monotonic() - started)
+            
+            # Результат не должен зависеть от числа процессов
+            if reference is None:
+                reference = addresses
+            elif addresses != reference:
+                raise CommandError(f'Адреса при workers={workers} отличаются от workers={workers_list[0]}')
+        
+        if wallet.can_sign:
+            index, address = reference[-1]
+            if TronWalletGenerator.private_key_to_address(wallet.private_key(index)) != address:
+                raise CommandError(f'Ключ индекса {index} не соответствует адресу')
+            self.stdout.write(f'   ✅ Ключ индекса {index} выводится заново и соответствует адресу {address}')
+    
+    def _report(self, label: str, count: int, elapsed: float):
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'{label:>24} {elapsed:>10.3f} {rate:>11.0f}')
@@ -0,0 +1,196 @@
+"""
+Django management команда: нагрузочный тест цикла мониторинга.
+Для каждого размера создаёт N открытых платежей, поднимает фейковый
+TronGrid (fake_trongrid.py) с оплатой части из них и выполняет несколько
+циклов мониторинга, замеряя время цикла, HTTP запросы и запросы к БД.
+Выполняется на отдельной тестовой БД (как manage.py test), рабочие
+платежи не затрагиваются; изменения каждого размера откатываются.
+
+Использование:
+    python manage.py benchmark_monitor
+    python manage.py benchmark_monitor --sizes=10,1000,100000 --cycles=3 --mode=async
+    python manage.py benchmark_monitor --latency=80 --error-rate=0.02 --noise=5000
+    python manage.py benchmark_monitor --keepdb  # не пересоздавать тестовую БД
+"""
+import time
+import random
+from decimal import Decimal
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+from crypto_payments import ratelimit
+from crypto_payments.fake_trongrid import FakeTronGrid
+from crypto_payments.matching import MICRO, OPEN_STATUSES, to_micro
+from crypto_payments.models import CryptoPayment, PaymentAddress
+from crypto_payments.services import PaymentService, MERCHANT_WALLET_ADDRESS, PAYMENT_EXPIRY_MINUTES
+
+
+class QueryCounter:
+    """Счётчик запросов к БД (connection.execute_wrapper)"""
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест мониторинга платежей на фейковом TronGrid'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10,100,1000,10000,100000',
+            help='Количество открытых платежей, через запятую (по умолчанию: 10,100,1000,10000,100000)'
+        )
+        parser.add_argument('--cycles', type=int, default=3, help='Циклов мониторинга на размер (по умолчанию: 3)')
+        parser.add_argument(
+            '--mode',
+            choices=['batch', 'async', 'per-payment'],
+            default='batch',
+            help='Режим проверки, как в monitor_payments (по умолчанию: batch)'
+        )
+        parser.add_argument('--concurrency', type=int, default=20, help='Параллельность в режиме async')
+        parser.add_argument('--paid', type=float, default=0.1, help='Доля оплаченных платежей (по умолчанию: 0.1)')
+        parser.add_argument('--noise', type=int, default=0, help='Посторонних переводов на адрес')
+        parser.add_argument('--latency', type=float, default=0, help='Задержка фейкового TronGrid, мс')
+        parser.add_argument('--jitter', type=float, default=0, help='Случайная добавка к задержке, мс')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429/503')
+        parser.add_argument(
+            '--rate-limit',
+            type=float,
+            default=0,
+            help='Лимит запросов к TronGrid, запросов/сек (по умолчанию: 0 - без лимита)'
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Seed генератора')
+        parser.add_argument('--keepdb', action='store_true', help='Не пересоздавать тестовую БД')
+    
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes: ожидаются целые числа через запятую')
+        
+        # Лимитер читает TRONGRID_RATE_LIMIT при создании клиента
+        ratelimit.TRONGRID_RATE_LIMIT = options['rate_limit']
+        self.random = random.Random(options['seed'])
+        
+        fake = FakeTronGrid(
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        url = fake.start()
+        self.service = PaymentService(priority=ratelimit.PRIORITY_MONITOR)
+        self.service.trongrid.base_url = url
+        
+        self.stdout.write(self.style.SUCCESS(f'🚀 Бенчмарк мониторинга ({options["mode"]}), TronGrid: {url}'))
+        self.stdout.write(
+            f'   Циклов: {options["cycles"]}, оплачено: {options["paid"]:.0%}, шум: {options["noise"]}, '
+            f'задержка: {options["latency"]}±{options["jitter"]} мс, ошибки: {options["error_rate"]:.0%}'
+        )
+        
+        # Все соединения переключаются на тестовую БД (test_<имя>)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            self.stdout.write(f'   БД: {connection.settings_dict["NAME"]}')
+            self.stdout.write(f'{"платежей":>10} {"цикл":>5} {"время, с":>10} {"HTTP":>7} {"SQL":>8} {"изменено":>9}')
+            for size in sizes:
+                self._run_size(fake, size, options)
+        finally:
+            fake.stop()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+    
+    def _run_size(self, fake: FakeTronGrid, size: int, options):
+        with transaction.atomic():
+            fake.reset()
+            
+            started = time.monotonic()
+            payments = self._create_payments(size)
+            self._create_transfers(fake, payments, options['paid'], options['noise'])
+            self.stdout.write(f'{size:>10} {"setup":>5} {time.monotonic() - started:>10.2f}')
+            
+            for cycle in range(1, options['cycles'] + 1):
+                counter = QueryCounter()
+                http_before = self._http_calls()
+                started = time.monotonic()
+                with connection.execute_wrapper(counter):
+                    changed = self._cycle(options['mode'], options['concurrency'])
+                elapsed = time.monotonic() - started
+                
+                self.stdout.write(
+                    f'{size:>10} {cycle:>5} {elapsed:>10.3f} {self._http_calls() - http_before:>7} '
+                    f'{counter.count:>8} {changed:>9}'
+                )
+            
+            transaction.set_rollback(True)
+    
+    def _cycle(self, mode: str, concurrency: int) -> int:
+        """Один цикл мониторинга, как monitor_payments._check_payments"""
+        active = list(
+            CryptoPayment.objects.filter(
+                status__in=OPEN_STATUSES,
+                expires_at__gte=timezone.now(),
+            ).select_related('payment_address')
+        )
+        if mode == 'async':
+            changed, scanned = self.service.check_payments_async(active, concurrency=concurrency)
+        elif mode == 'batch':
+            changed, scanned = self.service.check_payments(active)
+        else:
+            changed, scanned = [], set()
+            for payment in active:
+                if payment.payment_address.address not in scanned:
+                    payment_changed, payment_scanned = self.service.check_payment(payment)
+                    changed.extend(payment_changed)
+                    scanned |= payment_scanned
+        self.service.mark_checked([payment for payment in active if payment.payment_address.address in scanned])
+        completed = self.service.track_confirmations()
+        return len({payment.pk for payment in [*changed, *completed]})
+    
+    def _create_payments(self, size: int):
+        """
+        Открытые платежи на кошелёк мерчанта с уникальными суммами.
+        Создаются "в прошлом", чтобы подтверждённые переводы фейкового
+        TronGrid (SOLIDIFY_DEPTH блоков назад) были позже платежей.
+        """
+        payment_address, _ = PaymentAddress.objects.get_or_create(
+            address=MERCHANT_WALLET_ADDRESS,
+            defaults={
+                'private_key_encrypted': 'EXTERNAL_WALLET',
+                'derivation_index': 0,
+            }
+        )
+        expires_at = timezone.now() + timedelta(minutes=PAYMENT_EXPIRY_MINUTES)
+        
+        payments = []
+        for i in range(size):
+            amount = Decimal(self.random.randint(1, 500))
+            offset = Decimal(i + 1) / Decimal(MICRO)
+            payments.append(CryptoPayment(
+                payment_address=payment_address,
+                currency='USDT',
+                amount_expected=amount + offset,
+                amount_requested=amount,
+                expires_at=expires_at,
+                metadata={'benchmark': True},
+            ))
+        payments = CryptoPayment.objects.bulk_create(payments, batch_size=2000)
+        # В тестовой БД других платежей нет
+        CryptoPayment.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+        return payments
+    
+    def _create_transfers(self, fake: FakeTronGrid, payments, paid: float, noise: int):
+        """Оплаты части платежей и посторонние переводы на тот же адрес"""
+        fake.generate_transfers(MERCHANT_WALLET_ADDRESS, noise)
+        for payment in payments:
+            if self.random.random() < paid:
+                fake.add_transfer(MERCHANT_WALLET_ADDRESS, to_micro(payment.amount_expected))
+    
+    def _http_calls(self) -> int:
+        return sum(stat['calls'] for stat in self.service.trongrid.get_stats().values())
@@ -0,0 +1,97 @@
+"""
+Django management команда для доставки callback-уведомлений мерчантам.
+Забирает готовые записи из очереди CallbackDelivery и отправляет их
+пулом потоков; неудачные попытки повторяются с экспоненциальной задержкой.
+
+Использование:
+    python manage.py deliver_callbacks
+    python manage.py deliver_callbacks --interval=2 --workers=32
+    python manage.py deliver_callbacks --once  # отправить готовые и завершить
+"""
+import time
+import logging
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from crypto_payments.callbacks import (
+    CallbackDispatcher,
+    CALLBACK_WORKERS,
+    CALLBACK_PER_HOST_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Доставка callback-уведомлений о платежах'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза между выборками очереди в секундах (по умолчанию: 1)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Отправить готовые callback и завершить'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=CALLBACK_WORKERS,
+            help=f'Количество потоков доставки (по умолчанию: {CALLBACK_WORKERS})'
+        )
+        parser.add_argument(
+            '--per-host',
+            type=int,
+            default=CALLBACK_PER_HOST_CONCURRENCY,
+            help=f'Максимум одновременных запросов на один хост (по умолчанию: {CALLBACK_PER_HOST_CONCURRENCY})'
+        )
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        dispatcher = CallbackDispatcher(workers=options['workers'], per_host=options['per_host'])
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'🚀 Запуск доставки callback...')
+        )
+        self.stdout.write(f'   Потоков: {dispatcher.workers}, на хост: {dispatcher.per_host}')
+        
+        reported = dict(dispatcher.stats)
+        try:
+            while True:
+                try:
+                    dispatched = dispatcher.dispatch()
+                except Exception as e:
+                    dispatched = 0
+                    self.stderr.write(
+                        self.style.ERROR(f'❌ Ошибка выборки callback: {e}')
+                    )
+                    logger.exception('Error dispatching callbacks')
+                
+                if options['once']:
+                    # Дожидаемся текущих запросов и добираем остаток очереди
+                    if not dispatched and not dispatcher.in_flight():
+                        break
+                    time.sleep(0.1)
+                    continue
+                
+                if dispatcher.stats != reported:
+                    reported = dict(dispatcher.stats)
+                    self._report(reported)
+                
+                if not dispatched:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹ Остановка...')
+        finally:
+            dispatcher.shutdown()
+            self._report(dispatcher.stats)
+    
+    def _report(self, stats):
+        """Вывести счётчики доставки"""
+        self.stdout.write(
+            f'[{timezone.now().strftime("%H:%M:%S")}] 📨 Доставлено: {stats["delivered"]}, '
+            f'повторов: {stats["retried"]}, не доставлено: {stats["failed"]}'
+        )
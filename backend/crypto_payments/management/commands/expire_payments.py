@@ -0,0 +1,54 @@
+"""
+Django management команда для перевода просроченных платежей в expired.
+Платежи обновляются пачками, по одному условному UPDATE на пачку.
+
+Использование:
+    python manage.py expire_payments            # один проход
+    python manage.py expire_payments --interval=30  # проход каждые 30 секунд
+    python manage.py expire_payments --batch-size=5000
+"""
+import time
+import logging
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from crypto_payments.services import PaymentService, PAYMENT_EXPIRY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Перевод просроченных крипто-платежей в статус expired'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять каждые N секунд (по умолчанию: один проход)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PAYMENT_EXPIRY_BATCH_SIZE,
+            help=f'Платежей в одном UPDATE (по умолчанию: {PAYMENT_EXPIRY_BATCH_SIZE})'
+        )
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        service = PaymentService()
+        
+        while True:
+            try:
+                expired = service.expire_overdue_payments(batch_size=options['batch_size'])
+                self.stdout.write(
+                    f'[{timezone.now().strftime("%H:%M:%S")}] ⏰ Истекло платежей: {len(expired)}'
+                )
+            except Exception as e:
+                self.stderr.write(
+                    self.style.ERROR(f'❌ Ошибка при обработке просроченных платежей: {e}')
+                )
+                logger.exception('Error expiring payments')
+            
+            if not interval:
+                break
+            time.sleep(interval)
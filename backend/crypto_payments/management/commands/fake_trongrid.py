@@ -0,0 +1,111 @@
+"""
+Django management команда: локальный фейковый TronGrid для нагрузочных тестов.
+
+Использование:
+    python manage.py fake_trongrid --port=8090 --latency=80 --jitter=40 --error-rate=0.02
+    python manage.py fake_trongrid --noise=5000 --tps=20  # фоновые переводы
+    python manage.py fake_trongrid --pay-open=0.5         # оплатить половину открытых платежей
+
+Монитор против фейкового сервера:
+    TRONGRID_BASE_URL=http://127.0.0.1:8090 TRONGRID_RATE_LIMIT=0 python manage.py monitor_payments
+"""
+import time
+import itertools
+from django.core.management.base import BaseCommand
+from crypto_payments.fake_trongrid import FakeTronGrid
+from crypto_payments.matching import to_micro
+from crypto_payments.models import CryptoPayment
+from crypto_payments.services import MERCHANT_WALLET_ADDRESS
+
+
+class Command(BaseCommand):
+    help = 'Локальный фейковый TronGrid API'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8090, help='Порт (по умолчанию: 8090)')
+        parser.add_argument('--latency', type=float, default=0, help='Задержка ответа, мс')
+        parser.add_argument('--jitter', type=float, default=0, help='Случайная добавка к задержке, мс')
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Доля ответов 429/503 (0..1)'
+        )
+        parser.add_argument(
+            '--address',
+            action='append',
+            dest='addresses',
+            help=f'Адрес для синтетических переводов (можно несколько, по умолчанию: {MERCHANT_WALLET_ADDRESS})'
+        )
+        parser.add_argument('--noise', type=int, default=0, help='Переводов на адрес при старте')
+        parser.add_argument('--tps', type=float, default=0, help='Новых переводов в секунду на адрес')
+        parser.add_argument(
+            '--pay-open',
+            type=float,
+            default=0.0,
+            help='Доля открытых платежей из БД, для которых создать оплату (0..1)'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Seed генератора')
+    
+    def handle(self, *args, **options):
+        addresses = options['addresses'] or [MERCHANT_WALLET_ADDRESS]
+        fake = FakeTronGrid(
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        
+        for address in addresses:
+            fake.generate_transfers(address, options['noise'])
+        
+        if options['pay_open']:
+            paid = self._pay_open_payments(fake, options['pay_open'])
+            self.stdout.write(f'   Оплачено открытых платежей: {paid}')
+        
+        url = fake.start(options['host'], options['port'])
+        self.stdout.write(self.style.SUCCESS(f'🚀 Фейковый TronGrid: {url}'))
+        self.stdout.write(
+            f'   Задержка: {options["latency"]}±{options["jitter"]} мс, '
+            f'ошибки: {options["error_rate"]:.0%}, переводов на адрес: {options["noise"]}'
+        )
+        
+        # Дробный --tps накапливается между секундами
+        pending_transfers = 0.0
+        try:
+            for tick in itertools.count(1):
+                time.sleep(1)
+                pending_transfers += options['tps']
+                if pending_transfers >= 1:
+                    for address in addresses:
+                        fake.generate_transfers(address, int(pending_transfers))
+                    pending_transfers -= int(pending_transfers)
+                
+                if tick % 10 == 0:
+                    self.stdout.write(
+                        f'   📡 Блок {fake.current_block()}, запросов: {dict(sorted(fake.requests.items()))}'
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹ Остановка...')
+        finally:
+            fake.stop()
+    
+    def _pay_open_payments(self, fake: FakeTronGrid, ratio: float) -> int:
+        """Добавить переводы на точную сумму для доли открытых платежей"""
+        payments = CryptoPayment.objects.filter(
+            status__in=['pending', 'confirming']
+        ).select_related('payment_address').order_by('created_at')
+        
+        paid = 0
+        for payment in payments.iterator():
+            if fake.random.random() >= ratio:
+                continue
+            fake.add_transfer(
+                payment.payment_address.address,
+                to_micro(payment.amount_expected - payment.amount_received),
+                # Перевод в текущем блоке - виден после SOLIDIFY_DEPTH блоков
+                timestamp_ms=int(time.time() * 1000),
+            )
+            paid += 1
+        return paid
@@ -5,13 +5,21 @@ Django management команда для мониторинга крипто-пл
 Использование:
     python manage.py monitor_payments
     python manage.py monitor_payments --interval=30  # проверка каждые 30 секунд
+    python manage.py monitor_payments --per-payment  # отдельный запрос к TronGrid на каждый платёж
+    python manage.py monitor_payments --async --concurrency=50  # конкурентные запросы к TronGrid
+    python manage.py monitor_payments --expire-interval=0  # просроченные платежи обрабатывает expire_payments
+    python manage.py monitor_payments --shard  # несколько воркеров делят адреса (на любых хостах)
 """
+import os
 import time
+import socket
 import logging
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from django.utils import timezone
 from crypto_payments.models import CryptoPayment
-from crypto_payments.services import PaymentService
+from crypto_payments.services import PaymentService, ADDRESS_LEASE_SECONDS
+from crypto_payments.ratelimit import PRIORITY_MONITOR
 
 logger = logging.getLogger(__name__)
 
@@ -31,81 +39,251 @@ class Command(BaseCommand):
             action='store_true',
             help='Выполнить одну проверку и завершить'
         )
+        parser.add_argument(
+            '--per-payment',
+            action='store_true',
+            help='Запрашивать историю TronGrid отдельно для каждого платежа '
+                 '(по умолчанию - один запрос на адрес за цикл)'
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Запрашивать историю адресов конкурентно (asyncio)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Максимум одновременных запросов к TronGrid в режиме --async (по умолчанию: 20)'
+        )
+        parser.add_argument(
+            '--block-ticker',
+            action='store_true',
+            help='Обновлять номер текущего блока в фоновом потоке'
+        )
+        parser.add_argument(
+            '--hint-poll',
+            type=int,
+            default=2,
+            help='Как часто между циклами проверять запросы внеочередной проверки, сек. (по умолчанию: 2)'
+        )
+        parser.add_argument(
+            '--expire-interval',
+            type=int,
+            default=60,
+            help='Как часто переводить просроченные платежи в expired, сек.; 0 - не делать этого '
+                 'в мониторе (по умолчанию: 60)'
+        )
+        parser.add_argument(
+            '--shard',
+            action='store_true',
+            help='Режим нескольких воркеров: каждый цикл воркер арендует часть адресов '
+                 '(SELECT ... FOR UPDATE SKIP LOCKED) и проверяет только их платежи'
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=f'{socket.gethostname()}:{os.getpid()}',
+            help='Имя воркера в режиме --shard (по умолчанию: хост:pid)'
+        )
+        parser.add_argument(
+            '--claim-batch',
+            type=int,
+            default=100,
+            help='Сколько адресов воркер арендует за цикл в режиме --shard (по умолчанию: 100)'
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=ADDRESS_LEASE_SECONDS,
+            help=f'Время аренды адреса, сек.; после падения воркера его адреса освобождаются '
+                 f'через это время (по умолчанию: {ADDRESS_LEASE_SECONDS})'
+        )
     
     def handle(self, *args, **options):
         interval = options['interval']
         once = options['once']
+        self.batch = not options['per_payment']
+        self.use_async = options['use_async']
+        self.concurrency = options['concurrency']
+        self.hint_poll = options['hint_poll']
+        self.expire_interval = options['expire_interval']
+        self.next_expiry = 0
+        self.shard = options['shard']
+        self.worker_id = options['worker_id']
+        self.claim_batch = options['claim_batch']
+        self.lease = options['lease']
         
         self.stdout.write(
             self.style.SUCCESS(f'🚀 Запуск мониторинга крипто-платежей...')
         )
         self.stdout.write(f'   Интервал проверки: {interval} сек.')
+        if self.use_async:
+            self.stdout.write(f'   Режим: async (параллельность {self.concurrency})')
+        else:
+            self.stdout.write(f'   Режим: {"batch (один запрос на адрес)" if self.batch else "по платежам"}')
+        if self.shard:
+            self.stdout.write(f'   Воркер: {self.worker_id} (до {self.claim_batch} адресов, аренда {self.lease} сек.)')
+            if self.lease <= interval * 2:
+                self.stdout.write(self.style.WARNING(
+                    '   ⚠️ Аренда короче двух интервалов - адреса могут переходить между воркерами'
+                ))
         
-        service = PaymentService()
+        # Запросы монитора имеют приоритет над интерактивными в общем лимите TronGrid
+        service = PaymentService(priority=PRIORITY_MONITOR)
+        if options['block_ticker']:
+            service.block_height.start_ticker()
         
+        try:
+            while True:
+                self._expire_payments(service)
+                
+                try:
+                    self._check_payments(service)
+                except Exception as e:
+                    self.stderr.write(
+                        self.style.ERROR(f'❌ Ошибка при проверке платежей: {e}')
+                    )
+                    logger.exception('Error in payment monitoring')
+                
+                self._report_api_stats(service)
+                
+                if once:
+                    break
+                
+                self._wait(interval)
+        finally:
+            if self.shard:
+                # Адреса сразу достаются другим воркерам, не дожидаясь истечения аренды
+                service.release_addresses(self.worker_id)
+    
+    def _wait(self, interval: int):
+        """
+        Пауза до следующего цикла. Прерывается раньше, если для какого-то
+        открытого платежа запрошена внеочередная проверка.
+        """
+        deadline = time.monotonic() + interval
         while True:
-            try:
-                self._check_payments(service)
-            except Exception as e:
-                self.stderr.write(
-                    self.style.ERROR(f'❌ Ошибка при проверке платежей: {e}')
-                )
-                logger.exception('Error in payment monitoring')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(self.hint_poll, remaining))
             
-            if once:
-                break
-            
-            time.sleep(interval)
+            hinted = CryptoPayment.objects.filter(
+                refresh_requested_at__isnull=False,
+                status__in=['pending', 'confirming'],
+            ).exists()
+            if hinted:
+                self.stdout.write(f'[{timezone.now().strftime("%H:%M:%S")}] Запрошена внеочередная проверка')
+                return
+    
+    def _expire_payments(self, service: PaymentService):
+        """Перевести просроченные платежи в expired, если подошло время"""
+        if not self.expire_interval or time.monotonic() < self.next_expiry:
+            return
+        self.next_expiry = time.monotonic() + self.expire_interval
+        
+        try:
+            expired = service.expire_overdue_payments()
+        except Exception as e:
+            self.stderr.write(
+                self.style.ERROR(f'❌ Ошибка при обработке просроченных платежей: {e}')
+            )
+            logger.exception('Error expiring payments')
+            return
+        
+        if expired:
+            self.stdout.write(
+                self.style.WARNING(f'   ⏰ Истекло платежей: {len(expired)}')
+            )
     
     def _check_payments(self, service: PaymentService):
         """Проверить все ожидающие и подтверждаемые платежи"""
         
-        # Получаем платежи для проверки
+        # Получаем платежи для проверки; просроченные pending пропускаем -
+        # их переводит в expired expire_payments
         payments = CryptoPayment.objects.filter(
             status__in=['pending', 'confirming']
+        ).exclude(
+            Q(status='pending') & Q(expires_at__lt=timezone.now())
         ).select_related('payment_address')
         
-        if not payments.exists():
+        if self.shard:
+            addresses = service.claim_addresses(self.worker_id, self.claim_batch, self.lease)
+            payments = payments.filter(payment_address__address__in=addresses)
+        
+        active = list(payments)
+        
+        if not active:
             self.stdout.write(f'[{timezone.now().strftime("%H:%M:%S")}] Нет активных платежей')
             return
         
         self.stdout.write(
-            f'[{timezone.now().strftime("%H:%M:%S")}] Проверка {payments.count()} платежей...'
+            f'[{timezone.now().strftime("%H:%M:%S")}] Проверка {len(active)} платежей...'
         )
         
-        for payment in payments:
-            try:
-                # Проверяем истечение срока
-                if payment.expires_at < timezone.now() and payment.status == 'pending':
-                    payment.status = 'expired'
-                    payment.save()
-                    self.stdout.write(
-                        self.style.WARNING(f'   ⏰ Платёж #{payment.payment_id} истёк')
-                    )
+        if self.use_async:
+            # Все адреса запрашиваются конкурентно, сопоставление в памяти
+            changed, scanned = service.check_payments_async(active, concurrency=self.concurrency)
+        elif self.batch:
+            # Одна выборка TronGrid на адрес, сопоставление в памяти
+            changed, scanned = service.check_payments(active)
+        else:
+            changed, scanned = [], set()
+            for payment in active:
+                # check_payment читает историю всего адреса - повторно не нужно
+                if payment.payment_address.address in scanned:
                     continue
-                
-                # Проверяем транзакции
-                changed = service.check_payment(payment)
-                
-                if changed:
-                    payment.refresh_from_db()
-                    status_emoji = {
-                        'pending': '⏳',
-                        'confirming': '🔄',
-                        'completed': '✅',
-                        'expired': '⏰',
-                        'failed': '❌',
-                    }
-                    emoji = status_emoji.get(payment.status, '❓')
-                    
-                    msg = f'   {emoji} Платёж #{payment.payment_id}: {payment.status}'
-                    if payment.amount_received > 0:
-                        msg += f' ({payment.amount_received}/{payment.amount_expected} {payment.currency})'
-                    
-                    style = self.style.SUCCESS if payment.status == 'completed' else self.style.WARNING
-                    self.stdout.write(style(msg))
-                    
-            except Exception as e:
-                self.stderr.write(
-                    self.style.ERROR(f'   ❌ Ошибка проверки #{payment.payment_id}: {e}')
-                )
+                try:
+                    # Проверяем транзакции
+                    payment_changed, payment_scanned = service.check_payment(payment)
+                    changed.extend(payment_changed)
+                    scanned |= payment_scanned
+                except Exception as e:
+                    self.stderr.write(
+                        self.style.ERROR(f'   ❌ Ошибка проверки #{payment.payment_id}: {e}')
+                    )
+        
+        # Время проверки отдаётся эндпоинтом статуса в X-Last-Checked - только
+        # для адресов, история которых действительно прочитана
+        service.mark_checked([payment for payment in active if payment.payment_address.address in scanned])
+        failed = {payment.payment_address.address for payment in active} - scanned
+        if failed:
+            self.stdout.write(self.style.WARNING(f'   ⚠️ Не удалось проверить адресов: {len(failed)}'))
+        
+        # Подтверждения уже найденных транзакций - по номеру текущего блока
+        changed = {payment.pk: payment for payment in [*changed, *service.track_confirmations()]}
+        
+        for payment in changed.values():
+            self._report(payment)
+    
+    def _report(self, payment):
+        """Вывести изменение статуса платежа"""
+        payment.refresh_from_db()
+        status_emoji = {
+            'pending': '⏳',
+            'confirming': '🔄',
+            'completed': '✅',
+            'expired': '⏰',
+            'failed': '❌',
+        }
+        emoji = status_emoji.get(payment.status, '❓')
+        
+        msg = f'   {emoji} Платёж #{payment.payment_id}: {payment.status}'
+        if payment.amount_received > 0:
+            msg += f' ({payment.amount_received}/{payment.amount_expected} {payment.currency})'
+        
+        style = self.style.SUCCESS if payment.status == 'completed' else self.style.WARNING
+        self.stdout.write(style(msg))
+    
+    def _report_api_stats(self, service: PaymentService):
+        """Вывести метрики запросов к TronGrid по эндпоинтам"""
+        for endpoint, stat in sorted(service.trongrid.get_stats().items()):
+            self.stdout.write(
+                f'   📡 {endpoint}: {stat["calls"]} запросов, {stat["errors"]} ошибок, '
+                f'{stat["retries"]} повторов, avg {stat["avg_ms"]} мс, max {stat["max_ms"]:.0f} мс'
+            )
+        
+        remaining = service.trongrid.rate_limit.get('x-ratelimit-remaining')
+        if remaining is not None:
+            self.stdout.write(f'   📡 TronGrid лимит: осталось {remaining}')
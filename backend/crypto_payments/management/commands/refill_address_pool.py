@@ -0,0 +1,93 @@
+"""
+Django management команда для пополнения пула платёжных адресов.
+Когда свободных адресов меньше нижней границы, пул пополняется
+до целевого размера (см. address_pool.py).
+
+Использование:
+    python manage.py refill_address_pool                 # один проход
+    python manage.py refill_address_pool --interval=10   # проверка каждые 10 секунд
+    python manage.py refill_address_pool --low-watermark=500 --target=5000
+    python manage.py refill_address_pool --target=100000 --batch=5000 --workers=4  # HD-деривация
+"""
+import time
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from crypto_payments.address_pool import (
+    ADDRESS_POOL_LOW_WATERMARK, ADDRESS_POOL_TARGET, ADDRESS_POOL_BATCH_SIZE,
+)
+from crypto_payments.services import PaymentService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Пополнение пула заранее созданных платёжных адресов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять каждые N секунд (по умолчанию: один проход)'
+        )
+        parser.add_argument(
+            '--low-watermark',
+            type=int,
+            default=ADDRESS_POOL_LOW_WATERMARK,
+            help=f'Пополнять, когда свободных адресов меньше (по умолчанию: {ADDRESS_POOL_LOW_WATERMARK})'
+        )
+        parser.add_argument(
+            '--target',
+            type=int,
+            default=ADDRESS_POOL_TARGET,
+            help=f'Размер пула после пополнения (по умолчанию: {ADDRESS_POOL_TARGET})'
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=ADDRESS_POOL_BATCH_SIZE,
+            help=f'Адресов в одном INSERT (по умолчанию: {ADDRESS_POOL_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Процессов для HD-деривации (по умолчанию: 1)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        pool = PaymentService().address_pool
+        if pool.encryption is None and pool.hd_wallet is None:
+            raise CommandError(
+                'Не настроены ни HD_WALLET_SEED/HD_WALLET_XPUB, ни CRYPTO_ENCRYPTION_KEY - '
+                'адреса пула создать нельзя'
+            )
+        pool.workers = options['workers']
+
+        while True:
+            try:
+                started = time.monotonic()
+                created = pool.refill(
+                    low_watermark=options['low_watermark'],
+                    target=options['target'],
+                    batch_size=options['batch'],
+                )
+                elapsed = time.monotonic() - started
+                stats = pool.stats()
+
+                line = (
+                    f'[{timezone.now().strftime("%H:%M:%S")}] 🏦 Свободно: {stats["available"]}, '
+                    f'выдано за час: {stats["assigned_last_hour"]}, создано за час: {stats["created_last_hour"]}'
+                )
+                if created:
+                    line += f' | ➕ создано {created} за {elapsed:.2f} с ({created / elapsed:.0f} адресов/с)'
+                self.stdout.write(line)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'❌ Ошибка при пополнении пула: {e}'))
+                logger.exception('Error refilling address pool')
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -31,11 +31,12 @@ class Command(BaseCommand):
             
             try:
                 profile = payment.user.profile
+                amount = payment.amount_requested or payment.amount_expected
                 
                 BalanceHistory.objects.create(
                     user=payment.user,
                     transaction_type='deposit',
-                    amount=Decimal(str(payment.amount_expected)),
+                    amount=Decimal(str(amount)),
                     balance_before=0,
                     balance_after=profile.balance,
                     description=f'Крипто депозит #{payment.payment_id}'
@@ -43,7 +44,7 @@ class Command(BaseCommand):
                 
                 created += 1
                 self.stdout.write(
-                    self.style.SUCCESS(f'  {payment.payment_id}: создана запись на ${payment.amount_expected}')
+                    self.style.SUCCESS(f'  {payment.payment_id}: создана запись на ${amount}')
                 )
             except Exception as e:
                 self.stdout.write(
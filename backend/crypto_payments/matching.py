@@ -0,0 +1,151 @@
+"""
+Сопоставление входящих переводов с открытыми платежами по сумме.
+Все платежи идут на один кошелёк, поэтому платёж определяется
+по ожидаемой сумме (в целых micro-USDT) и валюте. Адрес пула выдан
+одному платежу - ему засчитывается любой входящий перевод, независимо
+от суммы.
+"""
+import os
+from bisect import bisect_left, insort
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional, Dict, List, Tuple
+
+# 1 USDT = 10^6 micro-USDT (6 decimals TRC20)
+MICRO = 10**6
+
+# Допустимое отклонение суммы перевода от ожидаемой (USDT)
+PAYMENT_AMOUNT_TOLERANCE = Decimal(os.environ.get('PAYMENT_AMOUNT_TOLERANCE', '0'))
+
+OPEN_STATUSES = ('pending', 'confirming')
+
+
+def to_micro(amount) -> int:
+    """Сумма в целых micro-единицах"""
+    return int((Decimal(amount) * MICRO).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class AmountIndex:
+    """
+    Индекс открытых платежей по (адрес, валюта) и ожидаемой сумме.
+    Для каждого адреса хранится отсортированный список
+    (amount_micro, created_ms, pk), поиск кандидатов - бинарный, O(log n).
+    Индекс обновляется инкрементально: sync() добавляет новые и убирает
+    закрытые платежи, remove() вызывается сразу при завершении платежа.
+    """
+    
+    def __init__(self, tolerance: Decimal = None):
+        tolerance = PAYMENT_AMOUNT_TOLERANCE if tolerance is None else tolerance
+        self.tolerance = to_micro(tolerance)
+        self._buckets: Dict[Tuple[str, str], List[Tuple[int, int, int]]] = {}
+        self._entries: Dict[int, Tuple[Tuple[str, str], Tuple[int, int, int]]] = {}
+        self._payments: Dict[int, 'CryptoPayment'] = {}
+        # Платежи на отдельных адресах пула
+        self._dedicated = set()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, pk):
+        return pk in self._entries
+    
+    def add(self, payment: 'CryptoPayment'):
+        """Добавить платёж (или обновить ссылку на уже проиндексированный)"""
+        self._payments[payment.pk] = payment
+        if payment.pk in self._entries:
+            return
+        
+        key = (payment.payment_address.address, payment.currency)
+        entry = (
+            to_micro(payment.amount_expected),
+            int(payment.created_at.timestamp() * 1000),
+            payment.pk,
+        )
+        insort(self._buckets.setdefault(key, []), entry)
+        self._entries[payment.pk] = (key, entry)
+        if payment.payment_address.in_pool:
+            self._dedicated.add(payment.pk)
+    
+    def remove(self, pk: int):
+        """Убрать платёж из индекса"""
+        self._payments.pop(pk, None)
+        self._dedicated.discard(pk)
+        item = self._entries.pop(pk, None)
+        if item is None:
+            return
+        
+        key, entry = item
+        bucket = self._buckets[key]
+        idx = bisect_left(bucket, entry)
+        if idx < len(bucket) and bucket[idx] == entry:
+            del bucket[idx]
+        if not bucket:
+            del self._buckets[key]
+    
+    def sync(self, payments):
+        """
+        Привести индекс к текущему набору открытых платежей:
+        новые добавляются, отсутствующие и закрытые удаляются.
+        """
+        seen = set()
+        for payment in payments:
+            if payment.status in OPEN_STATUSES:
+                self.add(payment)
+                seen.add(payment.pk)
+        
+        for pk in set(self._entries) - seen:
+            self.remove(pk)
+    
+    def match(self, address: str, currency: str, amount_micro: int,
+              timestamp_ms: int = None) -> Optional['CryptoPayment']:
+        """
+        Найти платёж для перевода: ближайшая по сумме ожидаемая сумма
+        в пределах допуска, среди ещё не оплаченных платежей, созданных
+        до перевода. При равном отклонении выбирается более ранний платёж.
+        На адресе пула - самый ранний открытый платёж, сумма не важна.
+        """
+        bucket = self._buckets.get((address, currency))
+        if not bucket:
+            return None
+        
+        if bucket[0][2] in self._dedicated:
+            return self._match_dedicated(bucket, timestamp_ms)
+        
+        best, best_diff = None, None
+        for idx in range(bisect_left(bucket, (amount_micro - self.tolerance,)), len(bucket)):
+            amount, created_ms, pk = bucket[idx]
+            if amount > amount_micro + self.tolerance:
+                break
+            if timestamp_ms is not None and created_ms > timestamp_ms:
+                continue
+            
+            payment = self._payments[pk]
+            if payment.status not in OPEN_STATUSES or self.is_paid(payment):
+                continue
+            
+            diff = abs(amount - amount_micro)
+            if best is None or diff < best_diff:
+                best, best_diff = payment, diff
+        
+        return best
+    
+    def _match_dedicated(self, bucket, timestamp_ms: int = None) -> Optional['CryptoPayment']:
+        """Самый ранний открытый платёж адреса пула, созданный до перевода"""
+        best, best_created = None, None
+        for _, created_ms, pk in bucket:
+            if timestamp_ms is not None and created_ms > timestamp_ms:
+                continue
+            payment = self._payments[pk]
+            if payment.status not in OPEN_STATUSES:
+                continue
+            if best is None or created_ms < best_created:
+                best, best_created = payment, created_ms
+        return best
+    
+    def is_paid(self, payment: 'CryptoPayment') -> bool:
+        """
+        Получена ли ожидаемая сумма с учётом допуска; на адресе пула -
+        получен ли хоть один перевод.
+        """
+        if payment.pk in self._dedicated:
+            return payment.amount_received > 0
+        return to_micro(payment.amount_received) + self.tolerance >= to_micro(payment.amount_expected)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=64, unique=True, verbose_name='TRC20 адрес')),
+                ('last_block_number', models.BigIntegerField(default=0, verbose_name='Последний блок')),
+                ('last_block_timestamp', models.BigIntegerField(default=0, verbose_name='Время последнего блока (мс)')),
+                ('last_tx_hash', models.CharField(blank=True, max_length=128, null=True, verbose_name='Последняя транзакция')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+            ],
+            options={
+                'verbose_name': 'Курсор адреса',
+                'verbose_name_plural': 'Курсоры адресов',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:49
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def separate_open_duplicates(apps, schema_editor):
+    """
+    Заполнить amount_requested и развести совпадающие суммы открытых
+    платежей micro-добавками, иначе уникальный индекс не создастся.
+    """
+    CryptoPayment = apps.get_model('crypto_payments', 'CryptoPayment')
+    CryptoPayment.objects.filter(amount_requested__isnull=True).update(
+        amount_requested=models.F('amount_expected')
+    )
+    
+    seen = set()
+    taken = set(
+        CryptoPayment.objects.filter(status__in=['pending', 'confirming'])
+        .values_list('payment_address_id', 'currency', 'amount_expected')
+    )
+    open_payments = CryptoPayment.objects.filter(
+        status__in=['pending', 'confirming']
+    ).order_by('created_at')
+    for payment in open_payments:
+        key = (payment.payment_address_id, payment.currency, payment.amount_expected)
+        if key not in seen:
+            seen.add(key)
+            continue
+        
+        amount = payment.amount_expected
+        while (payment.payment_address_id, payment.currency, amount) in taken:
+            amount += Decimal('0.000001')
+        taken.add((payment.payment_address_id, payment.currency, amount))
+        payment.amount_expected = amount
+        payment.save(update_fields=['amount_expected'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0002_addresscursor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='amount_requested',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=18, null=True, verbose_name='Запрошенная сумма'),
+        ),
+        migrations.RunPython(separate_open_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cryptopayment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirming'])), fields=('payment_address', 'currency', 'amount_expected'), name='unique_open_payment_amount'),
+        ),
+    ]
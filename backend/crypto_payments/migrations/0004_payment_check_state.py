@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0003_unique_open_payment_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='last_checked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Проверен в блокчейне'),
+        ),
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='refresh_requested_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Запрошена внеочередная проверка'),
+        ),
+    ]
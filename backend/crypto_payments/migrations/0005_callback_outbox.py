@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0004_payment_check_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallbackDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(verbose_name='Callback URL')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('delivered', 'Доставлен'), ('failed', 'Не доставлен')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Доставлен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='callbacks', to='crypto_payments.cryptopayment', verbose_name='Платёж')),
+            ],
+            options={
+                'verbose_name': 'Callback',
+                'verbose_name_plural': 'Callbacks',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CallbackAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_code', models.IntegerField(blank=True, null=True, verbose_name='HTTP код')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('duration_ms', models.IntegerField(default=0, verbose_name='Длительность (мс)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+                ('delivery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_log', to='crypto_payments.callbackdelivery', verbose_name='Callback')),
+            ],
+            options={
+                'verbose_name': 'Попытка callback',
+                'verbose_name_plural': 'Попытки callback',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='callbackdelivery',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='crypto_paym_status_3857d7_idx'),
+        ),
+    ]
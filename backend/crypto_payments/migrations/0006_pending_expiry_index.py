@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0005_callback_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cryptopayment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['expires_at'], name='pending_payment_expiry_idx'),
+        ),
+    ]
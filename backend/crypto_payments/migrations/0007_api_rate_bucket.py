@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0006_pending_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('tokens', models.FloatField(default=0, verbose_name='Токенов')),
+                ('refilled_at', models.FloatField(default=0, verbose_name='Пополнен (unix time)')),
+            ],
+            options={
+                'verbose_name': 'Лимит API',
+                'verbose_name_plural': 'Лимиты API',
+            },
+        ),
+    ]
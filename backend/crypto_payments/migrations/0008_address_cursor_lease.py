@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0007_api_rate_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addresscursor',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Аренда до'),
+        ),
+        migrations.AddField(
+            model_name='addresscursor',
+            name='leased_by',
+            field=models.CharField(blank=True, default='', max_length=128, verbose_name='Воркер'),
+        ),
+    ]
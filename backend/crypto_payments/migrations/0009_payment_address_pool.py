@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0008_address_cursor_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentaddress',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Выдан платежу'),
+        ),
+        migrations.AddField(
+            model_name='paymentaddress',
+            name='in_pool',
+            field=models.BooleanField(default=False, verbose_name='Из пула'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentaddress',
+            index=models.Index(condition=models.Q(('assigned_at__isnull', True), ('in_pool', True)), fields=['id'], name='address_pool_free_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:28
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+
+def fill_callback_host(apps, schema_editor):
+    CallbackDelivery = apps.get_model('crypto_payments', 'CallbackDelivery')
+    for delivery in CallbackDelivery.objects.filter(status='pending').only('pk', 'url').iterator():
+        CallbackDelivery.objects.filter(pk=delivery.pk).update(host=urlsplit(delivery.url).netloc)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0009_payment_address_pool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callbackdelivery',
+            name='host',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Хост'),
+        ),
+        migrations.RunPython(fill_callback_host, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='callbackdelivery',
+            index=models.Index(fields=['status', 'host', 'next_attempt_at'], name='crypto_paym_status_94451c_idx'),
+        ),
+    ]
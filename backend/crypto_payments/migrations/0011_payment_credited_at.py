@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:31
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_credited_payments(apps, schema_editor):
+    """Платежи, уже зачисленные подтверждением в админке (есть запись в истории баланса)"""
+    CryptoPayment = apps.get_model('crypto_payments', 'CryptoPayment')
+    BalanceHistory = apps.get_model('auth_app', 'BalanceHistory')
+    completed = CryptoPayment.objects.filter(status='completed', user__isnull=False)
+    for payment in completed.only('pk', 'payment_id', 'user_id', 'completed_at').iterator():
+        credited = BalanceHistory.objects.filter(
+            user_id=payment.user_id,
+            transaction_type='deposit',
+            description__contains=payment.payment_id,
+        ).exists()
+        if credited:
+            CryptoPayment.objects.filter(pk=payment.pk).update(credited_at=payment.completed_at or timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0010_callback_host'),
+        ('auth_app', '0013_userprofile_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='credited_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Зачислен на баланс'),
+        ),
+        migrations.RunPython(mark_credited_payments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def drop_unassigned_pool_addresses(apps, schema_editor):
+    """
+    Адреса пула до исправления хеша (SHA3-256 вместо Keccak256) не
+    соответствуют своим ключам. Ещё не выданные удаляются -
+    refill_address_pool создаст их заново.
+    """
+    PaymentAddress = apps.get_model('crypto_payments', 'PaymentAddress')
+    PaymentAddress.objects.filter(
+        in_pool=True,
+        assigned_at__isnull=True,
+        payments__isnull=True,
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_payments', '0011_payment_credited_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unassigned_pool_addresses, migrations.RunPython.noop),
+    ]
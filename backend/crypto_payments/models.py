@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 import secrets
 import string
 
@@ -32,21 +33,80 @@ class PaymentAddress(models.Model):
     """
     Уникальный адрес для каждого платежа.
     Генерируется из HD-кошелька для анонимности.
+    Адреса пула (in_pool) создаются заранее командой refill_address_pool
+    и выдаются платежам при создании (assigned_at).
     """
     address = models.CharField(max_length=64, unique=True, verbose_name="TRC20 адрес")
     private_key_encrypted = models.TextField(verbose_name="Зашифрованный приватный ключ")
     derivation_index = models.IntegerField(verbose_name="Индекс деривации")
     is_used = models.BooleanField(default=False)
+    in_pool = models.BooleanField(default=False, verbose_name="Из пула")
+    assigned_at = models.DateTimeField(null=True, blank=True, verbose_name="Выдан платежу")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = "Платёжный адрес"
         verbose_name_plural = "Платёжные адреса"
+        indexes = [
+            # Свободные адреса пула - выдача первого свободного за O(1)
+            models.Index(
+                fields=['id'],
+                condition=models.Q(in_pool=True, assigned_at__isnull=True),
+                name='address_pool_free_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.address[:8]}...{self.address[-6:]}"
 
 
+class AddressCursor(models.Model):
+    """
+    Курсор инкрементального чтения TRC20 истории адреса.
+    Хранит последнюю обработанную транзакцию, чтобы каждый цикл
+    мониторинга запрашивал у TronGrid только новые транзакции.
+    Через курсор воркеры мониторинга делят адреса между собой:
+    адрес проверяет только воркер, держащий его аренду.
+    """
+    address = models.CharField(max_length=64, unique=True, verbose_name="TRC20 адрес")
+    last_block_number = models.BigIntegerField(default=0, verbose_name="Последний блок")
+    last_block_timestamp = models.BigIntegerField(default=0, verbose_name="Время последнего блока (мс)")
+    last_tx_hash = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        verbose_name="Последняя транзакция"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлён")
+    # Аренда адреса воркером мониторинга (monitor_payments --shard)
+    leased_by = models.CharField(max_length=128, blank=True, default='', verbose_name="Воркер")
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Аренда до")
+    
+    class Meta:
+        verbose_name = "Курсор адреса"
+        verbose_name_plural = "Курсоры адресов"
+    
+    def __str__(self):
+        return f"{self.address[:8]}...{self.address[-6:]} @ {self.last_block_number}"
+
+
+class ApiRateBucket(models.Model):
+    """
+    Token bucket лимита запросов к внешнему API.
+    Одна строка на API ключ, общая для всех процессов (web и монитор).
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="Ключ")
+    tokens = models.FloatField(default=0, verbose_name="Токенов")
+    refilled_at = models.FloatField(default=0, verbose_name="Пополнен (unix time)")
+    
+    class Meta:
+        verbose_name = "Лимит API"
+        verbose_name_plural = "Лимиты API"
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f}"
+
+
 class CryptoPayment(models.Model):
     """
     Запись о крипто-платеже.
@@ -95,6 +155,13 @@ class CryptoPayment(models.Model):
         decimal_places=6,
         verbose_name="Ожидаемая сумма"
     )
+    amount_requested = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        null=True,
+        blank=True,
+        verbose_name="Запрошенная сумма"
+    )
     amount_received = models.DecimalField(
         max_digits=18,
         decimal_places=6,
@@ -116,9 +183,20 @@ class CryptoPayment(models.Model):
     confirmations = models.IntegerField(default=0, verbose_name="Подтверждения")
     expires_at = models.DateTimeField(verbose_name="Истекает")
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершён")
+    # Сумма зачислена на баланс пользователя (balance.credit_payments)
+    credited_at = models.DateTimeField(null=True, blank=True, verbose_name="Зачислен на баланс")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлён")
     
+    # Состояние фоновой проверки в блокчейне
+    last_checked_at = models.DateTimeField(null=True, blank=True, verbose_name="Проверен в блокчейне")
+    refresh_requested_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name="Запрошена внеочередная проверка"
+    )
+    
     # Метаданные (для callback)
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Метаданные")
     callback_url = models.URLField(blank=True, null=True, verbose_name="Callback URL")
@@ -127,6 +205,22 @@ class CryptoPayment(models.Model):
         verbose_name = "Крипто платёж"
         verbose_name_plural = "Крипто платежи"
         ordering = ['-created_at']
+        constraints = [
+            # Уникальная сумма среди открытых платежей на адрес
+            models.UniqueConstraint(
+                fields=['payment_address', 'currency', 'amount_expected'],
+                condition=models.Q(status__in=['pending', 'confirming']),
+                name='unique_open_payment_amount',
+            ),
+        ]
+        indexes = [
+            # Выборка просроченных платежей для expire_payments
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='pending'),
+                name='pending_payment_expiry_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"#{self.payment_id} - {self.amount_expected} {self.currency}"
@@ -161,3 +255,74 @@ class TransactionLog(models.Model):
     def __str__(self):
         return f"{self.tx_hash[:16]}... - {self.amount} {self.currency}"
 
+
+
+class CallbackDelivery(models.Model):
+    """
+    Очередь (outbox) callback-уведомлений мерчанту.
+    Монитор только добавляет запись, отправку с повторами выполняет
+    команда deliver_callbacks.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('delivered', 'Доставлен'),
+        ('failed', 'Не доставлен'),
+    ]
+    
+    payment = models.ForeignKey(
+        CryptoPayment,
+        on_delete=models.CASCADE,
+        related_name='callbacks',
+        verbose_name="Платёж"
+    )
+    url = models.URLField(verbose_name="Callback URL")
+    # Хост url - по нему диспетчер пропускает хосты без свободных слотов
+    host = models.CharField(max_length=255, blank=True, default='', verbose_name="Хост")
+    payload = models.JSONField(default=dict, verbose_name="Данные")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    attempts = models.IntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name="Доставлен")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    
+    class Meta:
+        verbose_name = "Callback"
+        verbose_name_plural = "Callbacks"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'host', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.payment_id} → {self.url} ({self.status})"
+
+
+class CallbackAttempt(models.Model):
+    """
+    Попытка доставки callback.
+    """
+    delivery = models.ForeignKey(
+        CallbackDelivery,
+        on_delete=models.CASCADE,
+        related_name='attempt_log',
+        verbose_name="Callback"
+    )
+    status_code = models.IntegerField(null=True, blank=True, verbose_name="HTTP код")
+    error = models.TextField(blank=True, default='', verbose_name="Ошибка")
+    duration_ms = models.IntegerField(default=0, verbose_name="Длительность (мс)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время")
+    
+    class Meta:
+        verbose_name = "Попытка callback"
+        verbose_name_plural = "Попытки callback"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.delivery_id}: {self.status_code or self.error[:32]}"
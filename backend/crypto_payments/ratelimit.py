@@ -0,0 +1,170 @@
+"""
+Общий лимит запросов к TronGrid для всех процессов (web и монитор).
+Token bucket хранится в БД (ApiRateBucket) - одна строка на API ключ,
+списание выполняется под блокировкой строки. Процесс забирает токены
+пачкой (TRONGRID_RATE_BATCH) и расходует их локально, поэтому строка
+блокируется один раз на пачку, а не на каждый запрос.
+
+Приоритеты: запросы монитора (PRIORITY_MONITOR) могут израсходовать весь
+бюджет, интерактивные запросы (PRIORITY_INTERACTIVE) - только сверх
+резерва TRONGRID_INTERACTIVE_RESERVE, поэтому при нехватке квоты
+мониторинг платежей обслуживается в первую очередь.
+"""
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Лимит запросов к TronGrid на один API ключ (запросов в секунду, 0 - без лимита)
+TRONGRID_RATE_LIMIT = float(os.environ.get('TRONGRID_RATE_LIMIT', 10))
+
+# Ёмкость bucket - допустимый всплеск запросов
+TRONGRID_RATE_BURST = float(os.environ.get('TRONGRID_RATE_BURST', 20))
+
+# Доля ёмкости, недоступная интерактивным запросам (резерв монитора)
+TRONGRID_INTERACTIVE_RESERVE = float(os.environ.get('TRONGRID_INTERACTIVE_RESERVE', 0.5))
+
+# Сколько токенов процесс забирает из bucket за одну блокировку строки
+TRONGRID_RATE_BATCH = int(os.environ.get('TRONGRID_RATE_BATCH', 5))
+
+# Сколько живут неизрасходованные токены пачки (секунды) - старые токены
+# не складываются с новыми во всплеск сверх лимита
+TRONGRID_RATE_BATCH_TTL = float(os.environ.get('TRONGRID_RATE_BATCH_TTL', 1))
+
+# Сколько запрос готов ждать токен (секунды), затем - ошибка
+TRONGRID_RATE_MAX_WAIT = {
+    'monitor': float(os.environ.get('TRONGRID_MONITOR_MAX_WAIT', 60)),
+    'interactive': float(os.environ.get('TRONGRID_INTERACTIVE_MAX_WAIT', 5)),
+}
+
+PRIORITY_MONITOR = 'monitor'
+PRIORITY_INTERACTIVE = 'interactive'
+
+
+class RateLimiter:
+    """
+    Token bucket в БД.
+    rate - токенов в секунду, burst - ёмкость bucket, batch - сколько
+    токенов процесс забирает за раз.
+    """
+    
+    def __init__(self, key: str, rate: float = None, burst: float = None,
+                 interactive_reserve: float = None, batch: int = None):
+        self.key = key
+        self.rate = TRONGRID_RATE_LIMIT if rate is None else rate
+        self.burst = max(1.0, TRONGRID_RATE_BURST if burst is None else burst)
+        reserve = TRONGRID_INTERACTIVE_RESERVE if interactive_reserve is None else interactive_reserve
+        self.floors = {
+            PRIORITY_MONITOR: 0.0,
+            PRIORITY_INTERACTIVE: min(self.burst - 1, self.burst * reserve),
+        }
+        self.batch = max(1, min(int(self.burst), TRONGRID_RATE_BATCH if batch is None else batch))
+        # Запросы одного процесса ждут друг друга здесь, а не на блокировке строки
+        self._lock = threading.Lock()
+        # Забранные, но ещё не израсходованные токены: приоритет -> (токенов, годны до)
+        self._local = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+    
+    def reserve(self, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """
+        Попытаться взять токен: сначала из пачки процесса, затем новой
+        пачкой из bucket.
+        Returns: 0 если токен получен, иначе сколько секунд подождать
+        """
+        with self._lock:
+            local, valid_until = self._local.get(priority, (0, 0.0))
+            if local and time.monotonic() < valid_until:
+                self._local[priority] = (local - 1, valid_until)
+                return 0.0
+            
+            granted, wait = self._take(priority)
+            if granted:
+                self._local[priority] = (granted - 1, time.monotonic() + TRONGRID_RATE_BATCH_TTL)
+            return wait
+    
+    def _take(self, priority: str):
+        """
+        Забрать из bucket до batch токенов (вызывается под self._lock).
+        Returns: (сколько токенов получено, сколько секунд подождать)
+        """
+        from .models import ApiRateBucket
+        
+        floor = self.floors.get(priority, self.floors[PRIORITY_INTERACTIVE])
+        with transaction.atomic():
+            now = time.time()
+            bucket, _ = ApiRateBucket.objects.select_for_update().get_or_create(
+                key=self.key,
+                defaults={'tokens': self.burst, 'refilled_at': now},
+            )
+            tokens = min(self.burst, bucket.tokens + max(0.0, now - bucket.refilled_at) * self.rate)
+            granted = min(self.batch, int(tokens - floor)) if tokens >= floor + 1 else 0
+            if granted:
+                tokens -= granted
+                wait = 0.0
+            else:
+                wait = (floor + 1 - tokens) / self.rate
+            
+            ApiRateBucket.objects.filter(pk=bucket.pk).update(tokens=tokens, refilled_at=now)
+        return granted, wait
+    
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE) -> bool:
+        """
+        Дождаться токена (не дольше TRONGRID_RATE_MAX_WAIT для приоритета).
+        Returns: False если токен не получен за отведённое время
+        """
+        if not self.enabled:
+            return True
+        
+        deadline = time.monotonic() + TRONGRID_RATE_MAX_WAIT.get(priority, 0)
+        while True:
+            wait = self.reserve(priority)
+            if not wait:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, wait * random.uniform(1.0, 1.5)))
+    
+    async def acquire_async(self, priority: str = PRIORITY_INTERACTIVE) -> bool:
+        """То же, что acquire, для асинхронного клиента"""
+        if not self.enabled:
+            return True
+        
+        deadline = time.monotonic() + TRONGRID_RATE_MAX_WAIT.get(priority, 0)
+        while True:
+            # ORM синхронный - обращение к bucket выполняется в потоке
+            wait = await asyncio.to_thread(self.reserve, priority)
+            if not wait:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, wait * random.uniform(1.0, 1.5)))
+    
+    def drain(self):
+        """
+        Обнулить bucket после 429 от TronGrid: все процессы
+        притормаживают до пополнения.
+        """
+        from .models import ApiRateBucket
+        
+        if self.enabled:
+            with self._lock:
+                self._local.clear()
+            ApiRateBucket.objects.filter(key=self.key).update(tokens=0, refilled_at=time.time())
+
+
+def trongrid_rate_limiter(api_key: str, network: str) -> RateLimiter:
+    """Лимитер для API ключа (в БД хранится хэш ключа, а не сам ключ)"""
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return RateLimiter(f"trongrid:{network}:{digest}")
@@ -3,18 +3,33 @@
 Использует TronGrid API для мониторинга транзакций.
 """
 import os
+import time
+import asyncio
+import random
 import hashlib
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from decimal import Decimal
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Set, Tuple, Iterator
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q, F, Value, Exists, OuterRef, Subquery
 from django.utils import timezone
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from base58 import b58encode_check, b58decode_check
+from Crypto.Hash import keccak
 import ecdsa
 import logging
 
+from .matching import AmountIndex, MICRO, PAYMENT_AMOUNT_TOLERANCE
+from .callbacks import enqueue_callbacks
+from .balance import credit_payments, PAYMENT_AUTO_CREDIT
+from .address_pool import AddressPool
+from .hd_wallet import get_hd_wallet, reset_hd_wallet, HD_DERIVED_KEY
+from .ratelimit import trongrid_rate_limiter, PRIORITY_INTERACTIVE
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,7 +40,9 @@ logger = logging.getLogger(__name__)
 # TronGrid API ключ (получить на https://www.trongrid.io/)
 TRONGRID_API_KEY = os.environ.get('TRONGRID_API_KEY', 'YOUR_TRONGRID_API_KEY')
 
-# Ключ шифрования для приватных ключей (сгенерируйте: Fernet.generate_key())
+# Ключ шифрования для приватных ключей (сгенерируйте: Fernet.generate_key()).
+# Для ротации - несколько ключей через запятую: шифруется первым,
+# расшифровывается любым
 ENCRYPTION_KEY = os.environ.get('CRYPTO_ENCRYPTION_KEY', 'YOUR_FERNET_KEY')
 
 # USDT TRC20 контракт (mainnet)
@@ -34,21 +51,140 @@ USDT_CONTRACT_ADDRESS = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
 # ВАШ ОСНОВНОЙ КОШЕЛЁК для приёма всех платежей
 MERCHANT_WALLET_ADDRESS = 'TMDLvTzQLeLp2SrcjwAwJ4CcZqiji12XZ6'
 
+# Адрес платежа: 'merchant' - общий кошелёк MERCHANT_WALLET_ADDRESS
+# (платёж определяется по сумме), 'pool' - отдельный адрес из пула
+# (см. address_pool.py, refill_address_pool)
+PAYMENT_ADDRESS_MODE = os.environ.get('PAYMENT_ADDRESS_MODE', 'merchant')
+
 # Сеть: 'mainnet' или 'shasta' (тестнет)
 TRON_NETWORK = os.environ.get('TRON_NETWORK', 'mainnet')
 
+# Адрес TronGrid вместо адреса сети (например локальный fake_trongrid для нагрузочных тестов)
+TRONGRID_BASE_URL = os.environ.get('TRONGRID_BASE_URL', '')
+
 # Минимальное количество подтверждений
 MIN_CONFIRMATIONS = 19
 
+# Интервал между блоками TRON (мс) - для оценки номера блока по времени
+TRON_BLOCK_INTERVAL_MS = 3000
+
 # Время жизни платежа (минуты)
 PAYMENT_EXPIRY_MINUTES = 60
 
+# Размер пачки при переводе просроченных платежей в expired
+PAYMENT_EXPIRY_BATCH_SIZE = int(os.environ.get('PAYMENT_EXPIRY_BATCH_SIZE', 1000))
+
+# Количество micro-добавок к сумме платежа (1..N micro-USDT, по умолчанию до 0.009999)
+PAYMENT_AMOUNT_OFFSET_SLOTS = int(os.environ.get('PAYMENT_AMOUNT_OFFSET_SLOTS', 9999))
+
+# Минимальный интервал между запросами внеочередной проверки платежа (секунды)
+REFRESH_HINT_INTERVAL = int(os.environ.get('REFRESH_HINT_INTERVAL', 30))
+
+# Попыток выделить свободную уникальную сумму
+PAYMENT_AMOUNT_ALLOCATION_ATTEMPTS = 20
+
+# Размер страницы TRC20 истории (максимум TronGrid - 200)
+TRC20_PAGE_SIZE = int(os.environ.get('TRC20_PAGE_SIZE', 200))
+
+# Максимум страниц истории на адрес за один цикл мониторинга
+TRC20_MAX_PAGES = int(os.environ.get('TRC20_MAX_PAGES', 50))
+
+# Размер пула keep-alive соединений к TronGrid
+TRONGRID_POOL_SIZE = int(os.environ.get('TRONGRID_POOL_SIZE', 10))
+
+# Повторы запросов при 429/5xx и параметры backoff (секунды)
+TRONGRID_MAX_RETRIES = int(os.environ.get('TRONGRID_MAX_RETRIES', 3))
+TRONGRID_BACKOFF_BASE = float(os.environ.get('TRONGRID_BACKOFF_BASE', 0.5))
+TRONGRID_BACKOFF_MAX = float(os.environ.get('TRONGRID_BACKOFF_MAX', 10))
+
+# Время жизни закэшированного номера текущего блока (секунды, блок TRON ~3 сек)
+BLOCK_HEIGHT_TTL = float(os.environ.get('BLOCK_HEIGHT_TTL', 3))
+
+# Аренда адреса воркером мониторинга (секунды) в режиме --shard
+ADDRESS_LEASE_SECONDS = int(os.environ.get('ADDRESS_LEASE_SECONDS', 120))
+
 # ============================================
 
 
+class TronGridError(Exception):
+    """Ошибка запроса к TronGrid (после исчерпания повторов)"""
+    
+    def __init__(self, endpoint: str, message: str, status_code: int = None):
+        super().__init__(f"{endpoint}: {message}")
+        self.endpoint = endpoint
+        self.status_code = status_code
+
+
+class AddressLeaseLost(Exception):
+    """Аренда адреса истекла или перехвачена другим воркером"""
+
+
+class TronGridMetrics:
+    """
+    Метрики запросов к TronGrid по эндпоинтам и последние заголовки лимитов.
+    Общий объект может использоваться синхронным и асинхронным клиентами.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.rate_limit = {}
+    
+    def record(self, endpoint: str, started: float, error: bool):
+        """Учесть запрос в метриках эндпоинта"""
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            stat = self.stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            stat['calls'] += 1
+            stat['errors'] += int(error)
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+    
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self.stats[endpoint]['retries'] += 1
+    
+    def update_rate_limit(self, headers):
+        """Запомнить заголовки лимитов запросов из ответа TronGrid"""
+        limits = {
+            key.lower(): value for key, value in headers.items()
+            if key.lower().startswith('x-ratelimit') or key.lower() == 'retry-after'
+        }
+        if limits:
+            with self._lock:
+                self.rate_limit.update(limits)
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Метрики по эндпоинтам: вызовы, ошибки, повторы, задержка"""
+        with self._lock:
+            return {
+                endpoint: dict(
+                    stat,
+                    avg_ms=round(stat['total_ms'] / stat['calls'], 1) if stat['calls'] else 0.0,
+                )
+                for endpoint, stat in self.stats.items()
+            }
+
+
+def trongrid_backoff(attempt: int, retry_after: str = None) -> float:
+    """Задержка перед повтором: Retry-After или экспонента с full jitter"""
+    if retry_after:
+        try:
+            return min(float(retry_after), TRONGRID_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(TRONGRID_BACKOFF_MAX, TRONGRID_BACKOFF_BASE * (2 ** attempt)))
+
+
 class TronGridAPI:
     """
     Класс для работы с TronGrid API.
+    Все запросы идут через один keep-alive пул соединений (requests.Session)
+    с ограниченным числом повторов и jitter-backoff на 429/5xx.
+    Перед каждым запросом берётся токен общего для всех процессов лимита
+    (см. ratelimit.py) с приоритетом priority.
     """
     
     BASE_URLS = {
@@ -56,60 +192,185 @@ class TronGridAPI:
         'shasta': 'https://api.shasta.trongrid.io',
     }
     
-    def __init__(self):
-        self.base_url = self.BASE_URLS.get(TRON_NETWORK, self.BASE_URLS['mainnet'])
+    # Коды ответа, после которых запрос имеет смысл повторить
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, pool_size: int = None, max_retries: int = None,
+                 priority: str = PRIORITY_INTERACTIVE, base_url: str = None):
+        self.base_url = (
+            base_url or TRONGRID_BASE_URL
+            or self.BASE_URLS.get(TRON_NETWORK, self.BASE_URLS['mainnet'])
+        ).rstrip('/')
         self.api_key = TRONGRID_API_KEY
         self.headers = {
             'TRON-PRO-API-KEY': self.api_key,
             'Content-Type': 'application/json',
         }
+        self.max_retries = TRONGRID_MAX_RETRIES if max_retries is None else max_retries
+        
+        pool_size = pool_size or TRONGRID_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        self.metrics = TronGridMetrics()
+        self.priority = priority
+        self.limiter = trongrid_rate_limiter(self.api_key, TRON_NETWORK)
+    
+    def _request(self, endpoint: str, method: str, path: str,
+                 params: Dict = None, timeout: int = 10) -> Dict:
+        """
+        Выполнить запрос к TronGrid.
+        endpoint - имя эндпоинта для метрик.
+        Raises: TronGridError если ответ не получен после всех повторов
+        """
+        url = f"{self.base_url}{path}"
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            if not self.limiter.acquire(self.priority):
+                raise TronGridError(endpoint, "local rate limit budget exhausted", 429)
+            
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, params=params, timeout=timeout)
+            except requests.RequestException as e:
+                self.metrics.record(endpoint, started, error=True)
+                status_code, error = None, str(e)
+            else:
+                self.metrics.record(endpoint, started, error=response.status_code != 200)
+                self.metrics.update_rate_limit(response.headers)
+                if response.status_code == 200:
+                    return response.json()
+                
+                status_code, error = response.status_code, f"HTTP {response.status_code}"
+                if status_code not in self.RETRY_STATUS_CODES:
+                    raise TronGridError(endpoint, error, status_code)
+                if status_code == 429:
+                    self.limiter.drain()
+                retry_after = response.headers.get('Retry-After')
+            
+            if attempt < self.max_retries:
+                self.metrics.record_retry(endpoint)
+                time.sleep(trongrid_backoff(attempt, retry_after))
+        
+        raise TronGridError(endpoint, error, status_code)
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Метрики по эндпоинтам: вызовы, ошибки, повторы, задержка"""
+        return self.metrics.snapshot()
+    
+    @property
+    def rate_limit(self) -> Dict[str, str]:
+        """Последние заголовки лимитов TronGrid"""
+        return self.metrics.rate_limit
     
     def get_account_info(self, address: str) -> Optional[Dict]:
         """Получить информацию об аккаунте"""
         try:
-            url = f"{self.base_url}/v1/accounts/{address}"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('data', [{}])[0] if data.get('data') else None
-            return None
+            data = self._request('account', 'GET', f"/v1/accounts/{address}")
+            return data.get('data', [{}])[0] if data.get('data') else None
         except Exception as e:
             logger.error(f"Error getting account info: {e}")
             return None
     
     def get_trc20_transactions(self, address: str, limit: int = 50, 
                                 only_confirmed: bool = True,
-                                min_timestamp: int = None) -> List[Dict]:
+                                min_timestamp: int = None,
+                                order_by: str = None) -> List[Dict]:
         """
         Получить TRC20 транзакции для адреса.
+        order_by: например 'block_timestamp,asc' (по умолчанию TronGrid
+        отдаёт сначала новые).
         """
         try:
-            url = f"{self.base_url}/v1/accounts/{address}/transactions/trc20"
             params = {
                 'limit': limit,
                 'only_confirmed': str(only_confirmed).lower(),
             }
             if min_timestamp:
                 params['min_timestamp'] = min_timestamp
+            if order_by:
+                params['order_by'] = order_by
             
-            response = requests.get(url, headers=self.headers, params=params, timeout=15)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('data', [])
-            return []
+            data = self._request(
+                'trc20_history', 'GET', f"/v1/accounts/{address}/transactions/trc20",
+                params=params, timeout=15
+            )
+            return data.get('data', [])
         except Exception as e:
             logger.error(f"Error getting TRC20 transactions: {e}")
             return []
     
+    def iter_trc20_pages(self, address: str, page_size: int = TRC20_PAGE_SIZE,
+                         max_pages: int = None, only_confirmed: bool = True,
+                         min_timestamp: int = None, order_by: str = None,
+                         raise_errors: bool = False) -> Iterator[List[Dict]]:
+        """
+        Постранично читать TRC20 историю адреса.
+        Следующая страница запрашивается лениво по meta.fingerprint
+        только когда потребитель дочитал текущую, поэтому в памяти
+        одновременно находится не больше одной страницы.
+        При ошибке запроса итерация прекращается, а с raise_errors
+        выбрасывается TronGridError - чтобы отличить сбой от пустой истории.
+        """
+        params = {
+            'limit': page_size,
+            'only_confirmed': str(only_confirmed).lower(),
+        }
+        if min_timestamp:
+            params['min_timestamp'] = min_timestamp
+        if order_by:
+            params['order_by'] = order_by
+        
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            try:
+                data = self._request(
+                    'trc20_history', 'GET', f"/v1/accounts/{address}/transactions/trc20",
+                    params=params, timeout=15
+                )
+            except Exception as e:
+                logger.error(f"Error getting TRC20 transactions page for {address}: {e}")
+                if raise_errors:
+                    if isinstance(e, TronGridError):
+                        raise
+                    raise TronGridError('trc20_history', str(e)) from e
+                return
+            
+            transactions = data.get('data', [])
+            if not transactions:
+                return
+            
+            pages += 1
+            yield transactions
+            
+            fingerprint = data.get('meta', {}).get('fingerprint')
+            if not fingerprint:
+                return
+            params['fingerprint'] = fingerprint
+    
+    def iter_trc20_transactions(self, address: str, page_size: int = TRC20_PAGE_SIZE,
+                                max_items: int = None, **kwargs) -> Iterator[Dict]:
+        """
+        Потоково перебрать TRC20 транзакции адреса (см. iter_trc20_pages).
+        max_items ограничивает общее количество транзакций.
+        """
+        count = 0
+        for page in self.iter_trc20_pages(address, page_size=page_size, **kwargs):
+            for tx in page:
+                if max_items is not None and count >= max_items:
+                    return
+                count += 1
+                yield tx
+    
     def get_transaction_info(self, tx_hash: str) -> Optional[Dict]:
         """Получить информацию о транзакции"""
         try:
-            url = f"{self.base_url}/v1/transactions/{tx_hash}"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('data', [{}])[0] if data.get('data') else None
-            return None
+            data = self._request('transaction', 'GET', f"/v1/transactions/{tx_hash}")
+            return data.get('data', [{}])[0] if data.get('data') else None
         except Exception as e:
             logger.error(f"Error getting transaction info: {e}")
             return None
@@ -117,12 +378,8 @@ class TronGridAPI:
     def get_current_block(self) -> Optional[int]:
         """Получить номер текущего блока"""
         try:
-            url = f"{self.base_url}/wallet/getnowblock"
-            response = requests.post(url, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('block_header', {}).get('raw_data', {}).get('number')
-            return None
+            data = self._request('now_block', 'POST', "/wallet/getnowblock")
+            return data.get('block_header', {}).get('raw_data', {}).get('number')
         except Exception as e:
             logger.error(f"Error getting current block: {e}")
             return None
@@ -146,6 +403,81 @@ class TronGridAPI:
             return Decimal('0')
 
 
+class BlockHeightProvider:
+    """
+    Номер текущего блока с коротким TTL.
+    Один экземпляр на процесс (см. get_block_height_provider): все расчёты
+    подтверждений в цикле мониторинга и все запросы воркера используют
+    одно значение, а TronGrid опрашивается не чаще раза в ttl секунд.
+    Может обновляться фоновым потоком (start_ticker).
+    """
+    
+    def __init__(self, trongrid: 'TronGridAPI' = None, ttl: float = BLOCK_HEIGHT_TTL):
+        self.trongrid = trongrid or TronGridAPI()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._height = None
+        self._fetched_at = 0.0
+        self._ticker = None
+        self._stop = threading.Event()
+    
+    def get(self) -> Optional[int]:
+        """Номер текущего блока (из кэша, если он не устарел)"""
+        with self._lock:
+            if self._height is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return self._height
+        return self.refresh()
+    
+    def refresh(self) -> Optional[int]:
+        """Запросить номер блока у TronGrid. При ошибке остаётся прежнее значение"""
+        height = self.trongrid.get_current_block()
+        if height is not None:
+            self.set(height)
+        with self._lock:
+            return self._height
+    
+    def set(self, height: int):
+        """Обновить значение, полученное снаружи (например, async-клиентом)"""
+        with self._lock:
+            if self._height is None or height >= self._height:
+                self._height = height
+            self._fetched_at = time.monotonic()
+    
+    def start_ticker(self, interval: float = None):
+        """Запустить фоновое обновление номера блока"""
+        if self._ticker and self._ticker.is_alive():
+            return
+        interval = interval or self.ttl
+        self._stop.clear()
+        
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Block height ticker error: {e}")
+        
+        self.refresh()
+        self._ticker = threading.Thread(target=run, name='block-height-ticker', daemon=True)
+        self._ticker.start()
+    
+    def stop_ticker(self):
+        self._stop.set()
+
+
+_block_height_provider = None
+_block_height_lock = threading.Lock()
+
+
+def get_block_height_provider(trongrid: 'TronGridAPI' = None) -> BlockHeightProvider:
+    """Общий для процесса BlockHeightProvider"""
+    global _block_height_provider
+    with _block_height_lock:
+        if _block_height_provider is None:
+            _block_height_provider = BlockHeightProvider(trongrid)
+        return _block_height_provider
+
+
 class TronWalletGenerator:
     """
     Генератор TRON кошельков.
@@ -174,15 +506,12 @@ class TronWalletGenerator:
     @staticmethod
     def _public_key_to_address(public_key: str) -> str:
         """Конвертирует публичный ключ в TRON адрес"""
-        # Keccak256 хеш публичного ключа
+        # Keccak256 хеш публичного ключа (не SHA3-256: у них разный padding)
         public_key_bytes = bytes.fromhex(public_key)
-        
-        # Используем sha3_256 как замену keccak256
-        import hashlib
-        keccak = hashlib.sha3_256(public_key_bytes).digest()
+        digest = keccak.new(data=public_key_bytes, digest_bits=256).digest()
         
         # Берём последние 20 байт
-        address_bytes = keccak[-20:]
+        address_bytes = digest[-20:]
         
         # Добавляем префикс 0x41 для TRON mainnet
         address_with_prefix = b'\x41' + address_bytes
@@ -192,6 +521,17 @@ class TronWalletGenerator:
         
         return address
     
+    @staticmethod
+    def check_derivation():
+        """
+        Проверка хеширования на известном векторе (закрытый ключ 1 - адрес
+        Ethereum 0x7e5f...bdf с префиксом TRON). Адреса, не соответствующие
+        ключам, выдавать нельзя - средства на них будут потеряны.
+        """
+        address = TronWalletGenerator.private_key_to_address(format(1, '064x'))
+        if address != 'TMVQGm1qAQYVdetCeGRRkTWYYrLXuHK2HC':
+            raise ValueError(f"Неверная генерация TRON адресов: {address}")
+    
     @staticmethod
     def private_key_to_address(private_key: str) -> str:
         """Получает адрес из приватного ключа"""
@@ -204,12 +544,15 @@ class TronWalletGenerator:
 class CryptoEncryption:
     """
     Шифрование приватных ключей.
+    Экземпляр потокобезопасен - используйте общий (get_encryption).
     """
     
-    def __init__(self):
-        if ENCRYPTION_KEY == 'YOUR_FERNET_KEY':
+    def __init__(self, key: str = None):
+        key = key or ENCRYPTION_KEY
+        if key == 'YOUR_FERNET_KEY':
             raise ValueError("CRYPTO_ENCRYPTION_KEY не настроен! Сгенерируйте ключ.")
-        self.fernet = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
+        keys = [part.strip() for part in key.split(',') if part.strip()]
+        self.fernet = MultiFernet([Fernet(part.encode()) for part in keys])
     
     def encrypt(self, data: str) -> str:
         """Зашифровать данные"""
@@ -218,6 +561,31 @@ class CryptoEncryption:
     def decrypt(self, encrypted_data: str) -> str:
         """Расшифровать данные"""
         return self.fernet.decrypt(encrypted_data.encode()).decode()
+    
+    def rotate(self, encrypted_data: str) -> str:
+        """Перешифровать данные первым (текущим) ключом"""
+        return self.fernet.rotate(encrypted_data.encode()).decode()
+
+
+_encryption = None
+_encryption_configured = True
+_encryption_lock = threading.Lock()
+
+
+def get_encryption() -> Optional[CryptoEncryption]:
+    """
+    Общий для процесса CryptoEncryption.
+    Returns: None, если CRYPTO_ENCRYPTION_KEY не настроен
+    """
+    global _encryption, _encryption_configured
+    with _encryption_lock:
+        if _encryption is None and _encryption_configured:
+            try:
+                _encryption = CryptoEncryption()
+            except ValueError:
+                _encryption_configured = False
+                logger.warning("Encryption not configured - private keys will not be encrypted!")
+        return _encryption
 
 
 class PaymentService:
@@ -227,14 +595,19 @@ class PaymentService:
     Идентификация платежей по уникальной сумме.
     """
     
-    def __init__(self):
-        self.trongrid = TronGridAPI()
+    def __init__(self, priority: str = PRIORITY_INTERACTIVE):
+        # priority - приоритет запросов к TronGrid в общем лимите (ratelimit.py)
+        self.trongrid = TronGridAPI(priority=priority)
+        self.block_height = get_block_height_provider(self.trongrid)
+        # Индекс открытых платежей по сумме - живёт между циклами мониторинга
+        self.matcher = AmountIndex()
+        # Воркер, от имени которого арендованы адреса (claim_addresses);
+        # запись результатов по адресу разрешена только при живой аренде
+        self.lease_owner = None
         self.wallet_generator = TronWalletGenerator()
-        try:
-            self.encryption = CryptoEncryption()
-        except ValueError:
-            self.encryption = None
-            logger.warning("Encryption not configured - private keys will not be encrypted!")
+        self.encryption = get_encryption()
+        self.hd_wallet = get_hd_wallet()
+        self.address_pool = AddressPool(self.wallet_generator, self.encryption, self.hd_wallet)
     
     def create_payment(self, amount: Decimal, currency: str = 'USDT',
                        user=None, metadata: Dict = None, 
@@ -242,9 +615,14 @@ class PaymentService:
         """
         Создать новый платёж на фиксированный кошелёк.
         Верификация платежей выполняется вручную через админ-панель.
+        В режиме PAYMENT_ADDRESS_MODE=pool платёж получает отдельный
+        адрес из пула.
         """
         from .models import PaymentAddress, CryptoPayment
         
+        if PAYMENT_ADDRESS_MODE == 'pool':
+            return self._create_pool_payment(amount, currency, user, metadata, callback_url)
+        
         # Используем фиксированный адрес кошелька
         wallet_address = MERCHANT_WALLET_ADDRESS
         
@@ -260,44 +638,337 @@ class PaymentService:
         # Создаём платёж
         expires_at = timezone.now() + timedelta(minutes=PAYMENT_EXPIRY_MINUTES)
         
-        payment = CryptoPayment.objects.create(
-            user=user,
-            payment_address=payment_address,
-            currency=currency,
-            amount_expected=amount,
-            expires_at=expires_at,
-            metadata=metadata or {},
-            callback_url=callback_url,
+        # Все платежи идут на один кошелёк - к сумме добавляется уникальная
+        # micro-добавка (например 100.000137). Уникальность среди открытых
+        # платежей гарантирует частичный уникальный индекс в БД, поэтому
+        # выделение - случайная проба слота с повтором при конфликте, O(1)
+        # в среднем и безопасно для нескольких воркеров. Слот освобождается
+        # сам, когда платёж завершается или истекает.
+        for attempt in range(PAYMENT_AMOUNT_ALLOCATION_ATTEMPTS):
+            offset = Decimal(random.randint(1, PAYMENT_AMOUNT_OFFSET_SLOTS)) / Decimal(MICRO)
+            try:
+                with db_transaction.atomic():
+                    return CryptoPayment.objects.create(
+                        user=user,
+                        payment_address=payment_address,
+                        currency=currency,
+                        amount_expected=amount + offset,
+                        amount_requested=amount,
+                        expires_at=expires_at,
+                        metadata=metadata or {},
+                        callback_url=callback_url,
+                    )
+            except IntegrityError:
+                continue
+        
+        raise ValueError(
+            f"Не удалось выделить уникальную сумму для {amount} {currency}, попробуйте позже"
         )
+    
+    def _create_pool_payment(self, amount: Decimal, currency: str, user,
+                             metadata: Optional[Dict], callback_url: Optional[str]) -> 'CryptoPayment':
+        """
+        Платёж на отдельный адрес из пула: адрес уникален, поэтому
+        micro-добавка к сумме не нужна, а засчитывается любой входящий
+        перевод (зачисляется полученная сумма). Адрес забирается в той же
+        транзакции - при ошибке создания платежа он возвращается в пул.
+        """
+        from .models import CryptoPayment
         
-        return payment
+        expires_at = timezone.now() + timedelta(minutes=PAYMENT_EXPIRY_MINUTES)
+        with db_transaction.atomic():
+            payment_address = self.address_pool.claim()
+            return CryptoPayment.objects.create(
+                user=user,
+                payment_address=payment_address,
+                currency=currency,
+                amount_expected=amount,
+                amount_requested=amount,
+                expires_at=expires_at,
+                metadata=metadata or {},
+                callback_url=callback_url,
+            )
     
-    def check_payment(self, payment: 'CryptoPayment') -> bool:
+    def check_payment(self, payment: 'CryptoPayment') -> Tuple[List['CryptoPayment'], Set[str]]:
         """
-        Проверить статус платежа.
-        Returns: True если статус изменился
+        Проверить статус платежа (и остальных открытых платежей его адреса).
+        История адреса читается у TronGrid постранично от его курсора,
+        как в check_payments.
+        Returns: (платежи адреса, у которых изменился статус,
+                  адреса, история которых прочитана без ошибок)
         """
-        from .models import TransactionLog
+        from .models import CryptoPayment
         
         if payment.status in ['completed', 'expired']:
-            return False
-        
-        # Проверяем истечение срока
-        if payment.expires_at < timezone.now() and payment.status == 'pending':
-            payment.status = 'expired'
-            payment.save()
-            return True
+            return [], set()
         
-        # Получаем транзакции на адрес
         address = payment.payment_address.address
-        transactions = self.trongrid.get_trc20_transactions(
-            address,
-            only_confirmed=True,
-            min_timestamp=int(payment.created_at.timestamp() * 1000)
+        # Курсор адреса сдвигается по прочитанным страницам, поэтому
+        # сопоставляются все открытые платежи адреса, а не только этот -
+        # иначе переводы другим платежам остались бы позади курсора
+        payments = list(
+            CryptoPayment.objects.filter(
+                payment_address=payment.payment_address,
+                status__in=['pending', 'confirming'],
+            ).select_related('payment_address')
         )
+        if payment.pk not in {p.pk for p in payments}:
+            return [], set()
         
-        status_changed = False
+        index = AmountIndex()
+        for address_payment in payments:
+            index.add(address_payment)
         
+        scan = self._plan_address_scans(payments)[0]
+        changed = {}
+        pages = self.trongrid.iter_trc20_pages(address, **self._scan_params(scan))
+        scanned = self._apply_address_pages(scan, pages, changed, index)
+        return list(changed.values()), {address} if scanned else set()
+    
+    def check_payments(self, payments) -> Tuple[List['CryptoPayment'], Set[str]]:
+        """
+        Batch-проверка платежей.
+        История TRC20 каждого адреса читается один раз за цикл (постранично,
+        не более TRC20_MAX_PAGES страниц), и все платежи адреса
+        сопоставляются в памяти с каждой страницей.
+        Чтение инкрементальное: запрашиваются только транзакции новее
+        курсора адреса (AddressCursor), но не старше самого раннего
+        created_at среди открытых платежей.
+        Returns: (платежи, у которых изменился статус,
+                  адреса, история которых прочитана без ошибок)
+        """
+        self.matcher.sync(payments)
+        
+        changed = {}
+        scanned = set()
+        for scan in self._plan_address_scans(payments):
+            pages = self.trongrid.iter_trc20_pages(scan['address'], **self._scan_params(scan))
+            if self._apply_address_pages(scan, pages, changed):
+                scanned.add(scan['address'])
+        
+        return list(changed.values()), scanned
+    
+    def check_payments_async(self, payments,
+                             concurrency: int = None) -> Tuple[List['CryptoPayment'], Set[str]]:
+        """
+        То же, что check_payments, но история всех адресов и номер текущего
+        блока запрашиваются конкурентно через AsyncTronGridAPI (не больше
+        concurrency запросов одновременно). Запись в БД выполняется
+        синхронно после завершения всех запросов.
+        Returns: (платежи, у которых изменился статус,
+                  адреса, история которых прочитана без ошибок)
+        """
+        from .trongrid_async import AsyncTronGridAPI, DEFAULT_CONCURRENCY
+        
+        self.matcher.sync(payments)
+        scans = self._plan_address_scans(payments)
+        if not scans:
+            return [], set()
+        
+        async def fetch_all():
+            async with AsyncTronGridAPI(concurrency=concurrency or DEFAULT_CONCURRENCY,
+                                        metrics=self.trongrid.metrics,
+                                        priority=self.trongrid.priority,
+                                        base_url=self.trongrid.base_url) as api:
+                async def fetch(scan):
+                    # Страницы до сбоя обрабатываются, но адрес не считается проверенным
+                    pages = []
+                    try:
+                        async for page in api.iter_trc20_pages(scan['address'], **self._scan_params(scan)):
+                            pages.append(page)
+                    except TronGridError:
+                        return pages, False
+                    return pages, True
+                
+                return await asyncio.gather(
+                    api.get_current_block(),
+                    *(fetch(scan) for scan in scans)
+                )
+        
+        current_block, *results = asyncio.run(fetch_all())
+        if current_block is not None:
+            self.block_height.set(current_block)
+        
+        changed = {}
+        scanned = set()
+        for scan, (pages, fetched) in zip(scans, results):
+            if self._apply_address_pages(scan, pages, changed) and fetched:
+                scanned.add(scan['address'])
+        
+        return list(changed.values()), scanned
+    
+    def _plan_address_scans(self, payments) -> List[Dict]:
+        """Сгруппировать платежи по адресам и подготовить курсоры"""
+        from .models import AddressCursor
+        
+        by_address = {}
+        for payment in payments:
+            by_address.setdefault(payment.payment_address.address, []).append(payment)
+        
+        scans = []
+        for address, address_payments in by_address.items():
+            address_payments.sort(key=lambda p: p.created_at)
+            cursor, _ = AddressCursor.objects.get_or_create(address=address)
+            
+            # min_timestamp включительный - последняя транзакция курсора
+            # придёт повторно и будет отброшена как уже обработанная
+            min_timestamp = max(
+                cursor.last_block_timestamp,
+                int(address_payments[0].created_at.timestamp() * 1000)
+            )
+            scans.append({
+                'address': address,
+                'cursor': cursor,
+                'payments': address_payments,
+                'min_timestamp': min_timestamp,
+            })
+        
+        return scans
+    
+    @staticmethod
+    def _scan_params(scan: Dict) -> Dict:
+        """Параметры постраничного чтения истории для адреса"""
+        return {
+            'max_pages': TRC20_MAX_PAGES,
+            'only_confirmed': True,
+            'min_timestamp': scan['min_timestamp'],
+            'order_by': 'block_timestamp,asc',
+            'raise_errors': True,
+        }
+    
+    def _apply_address_pages(self, scan: Dict, pages, changed: Dict, index: AmountIndex = None) -> bool:
+        """
+        Сопоставить страницы истории адреса с его открытыми платежами
+        (по index, по умолчанию - общий индекс монитора).
+        Returns: False, если историю не удалось дочитать или обработать
+        """
+        index = self.matcher if index is None else index
+        # Номер блока (кэш с TTL, при промахе - запрос к TronGrid и общий
+        # лимитер) берётся до транзакций страниц, чтобы не держать их открытыми
+        current_block = self.block_height.get()
+        # Страницы идут по возрастанию времени - курсор сдвигается
+        # после каждой, так что прерванный цикл продолжится с места остановки
+        pages = iter(pages)
+        while True:
+            try:
+                transactions = next(pages)
+            except StopIteration:
+                return True
+            except TronGridError:
+                return False
+            
+            try:
+                for payment in self._process_page(scan['address'], transactions, index, current_block):
+                    changed[payment.pk] = payment
+            except Exception as e:
+                logger.error(f"Error processing transactions page for {scan['address']}: {e}")
+                return False
+            
+            self._advance_cursor(scan['cursor'], transactions)
+    
+    def _advance_cursor(self, cursor: 'AddressCursor', transactions: List[Dict]):
+        """Сдвинуть курсор адреса на последнюю полученную транзакцию"""
+        if not transactions:
+            return
+        
+        last_tx = max(transactions, key=lambda tx: tx.get('block_timestamp', 0))
+        if last_tx.get('block_timestamp', 0) < cursor.last_block_timestamp:
+            return
+        
+        cursor.last_block_timestamp = last_tx.get('block_timestamp', 0)
+        cursor.last_block_number = last_tx.get('block') or cursor.last_block_number
+        cursor.last_tx_hash = last_tx.get('transaction_id')
+        # Поля аренды не перезаписываем - ими управляет claim_addresses
+        cursor.save(update_fields=['last_block_timestamp', 'last_block_number', 'last_tx_hash', 'updated_at'])
+    
+    def claim_addresses(self, worker_id: str, limit: int = 100,
+                        lease_seconds: int = None) -> List[str]:
+        """
+        Арендовать адреса с открытыми платежами для воркера мониторинга.
+        Берутся свободные адреса, адреса с истёкшей арендой и уже
+        арендованные этим воркером (аренда продлевается). Строки
+        блокируются с SKIP LOCKED, поэтому параллельные воркеры
+        не ждут друг друга и не получают один адрес.
+        Returns: адреса, которые воркер проверяет в этом цикле
+        """
+        from .models import AddressCursor, CryptoPayment
+        
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=lease_seconds or ADDRESS_LEASE_SECONDS)
+        open_addresses = CryptoPayment.objects.filter(
+            status__in=['pending', 'confirming']
+        ).values_list('payment_address__address', flat=True)
+        
+        # Курсор - единица аренды, он должен существовать для каждого адреса
+        known = AddressCursor.objects.filter(address__in=open_addresses).values_list('address', flat=True)
+        missing = set(open_addresses) - set(known)
+        if missing:
+            AddressCursor.objects.bulk_create(
+                [AddressCursor(address=address) for address in missing], ignore_conflicts=True
+            )
+        
+        with db_transaction.atomic():
+            addresses = list(
+                AddressCursor.objects
+                .select_for_update(skip_locked=True)
+                .filter(address__in=open_addresses)
+                .filter(
+                    Q(lease_expires_at__isnull=True)
+                    | Q(lease_expires_at__lt=now)
+                    | Q(leased_by=worker_id)
+                )
+                .order_by('updated_at')
+                .values_list('address', flat=True)[:limit]
+            )
+            AddressCursor.objects.filter(address__in=addresses).update(
+                leased_by=worker_id,
+                lease_expires_at=lease_until,
+            )
+        
+        self.lease_owner = worker_id
+        return addresses
+    
+    def release_addresses(self, worker_id: str):
+        """Снять аренду всех адресов воркера (при остановке)"""
+        from .models import AddressCursor
+        
+        AddressCursor.objects.filter(leased_by=worker_id).update(leased_by='', lease_expires_at=None)
+        if self.lease_owner == worker_id:
+            self.lease_owner = None
+    
+    def _check_lease(self, address: str):
+        """
+        Заблокировать курсор адреса до конца транзакции и убедиться, что
+        аренда ещё у этого воркера - иначе страницу мог уже обработать
+        другой воркер, и повторное зачисление недопустимо.
+        Raises: AddressLeaseLost
+        """
+        from .models import AddressCursor
+        
+        held = list(
+            AddressCursor.objects.select_for_update()
+            .filter(address=address, leased_by=self.lease_owner, lease_expires_at__gt=timezone.now())
+            .values_list('pk', flat=True)
+        )
+        if not held:
+            raise AddressLeaseLost(f"Lease for {address} is no longer held by {self.lease_owner}")
+    
+    def _process_page(self, address: str, transactions: List[Dict],
+                      index: AmountIndex, current_block: Optional[int]) -> List['CryptoPayment']:
+        """
+        Обработать страницу транзакций адреса одной транзакцией БД.
+        Уже известные хеши отсекаются одним запросом, новые записи
+        TransactionLog вставляются одним bulk insert (конфликты по tx_hash
+        игнорируются), изменённые платежи сохраняются одним bulk update.
+        Каждая транзакция зачисляется не более чем одному платежу -
+        найденному в index по сумме; транзакции без платежа логируются
+        с processed=False для ручной проверки. current_block получен
+        вызывающим заранее - внутри транзакции запросов к TronGrid нет.
+        Returns: список платежей, у которых изменился статус
+        """
+        from .models import TransactionLog, CryptoPayment, PaymentAddress
+        
+        incoming = {}
         for tx in transactions:
             # Проверяем что это USDT
             token_info = tx.get('token_info', {})
@@ -309,98 +980,272 @@ class PaymentService:
                 continue
             
             tx_hash = tx.get('transaction_id')
+            if tx_hash:
+                incoming.setdefault(tx_hash, tx)
+        
+        if not incoming:
+            return []
+        
+        changed = {}
+        completed = []
+        
+        with db_transaction.atomic():
+            if self.lease_owner:
+                self._check_lease(address)
             
-            # Проверяем, не обрабатывали ли уже эту транзакцию
-            if TransactionLog.objects.filter(tx_hash=tx_hash).exists():
-                continue
-            
-            # Получаем сумму (USDT имеет 6 decimals)
-            raw_amount = int(tx.get('value', 0))
-            amount = Decimal(raw_amount) / Decimal(10**6)
-            
-            # Получаем информацию о блоке для подтверждений
-            current_block = self.trongrid.get_current_block()
-            tx_block = tx.get('block_timestamp', 0)
-            confirmations = 0
-            
-            if current_block and tx.get('block'):
-                confirmations = current_block - tx.get('block', current_block)
-            
-            # Логируем транзакцию
-            tx_log = TransactionLog.objects.create(
-                tx_hash=tx_hash,
-                from_address=tx.get('from', ''),
-                to_address=address,
-                amount=amount,
-                currency='USDT',
-                block_number=tx.get('block', 0),
-                confirmations=confirmations,
-                payment=payment,
+            # Проверяем, не обрабатывали ли уже эти транзакции - один запрос на страницу
+            known = set(
+                TransactionLog.objects.filter(tx_hash__in=list(incoming))
+                .values_list('tx_hash', flat=True)
             )
+            new_transactions = [tx for tx_hash, tx in incoming.items() if tx_hash not in known]
+            if not new_transactions:
+                return []
             
-            # Обновляем платёж
-            payment.amount_received += amount
-            payment.tx_hash = tx_hash
-            payment.confirmations = confirmations
+            logs = []
             
-            # Проверяем достаточно ли подтверждений
-            if confirmations >= MIN_CONFIRMATIONS:
-                if payment.amount_received >= payment.amount_expected:
-                    payment.status = 'completed'
-                    payment.completed_at = timezone.now()
-                    payment.payment_address.is_used = True
-                    payment.payment_address.save()
-                    
-                    # Отправляем callback
-                    self._send_callback(payment)
+            for tx in new_transactions:
+                # Получаем сумму (USDT имеет 6 decimals)
+                raw_amount = int(tx.get('value', 0))
+                amount = Decimal(raw_amount) / Decimal(10**6)
+                
+                block_number = self._tx_block_number(tx, current_block)
+                confirmations = max(0, current_block - block_number) if current_block and block_number else 0
+                
+                payment = index.match(address, 'USDT', raw_amount, tx.get('block_timestamp', 0))
+                # Логируем транзакцию
+                logs.append(TransactionLog(
+                    tx_hash=tx.get('transaction_id'),
+                    from_address=tx.get('from', ''),
+                    to_address=address,
+                    amount=amount,
+                    currency='USDT',
+                    block_number=block_number,
+                    confirmations=confirmations,
+                    payment=payment,
+                    processed=payment is not None,
+                ))
+                
+                if payment is None:
+                    continue
+                
+                # Обновляем платёж
+                payment.amount_received += amount
+                payment.tx_hash = tx.get('transaction_id')
+                payment.confirmations = confirmations
+                
+                # Проверяем достаточно ли подтверждений
+                if confirmations >= MIN_CONFIRMATIONS:
+                    if index.is_paid(payment):
+                        payment.status = 'completed'
+                        payment.completed_at = timezone.now()
+                        payment.payment_address.is_used = True
+                        completed.append(payment)
+                        index.remove(payment.pk)
+                    else:
+                        payment.status = 'confirming'
                 else:
                     payment.status = 'confirming'
-            else:
-                payment.status = 'confirming'
+                
+                payment.updated_at = timezone.now()
+                changed[payment.pk] = payment
+            
+            TransactionLog.objects.bulk_create(logs, ignore_conflicts=True)
+            
+            if changed:
+                CryptoPayment.objects.bulk_update(
+                    list(changed.values()),
+                    ['amount_received', 'tx_hash', 'confirmations', 'status',
+                     'completed_at', 'updated_at']
+                )
             
-            tx_log.processed = True
-            tx_log.save()
-            status_changed = True
+            if completed:
+                PaymentAddress.objects.filter(
+                    pk__in={p.payment_address_id for p in completed}
+                ).update(is_used=True)
+                
+                # Зачисление (если включено) и callback - в той же транзакции,
+                # что и смена статуса; callback доставляет deliver_callbacks
+                if PAYMENT_AUTO_CREDIT:
+                    credit_payments([p.pk for p in completed])
+                enqueue_callbacks(completed)
         
-        if status_changed:
-            payment.save()
+        return list(changed.values())
+    
+    def expire_overdue_payments(self, batch_size: int = None) -> List[int]:
+        """
+        Перевести просроченные pending-платежи в expired.
+        Работает пачками по batch_size: строки пачки блокируются
+        (SKIP LOCKED - параллельный запуск не ждёт и не дублирует работу)
+        и обновляются одним условным UPDATE.
+        Returns: id истёкших платежей
+        """
+        from .models import CryptoPayment
         
-        return status_changed
+        batch_size = batch_size or PAYMENT_EXPIRY_BATCH_SIZE
+        now = timezone.now()
+        expired = []
+        while True:
+            with db_transaction.atomic():
+                ids = list(
+                    CryptoPayment.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(status='pending', expires_at__lt=now)
+                    .order_by('expires_at')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if ids:
+                    CryptoPayment.objects.filter(pk__in=ids, status='pending').update(
+                        status='expired',
+                        updated_at=now,
+                    )
+            
+            expired.extend(ids)
+            if len(ids) < batch_size:
+                return expired
     
-    def _send_callback(self, payment: 'CryptoPayment'):
-        """Отправить callback о завершении платежа"""
-        if not payment.callback_url:
-            return
+    @staticmethod
+    def _tx_block_number(tx: Dict, current_block: Optional[int]) -> int:
+        """
+        Номер блока транзакции. TRC20 история TronGrid отдаёт только
+        block_timestamp, поэтому номер оценивается от текущего блока:
+        блоки TRON идут каждые TRON_BLOCK_INTERVAL_MS. Пропущенные слоты
+        завышают оценку подтверждений на их число; история читается с
+        only_confirmed=true (транзакции уже solidified), поэтому на
+        надёжность зачисления это не влияет.
+        """
+        if tx.get('block'):
+            return tx['block']
+        timestamp = tx.get('block_timestamp')
+        if not current_block or not timestamp:
+            return 0
+        elapsed = max(0, int(time.time() * 1000) - timestamp)
+        return max(1, current_block - elapsed // TRON_BLOCK_INTERVAL_MS)
+    
+    def track_confirmations(self) -> List['CryptoPayment']:
+        """
+        Пересчитать подтверждения всех confirming-платежей по одному
+        номеру текущего блока, без запросов к TronGrid по транзакциям:
+        confirmations = текущий блок - block_number последней транзакции
+        платежа (один UPDATE для логов, один для платежей). Платежи,
+        набравшие MIN_CONFIRMATIONS и полную сумму (на адресе пула - любую),
+        завершаются, а их callback ставится в очередь в той же транзакции;
+        при PAYMENT_AUTO_CREDIT сумма там же зачисляется на баланс.
+        Returns: завершённые платежи
+        """
+        from .models import TransactionLog, CryptoPayment, PaymentAddress
         
-        try:
-            payload = {
-                'payment_id': payment.payment_id,
-                'status': payment.status,
-                'amount_expected': str(payment.amount_expected),
-                'amount_received': str(payment.amount_received),
-                'currency': payment.currency,
-                'tx_hash': payment.tx_hash,
-                'metadata': payment.metadata,
-            }
+        current_block = self.block_height.get()
+        if not current_block:
+            return []
+        
+        confirmed_txs = TransactionLog.objects.filter(payment=OuterRef('pk'), block_number__gt=0)
+        latest_block = confirmed_txs.order_by('-block_number').values('block_number')[:1]
+        
+        with db_transaction.atomic():
+            TransactionLog.objects.filter(
+                payment__status='confirming', block_number__gt=0
+            ).update(confirmations=Value(current_block) - F('block_number'))
+            
+            CryptoPayment.objects.filter(status='confirming').filter(
+                Exists(confirmed_txs)
+            ).update(confirmations=Value(current_block) - Subquery(latest_block))
             
-            requests.post(
-                payment.callback_url,
-                json=payload,
-                timeout=10,
-                headers={'Content-Type': 'application/json'}
+            # SKIP LOCKED: параллельный воркер не завершит те же платежи повторно.
+            # На адресе пула достаточно любого полученного перевода
+            ids = list(
+                CryptoPayment.objects.select_for_update(skip_locked=True).filter(
+                    Q(amount_received__gte=F('amount_expected') - PAYMENT_AMOUNT_TOLERANCE)
+                    | Q(payment_address__in_pool=True, amount_received__gt=0),
+                    status='confirming',
+                    confirmations__gte=MIN_CONFIRMATIONS,
+                ).values_list('pk', flat=True)
+            )
+            if not ids:
+                return []
+            
+            now = timezone.now()
+            CryptoPayment.objects.filter(pk__in=ids, status='confirming').update(
+                status='completed',
+                completed_at=now,
+                updated_at=now,
+            )
+            completed = list(CryptoPayment.objects.filter(pk__in=ids).select_related('payment_address'))
+            PaymentAddress.objects.filter(
+                pk__in={p.payment_address_id for p in completed}
+            ).update(is_used=True)
+            if PAYMENT_AUTO_CREDIT:
+                credit_payments(ids)
+            enqueue_callbacks(completed)
+        
+        for payment in completed:
+            self.matcher.remove(payment.pk)
+        return completed
+    
+    def mark_checked(self, payments):
+        """
+        Отметить платежи как проверенные в блокчейне и снять
+        запросы внеочередной проверки.
+        """
+        from .models import CryptoPayment
+        
+        now = timezone.now()
+        ids = [payment.pk for payment in payments]
+        for start in range(0, len(ids), 1000):
+            CryptoPayment.objects.filter(pk__in=ids[start:start + 1000]).update(
+                last_checked_at=now,
+                refresh_requested_at=None,
             )
-        except Exception as e:
-            logger.error(f"Failed to send callback for payment {payment.payment_id}: {e}")
+    
+    def request_refresh(self, payment: 'CryptoPayment') -> bool:
+        """
+        Попросить монитор проверить платёж вне очереди.
+        Не чаще раза в REFRESH_HINT_INTERVAL секунд на платёж - ограничение
+        выполняется условным UPDATE, без запросов к TronGrid.
+        Returns: True если запрос принят
+        """
+        from .models import CryptoPayment
+        
+        now = timezone.now()
+        threshold = now - timedelta(seconds=REFRESH_HINT_INTERVAL)
+        return bool(
+            CryptoPayment.objects.filter(
+                pk=payment.pk,
+                status__in=['pending', 'confirming'],
+            ).filter(
+                Q(refresh_requested_at__isnull=True) | Q(refresh_requested_at__lt=threshold)
+            ).filter(
+                Q(last_checked_at__isnull=True) | Q(last_checked_at__lt=threshold)
+            ).update(refresh_requested_at=now)
+        )
+    
+    def get_private_key(self, payment_address: 'PaymentAddress') -> str:
+        """
+        Приватный ключ платёжного адреса (hex): HD-адрес выводится заново
+        по derivation_index, у остальных ключ расшифровывается.
+        """
+        if payment_address.private_key_encrypted == HD_DERIVED_KEY:
+            if self.hd_wallet is None:
+                raise ValueError("HD_WALLET_SEED не настроен - ключ HD-адреса недоступен")
+            return self.hd_wallet.private_key(payment_address.derivation_index)
+        if payment_address.private_key_encrypted == 'EXTERNAL_WALLET':
+            raise ValueError("Ключ внешнего кошелька не хранится")
+        if self.encryption is None:
+            raise ValueError("CRYPTO_ENCRYPTION_KEY не настроен")
+        return self.encryption.decrypt(payment_address.private_key_encrypted)
     
     def get_payment_status(self, payment_id: str) -> Optional[Dict]:
-        """Получить статус платежа по ID"""
+        """
+        Получить статус платежа по ID.
+        Возвращается последнее известное состояние из БД - проверку
+        в блокчейне выполняет фоновый монитор.
+        """
         from .models import CryptoPayment
         
         try:
-            payment = CryptoPayment.objects.get(payment_id=payment_id)
-            
-            # Проверяем обновления
-            self.check_payment(payment)
+            payment = CryptoPayment.objects.select_related('payment_address').get(
+                payment_id=payment_id
+            )
             
             return {
                 'payment_id': payment.payment_id,
@@ -413,6 +1258,50 @@ class PaymentService:
                 'expires_at': payment.expires_at.isoformat(),
                 'created_at': payment.created_at.isoformat(),
                 'tx_hash': payment.tx_hash,
+                'last_checked_at': (
+                    payment.last_checked_at.isoformat() if payment.last_checked_at else None
+                ),
             }
         except CryptoPayment.DoesNotExist:
             return None
+
+
+_payment_service = None
+_payment_service_lock = threading.Lock()
+
+
+def get_payment_service() -> PaymentService:
+    """
+    Общий для процесса PaymentService для обработки запросов (приоритет
+    interactive). TronGrid сессия с пулом соединений, шифрование и
+    HD-кошелёк создаются один раз на воркер. Монитор и команды создают
+    свой PaymentService - у него состояние между циклами (matcher, аренда).
+    """
+    global _payment_service
+    if _payment_service is None:
+        with _payment_service_lock:
+            if _payment_service is None:
+                _payment_service = PaymentService()
+    return _payment_service
+
+
+def reset_payment_service():
+    """
+    Сбросить общие экземпляры процесса (PaymentService, шифрование,
+    HD-кошелёк, номер блока) - для тестов и после смены ключей.
+    Следующий вызов get_* создаст их заново из текущих настроек.
+    """
+    global _payment_service, _encryption, _encryption_configured, _block_height_provider
+    with _payment_service_lock:
+        service, _payment_service = _payment_service, None
+    with _encryption_lock:
+        _encryption = None
+        _encryption_configured = True
+    with _block_height_lock:
+        provider, _block_height_provider = _block_height_provider, None
+    reset_hd_wallet()
+    
+    if provider is not None:
+        provider.stop_ticker()
+    if service is not None:
+        service.trongrid.session.close()
@@ -1,3 +1,40 @@
-from django.test import TestCase
+import hashlib
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from crypto_payments.hd_wallet import HDWallet
+from crypto_payments.services import TronWalletGenerator
+
+# BIP39 "abandon abandon ... about" без пароля, m/44'/195'/0'/0/0
+TEST_MNEMONIC = 'abandon ' * 11 + 'about'
+TEST_ADDRESS = 'TUEZSdKsoDHQMeZwihtdoBiN46zxhGWYdH'
+
+
+def mnemonic_to_seed(mnemonic: str, passphrase: str = '') -> bytes:
+    return hashlib.pbkdf2_hmac('sha512', mnemonic.encode(), ('mnemonic' + passphrase).encode(), 2048)
+
+
+class TronAddressTests(SimpleTestCase):
+    """Адреса TRON на известных векторах"""
+    
+    def setUp(self):
+        self.wallet = HDWallet(seed=mnemonic_to_seed(TEST_MNEMONIC))
+    
+    def test_hd_address_matches_known_vector(self):
+        self.assertEqual(self.wallet.address(0), TEST_ADDRESS)
+    
+    def test_private_key_gives_same_address(self):
+        private_key = self.wallet.private_key(0)
+        self.assertEqual(TronWalletGenerator.private_key_to_address(private_key), TEST_ADDRESS)
+    
+    def test_public_key_hashed_with_keccak256(self):
+        # Закрытый ключ 1 (публичный - генератор secp256k1): адрес Ethereum
+        # 0x7e5f4552091a69125d5dfcb7b8c2659029395bdf с префиксом TRON 0x41
+        public_key = (
+            '79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798'
+            '483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8'
+        )
+        self.assertEqual(
+            TronWalletGenerator._public_key_to_address(public_key),
+            'TMVQGm1qAQYVdetCeGRRkTWYYrLXuHK2HC',
+        )
@@ -0,0 +1,223 @@
+"""
+Асинхронный клиент TronGrid API (aiohttp).
+Повторяет методы TronGridAPI, но позволяет выполнять много запросов
+одновременно - с ограничением параллельности через семафор.
+
+Использование:
+    async with AsyncTronGridAPI(concurrency=20) as api:
+        block = await api.get_current_block()
+        async for page in api.iter_trc20_pages(address):
+            ...
+"""
+import asyncio
+import time
+import logging
+from decimal import Decimal
+from typing import Optional, Dict, List, AsyncIterator
+
+import aiohttp
+
+from .services import (
+    TronGridAPI,
+    TronGridError,
+    TronGridMetrics,
+    trongrid_backoff,
+    TRONGRID_API_KEY,
+    TRONGRID_BASE_URL,
+    TRON_NETWORK,
+    TRONGRID_POOL_SIZE,
+    TRONGRID_MAX_RETRIES,
+    TRC20_PAGE_SIZE,
+    USDT_CONTRACT_ADDRESS,
+)
+from .ratelimit import trongrid_rate_limiter, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Максимум одновременных запросов к TronGrid по умолчанию
+DEFAULT_CONCURRENCY = 20
+
+
+class AsyncTronGridAPI:
+    """
+    Асинхронный аналог TronGridAPI.
+    Сессия aiohttp создаётся при входе в контекстный менеджер и
+    переиспользует соединения для всех запросов клиента.
+    """
+    
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_retries: int = None, metrics: TronGridMetrics = None,
+                 priority: str = PRIORITY_INTERACTIVE, base_url: str = None):
+        self.base_url = (
+            base_url or TRONGRID_BASE_URL
+            or TronGridAPI.BASE_URLS.get(TRON_NETWORK, TronGridAPI.BASE_URLS['mainnet'])
+        ).rstrip('/')
+        self.headers = {
+            'TRON-PRO-API-KEY': TRONGRID_API_KEY,
+            'Content-Type': 'application/json',
+        }
+        self.concurrency = concurrency
+        self.max_retries = TRONGRID_MAX_RETRIES if max_retries is None else max_retries
+        self.metrics = metrics or TronGridMetrics()
+        self.priority = priority
+        self.limiter = trongrid_rate_limiter(TRONGRID_API_KEY, TRON_NETWORK)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=max(self.concurrency, TRONGRID_POOL_SIZE))
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.session = None
+    
+    async def _request(self, endpoint: str, method: str, path: str,
+                       params: Dict = None, timeout: int = 10) -> Dict:
+        """
+        Выполнить запрос к TronGrid с повторами на 429/5xx.
+        Raises: TronGridError если ответ не получен после всех повторов
+        """
+        url = f"{self.base_url}{path}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            if not await self.limiter.acquire_async(self.priority):
+                raise TronGridError(endpoint, "local rate limit budget exhausted", 429)
+            
+            started = time.monotonic()
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, params=params,
+                                                    timeout=client_timeout) as response:
+                        self.metrics.record(endpoint, started, error=response.status != 200)
+                        self.metrics.update_rate_limit(response.headers)
+                        if response.status == 200:
+                            return await response.json(content_type=None)
+                        status_code, error = response.status, f"HTTP {response.status}"
+                        retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.metrics.record(endpoint, started, error=True)
+                status_code, error = None, str(e) or type(e).__name__
+            
+            if status_code is not None and status_code not in TronGridAPI.RETRY_STATUS_CODES:
+                raise TronGridError(endpoint, error, status_code)
+            if status_code == 429:
+                await asyncio.to_thread(self.limiter.drain)
+            
+            if attempt < self.max_retries:
+                self.metrics.record_retry(endpoint)
+                await asyncio.sleep(trongrid_backoff(attempt, retry_after))
+        
+        raise TronGridError(endpoint, error, status_code)
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Метрики по эндпоинтам: вызовы, ошибки, повторы, задержка"""
+        return self.metrics.snapshot()
+    
+    async def get_account_info(self, address: str) -> Optional[Dict]:
+        """Получить информацию об аккаунте"""
+        try:
+            data = await self._request('account', 'GET', f"/v1/accounts/{address}")
+            return data.get('data', [{}])[0] if data.get('data') else None
+        except Exception as e:
+            logger.error(f"Error getting account info: {e}")
+            return None
+    
+    async def get_trc20_transactions(self, address: str, limit: int = 50,
+                                     only_confirmed: bool = True,
+                                     min_timestamp: int = None,
+                                     order_by: str = None) -> List[Dict]:
+        """Получить одну страницу TRC20 транзакций для адреса"""
+        try:
+            params = _trc20_params(limit, only_confirmed, min_timestamp, order_by)
+            data = await self._request(
+                'trc20_history', 'GET', f"/v1/accounts/{address}/transactions/trc20",
+                params=params, timeout=15
+            )
+            return data.get('data', [])
+        except Exception as e:
+            logger.error(f"Error getting TRC20 transactions: {e}")
+            return []
+    
+    async def iter_trc20_pages(self, address: str, page_size: int = TRC20_PAGE_SIZE,
+                               max_pages: int = None, only_confirmed: bool = True,
+                               min_timestamp: int = None, order_by: str = None,
+                               raise_errors: bool = False) -> AsyncIterator[List[Dict]]:
+        """
+        Постранично читать TRC20 историю адреса по meta.fingerprint
+        (см. TronGridAPI.iter_trc20_pages, в том числе raise_errors).
+        """
+        params = _trc20_params(page_size, only_confirmed, min_timestamp, order_by)
+        
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            try:
+                data = await self._request(
+                    'trc20_history', 'GET', f"/v1/accounts/{address}/transactions/trc20",
+                    params=params, timeout=15
+                )
+            except Exception as e:
+                logger.error(f"Error getting TRC20 transactions page for {address}: {e}")
+                if raise_errors:
+                    if isinstance(e, TronGridError):
+                        raise
+                    raise TronGridError('trc20_history', str(e)) from e
+                return
+            
+            transactions = data.get('data', [])
+            if not transactions:
+                return
+            
+            pages += 1
+            yield transactions
+            
+            fingerprint = data.get('meta', {}).get('fingerprint')
+            if not fingerprint:
+                return
+            params['fingerprint'] = fingerprint
+    
+    async def get_transaction_info(self, tx_hash: str) -> Optional[Dict]:
+        """Получить информацию о транзакции"""
+        try:
+            data = await self._request('transaction', 'GET', f"/v1/transactions/{tx_hash}")
+            return data.get('data', [{}])[0] if data.get('data') else None
+        except Exception as e:
+            logger.error(f"Error getting transaction info: {e}")
+            return None
+    
+    async def get_current_block(self) -> Optional[int]:
+        """Получить номер текущего блока"""
+        try:
+            data = await self._request('now_block', 'POST', "/wallet/getnowblock")
+            return data.get('block_header', {}).get('raw_data', {}).get('number')
+        except Exception as e:
+            logger.error(f"Error getting current block: {e}")
+            return None
+    
+    async def get_usdt_balance(self, address: str) -> Decimal:
+        """Получить баланс USDT TRC20"""
+        account_info = await self.get_account_info(address)
+        if not account_info:
+            return Decimal('0')
+        
+        for token in account_info.get('trc20', []):
+            if USDT_CONTRACT_ADDRESS in token:
+                return Decimal(int(token[USDT_CONTRACT_ADDRESS])) / Decimal(10**6)
+        return Decimal('0')
+
+
+def _trc20_params(limit: int, only_confirmed: bool,
+                  min_timestamp: int = None, order_by: str = None) -> Dict:
+    params = {
+        'limit': limit,
+        'only_confirmed': str(only_confirmed).lower(),
+    }
+    if min_timestamp:
+        params['min_timestamp'] = min_timestamp
+    if order_by:
+        params['order_by'] = order_by
+    return params
+
@@ -10,6 +10,12 @@ urlpatterns = [
     # Проверка статуса платежа
     path('payment/<str:payment_id>/status', views.check_payment, name='check_payment'),
     
+    # Поток событий статуса платежа (SSE)
+    path('payment/<str:payment_id>/events', views.payment_events, name='payment_events'),
+    
+    # Запрос внеочередной проверки платежа монитором
+    path('payment/<str:payment_id>/refresh', views.refresh_payment, name='refresh_payment'),
+    
     # Детали платежа с транзакциями
     path('payment/<str:payment_id>/detail', views.payment_detail, name='payment_detail'),
     
@@ -31,4 +37,7 @@ urlpatterns = [
     
     # Отклонить депозит
     path('admin/deposits/<str:payment_id>/reject', views.admin_reject_deposit, name='admin_reject_deposit'),
+    
+    # Метрики пула платёжных адресов
+    path('admin/address-pool', views.admin_address_pool, name='admin_address_pool'),
 ]
@@ -1,17 +1,25 @@
+import os
+import json
+import time
+import asyncio
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from decimal import Decimal
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views.decorators.http import require_GET
 from .models import CryptoPayment
 from .serializers import (
     CreatePaymentSerializer, 
     PaymentStatusSerializer,
     PaymentDetailSerializer,
 )
-from .services import PaymentService
-from auth_app.models import BalanceHistory
+from .services import get_payment_service
+from .balance import credit_payments, credit_amount
 
 
 @api_view(['POST'])
@@ -36,7 +44,7 @@ def create_payment(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        service = PaymentService()
+        service = get_payment_service()
         
         # Пользователь уже авторизован (IsAuthenticated)
         user = request.user
@@ -55,6 +63,7 @@ def create_payment(request):
                 'payment_id': payment.payment_id,
                 'address': payment.payment_address.address,
                 'amount': str(payment.amount_expected),
+                'amount_requested': str(payment.amount_requested),
                 'currency': payment.currency,
                 'expires_at': payment.expires_at.isoformat(),
                 'status': payment.status,
@@ -73,6 +82,9 @@ def create_payment(request):
 def check_payment(request, payment_id):
     """
     Проверить статус платежа.
+    Отдаёт последнее известное состояние из БД, без запросов к блокчейну -
+    платежи проверяет фоновый монитор. Время последней проверки
+    передаётся в заголовке X-Last-Checked.
     
     GET /api/v1/crypto/payment/<payment_id>/status
     """
@@ -86,25 +98,164 @@ def check_payment(request, payment_id):
             'error': 'Payment not found'
         }, status=status.HTTP_404_NOT_FOUND)
     
+    serializer = PaymentStatusSerializer(payment)
+    response = Response({
+        'success': True,
+        'payment': serializer.data
+    })
+    if payment.last_checked_at:
+        response['X-Last-Checked'] = payment.last_checked_at.isoformat()
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def refresh_payment(request, payment_id):
+    """
+    Попросить фоновый монитор проверить платёж вне очереди.
+    Запросы ограничены по частоте, сама проверка выполняется монитором.
+    
+    POST /api/v1/crypto/payment/<payment_id>/refresh
+    """
     try:
-        # Проверяем обновления
-        service = PaymentService()
-        service.check_payment(payment)
-        
-        # Обновляем объект из БД
-        payment.refresh_from_db()
-        
-        serializer = PaymentStatusSerializer(payment)
-        return Response({
-            'success': True,
-            'payment': serializer.data
-        })
-        
-    except Exception as e:
+        payment = CryptoPayment.objects.get(payment_id=payment_id)
+    except CryptoPayment.DoesNotExist:
         return Response({
             'success': False,
-            'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            'error': 'Payment not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    accepted = get_payment_service().request_refresh(payment)
+    return Response({
+        'success': True,
+        'accepted': accepted,
+    }, status=status.HTTP_202_ACCEPTED if accepted else status.HTTP_200_OK)
+
+
+# Параметры потока событий платежа (секунды)
+SSE_POLL_INTERVAL = 2
+SSE_HEARTBEAT_INTERVAL = 15
+# После этого времени поток закрывается, браузер переподключится сам
+SSE_MAX_DURATION = 300
+
+# Максимум одновременных потоков SSE на процесс ASGI; сверх него (и под
+# WSGI) клиент получает текущее состояние и переподключается через retry
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 1000))
+
+TERMINAL_STATUSES = ('completed', 'expired', 'failed')
+
+# Открытые потоки SSE процесса (event loop один, блокировка не нужна)
+_sse_streams = 0
+
+
+@require_GET
+async def payment_events(request, payment_id):
+    """
+    Поток событий статуса платежа (Server-Sent Events).
+    Держит одно соединение и присылает событие `status` при изменении
+    status / amount_received / confirmations, которые записывает монитор.
+    Пока изменений нет, раз в SSE_HEARTBEAT_INTERVAL отправляется
+    комментарий-heartbeat. После терминального статуса отправляется
+    событие `end` и поток закрывается; для завершённого платежа ответ -
+    204, и EventSource больше не переподключается.
+    
+    Поток - async: под ASGI (сервис backend-events) ожидающее соединение
+    не занимает поток воркера и соединение с БД. Под WSGI отдаётся
+    только текущее состояние - EventSource опрашивает с интервалом retry.
+    
+    GET /api/v1/crypto/payment/<payment_id>/events
+    """
+    state = await sync_to_async(_payment_state)(payment_id=payment_id)
+    if state is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Payment not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if state['status'] in TERMINAL_STATUSES:
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    
+    if 'wsgi.version' in request.META or _sse_streams >= SSE_MAX_STREAMS:
+        response = HttpResponse(_sse_retry() + _sse_status(state), content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(
+            _payment_event_stream(state),
+            content_type='text/event-stream'
+        )
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _payment_state(**lookup):
+    """
+    Текущее состояние платежа для SSE. Соединение с БД закрывается сразу -
+    поток не держит его между опросами.
+    """
+    try:
+        return CryptoPayment.objects.filter(**lookup).values(
+            'pk', 'payment_id', 'status', 'amount_received', 'confirmations',
+            'tx_hash', 'last_checked_at',
+        ).first()
+    finally:
+        connection.close()
+
+
+async def _payment_event_stream(state):
+    """Асинхронный генератор событий SSE для платежа"""
+    global _sse_streams
+    _sse_streams += 1
+    try:
+        yield _sse_retry()
+        
+        started = time.monotonic()
+        last_sent = started
+        last_state = None
+        
+        while True:
+            key = (state['status'], state['amount_received'], state['confirmations'])
+            if key != last_state:
+                last_state = key
+                last_sent = time.monotonic()
+                yield _sse_status(state)
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT_INTERVAL:
+                last_sent = time.monotonic()
+                yield ': heartbeat\n\n'
+            
+            if state['status'] in TERMINAL_STATUSES:
+                yield _sse('end', {'status': state['status']})
+                return
+            if time.monotonic() - started >= SSE_MAX_DURATION:
+                return
+            
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            state = await sync_to_async(_payment_state)(pk=state['pk'])
+            if state is None:
+                return
+    finally:
+        _sse_streams -= 1
+
+
+def _sse_retry() -> str:
+    return f'retry: {int(SSE_POLL_INTERVAL * 1000)}\n\n'
+
+
+def _sse_status(state: dict) -> str:
+    return _sse('status', {
+        'payment_id': state['payment_id'],
+        'status': state['status'],
+        'amount_received': str(state['amount_received']),
+        'confirmations': state['confirmations'],
+        'tx_hash': state['tx_hash'],
+        'last_checked_at': (
+            state['last_checked_at'].isoformat() if state['last_checked_at'] else None
+        ),
+    })
+
+
+def _sse(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
 
 
 @api_view(['GET'])
@@ -187,7 +338,7 @@ def get_balance(request, address):
     GET /api/v1/crypto/balance/<address>
     """
     try:
-        service = PaymentService()
+        service = get_payment_service()
         balance = service.trongrid.get_usdt_balance(address)
         
         return Response({
@@ -266,7 +417,8 @@ def admin_approve_deposit(request, payment_id):
             'error': 'Платёж не найден'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    if payment.status == 'completed':
+    # Завершённый монитором, но не зачисленный платёж можно зачислить
+    if payment.credited_at:
         return Response({
             'error': 'Платёж уже подтверждён'
         }, status=status.HTTP_400_BAD_REQUEST)
@@ -277,33 +429,25 @@ def admin_approve_deposit(request, payment_id):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Начисляем баланс пользователю
-        profile = payment.user.profile
-        amount_to_add = payment.amount_expected
-        
-        balance_before = Decimal(str(profile.balance))
-        profile.balance = balance_before + Decimal(str(amount_to_add))
-        profile.save()
-        
-        # Создаём запись в истории баланса
-        BalanceHistory.objects.create(
-            user=payment.user,
-            transaction_type='deposit',
-            amount=Decimal(str(amount_to_add)),
-            balance_before=balance_before,
-            balance_after=profile.balance,
-            description=f'Крипто депозит #{payment.payment_id}'
-        )
+        with transaction.atomic():
+            if payment.status != 'completed':
+                # Подтверждение вручную: считаем полученной запрошенную сумму
+                payment.status = 'completed'
+                payment.amount_received = payment.amount_requested or payment.amount_expected
+                payment.completed_at = timezone.now()
+                payment.save()
+            
+            # Начисляем баланс пользователю (повторно не начисляется)
+            credited = credit_payments([payment.pk])
         
-        # Обновляем статус платежа
-        payment.status = 'completed'
-        payment.amount_received = amount_to_add
-        payment.completed_at = timezone.now()
-        payment.save()
+        if not credited:
+            return Response({
+                'error': 'Платёж уже подтверждён'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
-            'message': f'Баланс ${amount_to_add} начислен пользователю {payment.user.username}'
+            'message': f'Баланс ${credit_amount(payment)} начислен пользователю {payment.user.username}'
         })
         
     except Exception as e:
@@ -346,3 +490,21 @@ def admin_reject_deposit(request, payment_id):
         'message': 'Платёж отклонён'
     })
 
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_address_pool(request):
+    """
+    Метрики пула платёжных адресов: свободные адреса и скорость
+    пополнения/выдачи за последний час (только для админов).
+    
+    GET /api/v1/crypto/admin/address-pool
+    """
+    # Проверяем права админа
+    if not request.user.is_staff and not request.user.is_superuser:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response(get_payment_service().address_pool.stats())
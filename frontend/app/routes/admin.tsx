@@ -71,6 +71,8 @@ type TabType = 'users' | 'merchants' | 'payments' | 'deposits';
 
 export default function Admin() {
   const [users, setUsers] = useState<User[]>([]);
+  const [usersCount, setUsersCount] = useState(0);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
   const [merchants, setMerchants] = useState<Merchant[]>([]);
   const [payments, setPayments] = useState<Payment[]>([]);
   const [deposits, setDeposits] = useState<CryptoDeposit[]>([]);
@@ -109,13 +111,16 @@ export default function Admin() {
     setTimeout(() => setMessage(""), 4000);
   }
 
-  async function loadUsers(authToken: string | null) {
+  async function loadUsers(authToken: string | null, cursor: string | null = null) {
     if (!authToken) return;
     try {
       const res = await axios.get(`${baseURL}/api/v1/auth/users`, {
-        headers: { "Authorization": `Token ${authToken}` }
+        headers: { "Authorization": `Token ${authToken}` },
+        params: cursor ? { cursor } : {}
       });
-      setUsers(res.data);
+      setUsers(prev => cursor ? [...prev, ...res.data.results] : res.data.results);
+      setUsersCount(res.data.count);
+      setUsersCursor(res.data.next_cursor);
     } catch (e) {
       console.error("Error loading users:", e);
     }
@@ -280,7 +285,7 @@ export default function Admin() {
   }, [role, token, username, navigate]);
 
   const tabs = [
-    { id: 'users' as TabType, label: t("users"), icon: 'users', count: users.length },
+    { id: 'users' as TabType, label: t("users"), icon: 'users', count: usersCount },
     { id: 'merchants' as TabType, label: t("merchants"), icon: 'credit-card', count: merchants.length },
     { id: 'payments' as TabType, label: t("payments"), icon: 'activity', count: payments.length },
     { id: 'deposits' as TabType, label: 'Депозиты', icon: 'download', count: deposits.length },
@@ -597,6 +602,25 @@ export default function Admin() {
             </div>
           ))}
           </div>
+
+          {usersCursor && (
+            <div style={{ padding: "12px 20px", textAlign: "center" }}>
+              <button
+                onClick={() => loadUsers(token, usersCursor)}
+                style={{
+                  padding: "8px 16px",
+                  background: `${theme.accent.primary}15`,
+                  color: theme.accent.primary,
+                  border: `1px solid ${theme.accent.primary}30`,
+                  borderRadius: 6,
+                  cursor: "pointer",
+                  fontSize: 13,
+                }}
+              >
+                Показать ещё ({users.length} из {usersCount})
+              </button>
+            </div>
+          )}
         </div>
       )}
 